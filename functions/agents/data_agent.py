@@ -1,6 +1,6 @@
 from typing import Dict, Any, List
 from langgraph.types import Command
-from lib.types import AgentRequest, prebuilt_llm, State
+from lib.types import AgentRequest, get_llm, State
 from firebase_functions import logger
 from langgraph.prebuilt import create_react_agent
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, BaseMessage
@@ -38,7 +38,7 @@ You must reformat any HTML content into a structured format - keep any informati
 """
 
 data_agent = create_react_agent(
-    model=prebuilt_llm,
+    model=get_llm(),
     state_modifier=system_message,
     tools=[
         use_search_feature_tool,
@@ -1,12 +1,18 @@
+import json
 from typing import Dict, Any, List
 from langgraph.types import Command
 from langgraph.graph import END
-from lib.types import FinalOutput, prebuilt_llm, State
+from lib.types import FinalOutput, get_llm, State
+from lib import agent_registry
+from lib.agent_utils import convert_dict_to_langchain_messages, state_summary, worker_input
+from lib.context_builder import build_context, fit_messages
+from lib.templates import templated_response
+from lib.reply_stream import ReplyChunker, get_reply_sink, IMAGE_PREFIX
 from firebase_functions import logger
 from langgraph.prebuilt import create_react_agent
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, BaseMessage
 
-system_prompt = """You are the customer service representative for Heritage Pool Plus, specializing in pool equipment, both specific and general questions. 
+base_prompt = """You are the customer service representative for Heritage Pool Plus, specializing in pool equipment, both specific and general questions. 
 Do NOT use any knowledge of Heritage Pool Plus or external websites outside of the information provided in the conversation by either the user or the other agents.
 --- Your role is to:
 1. Communicate directly with customers in a clear, professional manner
@@ -19,7 +25,9 @@ Do NOT use any knowledge of Heritage Pool Plus or external websites outside of t
 
 Focus only on pool equipment, store details, and product
 information for Heritage Pool Plus.
+"""
 
+system_prompt = base_prompt + """
 You have the ability to display images to the user. If you have an image to display, set the output_image field in the state to the image URL.
 
 You will return a structured response to the user.
@@ -39,39 +47,122 @@ Output:
 Only output the response to the user, no other text. 
 """
 
-human_interaction_agent = create_react_agent(
-    model=prebuilt_llm,
-    state_modifier=system_prompt,
-    tools=[],
-    response_format=FinalOutput
-)
+# Used when the reply is streamed to the user: plain text, with the image on a marker line
+streaming_prompt = base_prompt + f"""
+You have the ability to display images to the user. If you have an image to display, end your response with a line containing
+only "{IMAGE_PREFIX} " followed by the image URL.
+
+DO NOT MAKE UP ANY INFORMATION. Your job is to take all the previous responses, and reason about them to provide a helpful response to the user's request
+
+Based on the conversation history and the user's most recent message, structure your response in a way that is helpful to the user.
+When possible, put available IDs in the response, so that subsequent serverless functions can retrieve the information.
+Separate paragraphs and groups of bullet points with a blank line; each one may be sent to the user as a separate message.
+
+---
+Output:
+Only output the response to the user as plain text, no JSON and no other text.
+"""
+
+AGENT_NAME = "human_interaction"
+
+def build_human_interaction_agent():
+    return create_react_agent(
+        model=get_llm(),
+        state_modifier=system_prompt,
+        tools=[],
+        response_format=FinalOutput
+    )
+
+agent_registry.register_agent(AGENT_NAME, FinalOutput, build_human_interaction_agent)
+
+
+def info_request_prompt(state: State) -> str:
+    info_needed = state.get("pending_request").get("request_info")
+    return f"Other agents are requesting information about: {info_needed}. Use this state to respond to the user and ask for the information needed.\n{build_context(state, AGENT_NAME)}"
 
 
-def human_interaction_node(state: State) -> Command[str]:
+def streaming_messages(state: State) -> List[BaseMessage]:
+    if state.get("pending_request"):
+        conversation = [HumanMessage(content=info_request_prompt(state))]
+    else:
+        conversation = fit_messages(convert_dict_to_langchain_messages(state["messages"]), AGENT_NAME)
+    return [SystemMessage(content=streaming_prompt)] + conversation
+
+
+def streamed_command(state: State, chunker: ReplyChunker) -> Command[str]:
+    message = chunker.close()
+    logger.debug(f"Streamed response in {chunker.messages_sent} messages")
+
+    final_output: FinalOutput = {"message": message, "output_image": chunker.image_url}
+    return Command(
+        goto=END,
+        update={
+            "messages": state["messages"] + [AIMessage(content=json.dumps(final_output))],
+            "pending_request": None,
+            "output_image": chunker.image_url
+        }
+    )
+
+
+def final_command(state: State, response: Dict[str, Any]) -> Command[str]:
+    # Add our response to the messages, keeping only essential fields. The agent saw
+    # a trimmed conversation, so only its reply is appended to the full one.
+    structured_response = response.get("structured_response")
+    return Command(
+        goto=END,
+        update={
+            "messages": state["messages"] + response["messages"][-1:],
+            "pending_request": None,
+            "output_image": structured_response.get("output_image")
+        }
+    )
+
+
+def templated_command(state: State, output: FinalOutput, sink) -> Command[str]:
+    """Reply with a templated FinalOutput, through the reply sink when streaming."""
+    if sink is not None:
+        chunker = ReplyChunker(sink)
+        chunker.feed(output["message"] + (f"\n{IMAGE_PREFIX} {output['output_image']}" if output.get("output_image") else ""))
+        return streamed_command(state, chunker)
+    return Command(
+        goto=END,
+        update={
+            "messages": state["messages"] + [AIMessage(content=json.dumps(output))],
+            "pending_request": None,
+            "output_image": output.get("output_image")
+        }
+    )
+
+
+async def stream_response(state: State, sink) -> Command[str]:
+    """Stream the reply to `sink` as it is generated, then record it as a FinalOutput."""
+    chunker = ReplyChunker(sink)
+    async for chunk in get_llm().astream(streaming_messages(state)):
+        if chunk.content:
+            chunker.feed(chunk.content)
+    return streamed_command(state, chunker)
+
+
+async def human_interaction_node(state: State) -> Command[str]:
     try:
-        logger.debug(f"State in human_interaction_node: {state}")
-        
+        logger.debug(f"State in human_interaction_node: {state_summary(state)}")
 
-        
-        # Generate response
+        sink = get_reply_sink()
+        output = templated_response(state)
+        if output is not None:
+            return templated_command(state, output, sink)
+        if sink is not None:
+            return await stream_response(state, sink)
+
+        human_interaction_agent = agent_registry.get_agent(AGENT_NAME, FinalOutput)
         if state.get("pending_request"):
-            info_needed = state.get("pending_request").get("request_info")
-            response = human_interaction_agent.invoke(f"Other agents are requesting information about: {info_needed}. Use this state to respond to the user and ask for the information needed.")
+            response = await human_interaction_agent.ainvoke(info_request_prompt(state))
         else:
-            response = human_interaction_agent.invoke(state)
-            
+            response = await human_interaction_agent.ainvoke(worker_input(state, AGENT_NAME))
+
         logger.debug(f"Response in human_interaction_node: {response}")
-        # Add our response to the messages, keeping only essential fields
-        structured_response = response.get("structured_response")
-        return Command(
-            goto=END,
-            update={
-                "messages": response["messages"],
-                "pending_request": None,
-                "output_image": structured_response.get("output_image")
-            }
-        )
-        
+        return final_command(state, response)
+
     except Exception as e:
         logger.error(f"Error in human_interaction_node: {str(e)}")
-        raise 
\ No newline at end of file
+        raise
@@ -1,10 +1,12 @@
 from typing import Dict, Any, List
 from langgraph.types import Command
-from lib.types import AgentRequest, AgentResponse, ProductInfo, prebuilt_llm, State
+from lib.types import AgentRequest, AgentResponse, ProductInfo, get_llm, State
+from lib import agent_registry
+from lib.agent_utils import pending_request_prompt, worker_command, worker_input
 from firebase_functions import logger
 from langgraph.prebuilt import create_react_agent
 from langchain_core.messages import AIMessage
-from tools.product_tools import search_klevu_products_tool, search_azure_products_tool, get_product_details_tool, get_pricing_tool, get_availability_tool
+from tools.product_tools import search_klevu_products_tool, search_azure_products_tool, get_product_details_tool, get_pricing_tool, get_availability_tool, catalog_tools, semantic_search_tools
 
 
 system_message = """You are a the product expert agent for Heritage Pool's customer service system. 
@@ -23,6 +25,7 @@ When responding:
 1. Always structure your responses clearly
 2. Include relevant URLs, part numbers, and manufacturer numbers
 3. Format prices and availability information consistently
+4. When you looked up availability, fill in in_stock and available_quantity for each product
 
 Focus only on pool equipment, store details, and product
 information for Heritage Pool Plus.
@@ -31,45 +34,46 @@ OUTPUT ---:
 Return the product details in a structured format, based on the conversation history.
 """
 
+AGENT_NAME = "product_info_agent"
 
-def handle_pending_request(state: State, pending_request: AgentRequest) -> Command[str]:
-    prompt = f"You have a pending request from the {pending_request.get('requesting_agent')} agent. Use the provided tools to provide a response. \
-                      Use the information provided by  {pending_request.get('request_info')}  to respond to the user. Here is the general state of the conversation: {state}\
-                      If a given number is ambigious, ask the user to clarify which number they are referring to."
-    product_agent = create_react_agent(
-        model=prebuilt_llm,
+def build_product_info_agent(response_format, tools):
+    return create_react_agent(
+        model=get_llm(),
         state_modifier=system_message,
-        tools=[
-            get_product_details_tool,
-            get_pricing_tool,
-            get_availability_tool
-        ],
-        response_format=AgentResponse
+        tools=tools,
+        response_format=response_format
     )
-    response = product_agent.invoke({"messages": prompt})
-    pending_request = None
+
+agent_registry.register_agent(AGENT_NAME, AgentResponse, lambda: build_product_info_agent(AgentResponse, [
+    get_product_details_tool,
+    get_pricing_tool,
+    get_availability_tool
+]))
+# The fast router sends price and stock checks here without a pending request,
+# so this variant needs the pricing and availability tools too
+agent_registry.register_agent(AGENT_NAME, ProductInfo, lambda: build_product_info_agent(ProductInfo, catalog_tools() + [
+    search_klevu_products_tool,
+    search_azure_products_tool,
+    get_pricing_tool,
+    get_availability_tool
+] + semantic_search_tools()))
+
+
+async def handle_pending_request(state: State, pending_request: AgentRequest) -> Command[str]:
+    prompt = pending_request_prompt(state, pending_request, AGENT_NAME)
+    product_agent = agent_registry.get_agent(AGENT_NAME, AgentResponse)
+    response = await product_agent.ainvoke({"messages": prompt})
     structured_response = response.get("structured_response")
-    return Command(
-        goto="supervisor",
-        update={"messages": state["messages"] + [AIMessage(content=str(structured_response))], "pending_request": pending_request}
-    )
-    
-def product_info_agent_node(state: State) -> Command[str]:
+    return worker_command(state, AGENT_NAME, structured_response, pending_request=None)
+
+async def product_info_agent_node(state: State) -> Command[str]:
     try:
         if state.get("pending_request"):
-            return handle_pending_request(state, state.get("pending_request"))
-        product_agent = create_react_agent(
-            model=prebuilt_llm,
-            state_modifier=system_message,
-            tools=[
-                search_klevu_products_tool,
-                search_azure_products_tool
-            ],
-            response_format=ProductInfo
-)
-        response = product_agent.invoke(state)
+            return await handle_pending_request(state, state.get("pending_request"))
+        product_agent = agent_registry.get_agent(AGENT_NAME, ProductInfo)
+        response = await product_agent.ainvoke(worker_input(state, AGENT_NAME))
         structured_response = response.get("structured_response")
-        return Command(goto="supervisor", update={"messages": state["messages"] + [AIMessage(content=str(structured_response))]})
+        return worker_command(state, AGENT_NAME, structured_response)
     except Exception as e:
         logger.error(f"Error in product_agent_node: {str(e)}")
-        raise
\ No newline at end of file
+        raise
@@ -1,10 +1,12 @@
 from typing import Dict, Any, List
 from langgraph.types import Command
-from lib.types import AgentRequest, AgentResponse, ProductList, prebuilt_llm, State
+from lib.types import AgentRequest, AgentResponse, ProductList, get_llm, State
+from lib import agent_registry
+from lib.agent_utils import pending_request_prompt, worker_command, worker_input
 from firebase_functions import logger
 from langgraph.prebuilt import create_react_agent
 from langchain_core.messages import AIMessage
-from tools.product_tools import search_klevu_products_tool, search_azure_products_tool
+from tools.product_tools import search_klevu_products_tool, search_azure_products_tool, catalog_tools, semantic_search_tools
 
 
 system_message = """You are a the product search expert agent for Heritage Pool's customer service system. 
@@ -13,6 +15,10 @@ Minimize the number of tools you use.
 
 Your capabilities include:
 1. Searching for parts and models using the search feature (search_klevu_products_tool, search_azure_products_tool)
+2. Searching the local product catalog (search_product_catalog_tool), when it is available. It returns full product details
+   in one call, so try it first and only use the other searches if it finds nothing relevant.
+3. Finding products from a description of what they do (semantic_product_search_tool), when it is available. Use it when the
+   user describes a part instead of giving a number, instead of trying several keyword searches.
 
 The klevu search will only provide id and part numbers. 
 The azure search will provide more detailed information.
@@ -32,45 +38,38 @@ Return the product details in a structured format, based on the conversation his
 """
 
 
+AGENT_NAME = "product_search_agent"
 
-
-def handle_pending_request(state: State, pending_request: AgentRequest) -> Command[str]:
-    prompt = f"You have a pending request from the {pending_request.get('requesting_agent')} agent. Use the provided tools to provide a response. \
-                      Use the information provided by  {pending_request.get('request_info')}  to respond to the user. Here is the general state of the conversation: {state}\
-                      If a given number is ambigious, ask the user to clarify which number they are referring to."
-    product_agent = create_react_agent(
-        model=prebuilt_llm,
+def build_product_search_agent(response_format):
+    return create_react_agent(
+        model=get_llm(),
         state_modifier=system_message,
-        tools=[
+        tools=catalog_tools() + [
             search_klevu_products_tool,
             search_azure_products_tool
-        ],
-        response_format=AgentResponse
+        ] + semantic_search_tools(),
+        response_format=response_format
     )
-    response = product_agent.invoke({"messages": prompt})
-    pending_request = None
+
+for _response_format in (ProductList, AgentResponse):
+    agent_registry.register_agent(AGENT_NAME, _response_format, lambda response_format=_response_format: build_product_search_agent(response_format))
+
+
+async def handle_pending_request(state: State, pending_request: AgentRequest) -> Command[str]:
+    prompt = pending_request_prompt(state, pending_request, AGENT_NAME)
+    product_agent = agent_registry.get_agent(AGENT_NAME, AgentResponse)
+    response = await product_agent.ainvoke({"messages": prompt})
     structured_response = response.get("structured_response")
-    return Command(
-        goto="supervisor",
-        update={"messages": state["messages"] + [AIMessage(content=str(structured_response))], "pending_request": pending_request}
-    )
-    
-def product_search_agent_node(state: State) -> Command[str]:
+    return worker_command(state, AGENT_NAME, structured_response, pending_request=None)
+
+async def product_search_agent_node(state: State) -> Command[str]:
     try:
         if state.get("pending_request"):
-            return handle_pending_request(state, state.get("pending_request"))
-        product_agent = create_react_agent(
-            model=prebuilt_llm,
-            state_modifier=system_message,
-            tools=[
-                search_klevu_products_tool,
-                search_azure_products_tool
-            ],
-            response_format=ProductList
-        )
-        response = product_agent.invoke(state)
+            return await handle_pending_request(state, state.get("pending_request"))
+        product_agent = agent_registry.get_agent(AGENT_NAME, ProductList)
+        response = await product_agent.ainvoke(worker_input(state, AGENT_NAME))
         structured_response = response.get("structured_response")
-        return Command(goto="supervisor", update={"messages": state["messages"] + [AIMessage(content=str(structured_response))]})
+        return worker_command(state, AGENT_NAME, structured_response)
     except Exception as e:
         logger.error(f"Error in product_agent_node: {str(e)}")
-        raise
\ No newline at end of file
+        raise
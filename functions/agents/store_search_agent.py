@@ -1,10 +1,12 @@
 from typing import Dict, Any, List
 from langgraph.types import Command
-from lib.types import AgentRequest, AgentResponse, prebuilt_llm, State, StoreList
+from lib.types import AgentRequest, AgentResponse, get_llm, State, StoreList
+from lib import agent_registry
+from lib.agent_utils import pending_request_prompt, worker_command, worker_input
 from firebase_functions import logger
 from langgraph.prebuilt import create_react_agent
 from langchain_core.messages import AIMessage
-from tools.store_tools import search_store_locations_tool
+from tools.store_tools import search_store_locations_tool, find_nearest_stores_tool
 
 
 system_message = """You are a the store search expert agent for Heritage Pool's customer service system. 
@@ -13,6 +15,7 @@ Minimize the number of tools you use.
 
 Your capabilities include:
 1. Searching for store locations using the search feature (search_store_locations_tool)
+   If the user gives a ZIP code or asks for the nearest/closest store, use find_nearest_stores_tool instead.
 2. Getting store details for a specific store id (get_store_details_tool)
 3. Getting store hours for a specific store id (get_store_hours_tool)
 
@@ -29,43 +32,38 @@ OUTPUT ---:
 Return the store details in a structured format, based on the conversation history.
 """
 
+AGENT_NAME = "store_search_agent"
 
-
-def handle_pending_request(state: State, pending_request: AgentRequest) -> Command[str]:
-    prompt = f"You have a pending request from the {pending_request.get('requesting_agent')} agent. Use the provided tools to provide a response. \
-                      Use the information provided by  {pending_request.get('request_info')}  to respond to the user. Here is the general state of the conversation: {state}\
-                      If a given number is ambigious, ask the user to clarify which number they are referring to."
-    store_agent = create_react_agent(
-        model=prebuilt_llm,
+def build_store_search_agent(response_format):
+    return create_react_agent(
+        model=get_llm(),
         state_modifier=system_message,
         tools=[
-            search_store_locations_tool
+            search_store_locations_tool,
+            find_nearest_stores_tool
         ],
-        response_format=AgentResponse
+        response_format=response_format
     )
-    response = store_agent.invoke({"messages": prompt})   
-    pending_request = None
+
+for _response_format in (StoreList, AgentResponse):
+    agent_registry.register_agent(AGENT_NAME, _response_format, lambda response_format=_response_format: build_store_search_agent(response_format))
+
+
+async def handle_pending_request(state: State, pending_request: AgentRequest) -> Command[str]:
+    prompt = pending_request_prompt(state, pending_request, AGENT_NAME)
+    store_agent = agent_registry.get_agent(AGENT_NAME, AgentResponse)
+    response = await store_agent.ainvoke({"messages": prompt})
     structured_response = response.get("structured_response")
-    return Command(
-        goto="supervisor",
-        update={"messages": state["messages"] + [AIMessage(content=str(structured_response))], "pending_request": pending_request}
-    )
-    
-def store_search_agent_node(state: State) -> Command[str]:
+    return worker_command(state, AGENT_NAME, structured_response, pending_request=None)
+
+async def store_search_agent_node(state: State) -> Command[str]:
     try:
         if state.get("pending_request"):
-            return handle_pending_request(state, state.get("pending_request"))
-        store_agent = create_react_agent(
-            model=prebuilt_llm,
-            state_modifier=system_message,
-            tools=[
-                search_store_locations_tool
-            ],
-            response_format=StoreList
-        )
-        response = store_agent.invoke(state)
+            return await handle_pending_request(state, state.get("pending_request"))
+        store_agent = agent_registry.get_agent(AGENT_NAME, StoreList)
+        response = await store_agent.ainvoke(worker_input(state, AGENT_NAME))
         structured_response = response.get("structured_response")
-        return Command(goto="supervisor", update={"messages": state["messages"] + [AIMessage(content=str(structured_response))]})
+        return worker_command(state, AGENT_NAME, structured_response)
     except Exception as e:
         logger.error(f"Error in store_search_agent_node: {str(e)}")
-        raise
\ No newline at end of file
+        raise
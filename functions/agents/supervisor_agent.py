@@ -1,5 +1,6 @@
 import os
-from typing import List, Literal, Dict, Any, Optional
+import asyncio
+from typing import List, Literal, Dict, Any, Optional, Union
 from typing_extensions import TypedDict
 from langgraph.graph import END, StateGraph, START
 from langgraph.types import Command
@@ -8,21 +9,16 @@ from .product_search_agent import product_search_agent_node
 from .product_info_agent import product_info_agent_node
 from .store_search_agent import store_search_agent_node
 from .store_info_agent import store_info_agent_node
-from lib.types import prebuilt_llm, State, VALID_AGENT_REQUESTS, AgentRequest
+from lib.types import get_llm, State, VALID_AGENT_REQUESTS, AgentRequest, Router, Plan, supervisor_options
+from lib import agent_registry
+from lib.fast_router import fast_route
+from lib.agent_utils import merge_worker_updates, state_summary
+from lib.conversation_summary import is_summary_message
 from firebase_functions import logger
 from .human_interaction_agent import human_interaction_node
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, BaseMessage
 from pydantic import Field
 
-# Define our possible routes
-
-supervisor_options = Literal["human_interaction", "product_search_agent", "product_info_agent", "store_search_agent", "store_info_agent", "end"]
-
-class Router(TypedDict):
-    next_agent: Literal["human_interaction", "product_search_agent", "product_info_agent", "store_search_agent", "store_info_agent", "end"]
-    request_type: Optional[str] = Field(default="analyze", description="The type of request being made")
-    request_info: Optional[Dict[str, Any]] = Field(default_factory=dict, description="Information for the target agent to process the request")
-
 system_prompt = """You are the workflow coordinator for Heritage Pool Plus's Pool Equipment Chat Agent. 
 This chatbot handles user queries related to pool equipment, store details, and product information. The assistant must be able to determine the best way to
 retrieve relevant data by interacting with multiple APIs and structuring responses in a way that's useful to the user.      
@@ -45,28 +41,57 @@ Your role is to analyze conversations and determine which specialized agent shou
 Rules:
 1. ALWAYS end with human_interaction for user communication
 2. When analyzing the output of an agent, look for a request. If the request must be fulfilled by the user, route to human_interaction.
+3. If the user's request needs several agents that do not depend on each other's output (for example a product's availability and the nearest store),
+   list them in parallel_agents so they run at the same time.
 
 Your response must be a JSON object with:
 {
     "next_agent": string,  // The agent to route to
+    "parallel_agents": [string] | null,  // Independent agents to run at the same time instead of next_agent
     "request_type": string,  // What you need from the agent
     "request_info": object   // Data needed for the request
 }
 
+Use request_type "price_check", "availability" or "store_hours" when that is all the user asks for, with the part numbers
+in request_info.part_numbers for price and availability checks.
+
 If a user query does not relate to pool equipment, store details, or product information, then route to human_interaction with request_info including "This is not a relevant question"
 """
 
+plan_prompt = """
+
+You are planning the whole turn at once. List every agent needed to answer the user's latest message, in the order they must run,
+and end with human_interaction. Each agent will see the output of the agents before it. Use the fewest steps possible, and only
+list an agent more than once if it genuinely needs the output of a later agent. Agents that do not need each other's output can
+share a step: put them in a list, e.g. ["product_info_agent", "store_search_agent"], and they will run at the same time.
+"""
+
+# "loop" asks the LLM for the next agent after every worker; "plan" plans the whole turn once
+SUPERVISOR_MODE = os.getenv("SUPERVISOR_MODE", "loop").lower()
+MAX_PLAN_STEPS = 4
+PLANNABLE_AGENTS = {"human_interaction", "product_search_agent", "product_info_agent", "store_search_agent", "store_info_agent"}
+
+# Worker agents that can be dispatched together by the fan_out node
+WORKER_NODES = {
+    "product_search_agent": product_search_agent_node,
+    "product_info_agent": product_info_agent_node,
+    "store_search_agent": store_search_agent_node,
+    "store_info_agent": store_info_agent_node,
+}
+
 def validate_agent_request(request: AgentRequest) -> bool:
     """Validate if an agent is allowed to make a request to another agent."""
     if request["requesting_agent"] not in VALID_AGENT_REQUESTS:
         return False
     return request["target_agent"] in VALID_AGENT_REQUESTS[request["requesting_agent"]]
 
-def analyze_conversation(messages: List[Dict[str, str]], current_agent: str) -> Router:
-    """Analyze the conversation to determine the next step."""
-    # Keep only the last N messages to prevent context overflow
+def format_recent_messages(messages: List[Dict[str, str]]) -> List[BaseMessage]:
+    """Convert the most recent messages to LangChain format for a supervisor prompt."""
+    # Keep only the last N messages to prevent context overflow, plus the summary of anything older
     MAX_MESSAGES = 5
-    recent_messages = messages[-MAX_MESSAGES:] if len(messages) > MAX_MESSAGES else messages
+    summary = [msg for msg in messages[:1] if is_summary_message(msg)]
+    messages = messages[len(summary):]
+    recent_messages = summary + (messages[-MAX_MESSAGES:] if len(messages) > MAX_MESSAGES else messages)
     
     # Convert messages to LangChain format
     formatted_messages = []
@@ -84,72 +109,204 @@ def analyze_conversation(messages: List[Dict[str, str]], current_agent: str) ->
                 formatted_messages.append(HumanMessage(content=content))
             elif msg["role"] == "assistant":
                 formatted_messages.append(AIMessage(content=content, name=msg.get("name")))
+    return formatted_messages
 
+def analysis_messages(messages: List[Dict[str, str]], current_agent: str) -> List[BaseMessage]:
     analysis_messages = [
         SystemMessage(content=system_prompt)
-    ] + formatted_messages + [HumanMessage(content="Please respond with a JSON : {next_agent: string, request_type: string, request_info: object}. Avoid \
+    ] + format_recent_messages(messages) + [HumanMessage(content="Please respond with a JSON : {next_agent: string, parallel_agents: [string] | null, request_type: string, request_info: object}. Avoid \
         calling the {current_agent} agent again as next_agent unless you want to use another tool. We want to emphasize speed and efficiency, so minimize the number of steps by listing out the steps you will take to solve the problem.")]
     logger.debug(f"Analysis messages: {analysis_messages}")
+    return analysis_messages
+
+async def analyze_conversation(messages: List[Dict[str, str]], current_agent: str) -> Router:
+    """Analyze the conversation to determine the next step."""
     # Use structured output to ensure we get a dictionary
-    response = prebuilt_llm.with_structured_output(Router).invoke(analysis_messages)
-    return response
+    return await get_llm().with_structured_output(Router).ainvoke(analysis_messages(messages, current_agent))
 
-def supervisor_node(state: State) -> Command[str]:
-    try:
-        logger.debug(f"Supervisor node state: {state}")
-        current_agent = state.get("current_agent")
-        pending_request = state.get("pending_request", None)
-        logger.debug(f"Pending request: {pending_request}")
-        # If we just came from human_interaction, end the flow
-        if current_agent == "human_interaction":
-            return Command(goto=END, update=state)
-            
-        # Process any pending requests
-        if pending_request:
-            request = pending_request
-            
-            # Validate the request
-            if not validate_agent_request(request):
-                logger.error(f"Invalid request from {request['requesting_agent']} to {request['target_agent']}")
-                # Route to human_interaction with error
-                return Command(
-                    goto="human_interaction",
-                    update={
-                        **state,
-                        "current_agent": "human_interaction",
-                        "pending_request": None,
-                        "conversation_state": {
-                            **state.get("conversation_state", {}),
-                            "error": f"Invalid request from {request['requesting_agent']}"
-                        }
-                    }
-                )
-            
-            # Route to the target agent
+def planning_messages(messages: List[Dict[str, str]]) -> List[BaseMessage]:
+    planning_messages = [
+        SystemMessage(content=system_prompt + plan_prompt)
+    ] + format_recent_messages(messages) + [HumanMessage(content="Please respond with a JSON : {steps: [string | [string]], request_type: string, request_info: object}.")]
+    logger.debug(f"Planning messages: {planning_messages}")
+    return planning_messages
+
+async def plan_conversation(messages: List[Dict[str, str]]) -> Plan:
+    """Plan every agent needed to answer the user's latest message in one LLM call."""
+    return await get_llm().with_structured_output(Plan).ainvoke(planning_messages(messages))
+
+def normalize_step(step: Union[str, List[str]]) -> Optional[Union[str, List[str]]]:
+    """A single agent name, or a list of two or more distinct worker agents to run in parallel."""
+    if isinstance(step, list):
+        agents = [agent for agent in dict.fromkeys(step) if agent in WORKER_NODES]
+        if len(agents) > 1:
+            return agents
+        return agents[0] if agents else None
+    return step if step in PLANNABLE_AGENTS else None
+
+def normalize_plan(steps: List[Union[str, List[str]]]) -> List[Union[str, List[str]]]:
+    """Drop unknown or repeated steps, cap the plan length and make sure it ends with human_interaction."""
+    plan = []
+    for step in steps:
+        step = normalize_step(step)
+        if step is None or (plan and plan[-1] == step):
+            continue
+        if step == "human_interaction":
+            break
+        plan.append(step)
+    return plan[:MAX_PLAN_STEPS - 1] + ["human_interaction"]
+
+def needs_new_plan(state: State) -> bool:
+    return state.get("plan") is None or bool(state.get("replan"))
+
+def fast_plan(state: State) -> Optional[Plan]:
+    """A one-step plan from the rule-based router, or None when the LLM has to plan."""
+    analysis = fast_route(state["messages"], state.get("current_agent"))
+    if analysis is None:
+        return None
+    return {
+        "steps": [analysis.get("parallel_agents") or analysis["next_agent"]],
+        "request_type": analysis.get("request_type"),
+        "request_info": analysis.get("request_info"),
+    }
+
+def request_fields(decision: Union[Router, Plan]) -> Dict[str, Any]:
+    """The request type and info of a routing decision or plan, as State updates."""
+    return {"request_type": decision.get("request_type"), "request_info": decision.get("request_info") or {}}
+
+def follow_plan(state: State, plan: List[Union[str, List[str]]], **update: Any) -> Command[str]:
+    next_agent, remaining = plan[0], plan[1:]
+    return route_to(state, next_agent, plan=remaining, replan=False, **update)
+
+async def next_planned_step(state: State) -> Command[str]:
+    """Plan mode: run the planned agents in order, asking the LLM again only when a worker needs more information."""
+    plan, update = state.get("plan"), {}
+    if needs_new_plan(state):
+        decision = fast_plan(state) or await plan_conversation(state["messages"])
+        plan, update = normalize_plan(decision["steps"]), request_fields(decision)
+        logger.debug(f"Plan: {plan}")
+    return follow_plan(state, plan, **update)
+
+def route_to(state: State, next_agent: Union[str, List[str]], **update: Any) -> Command[str]:
+    """Route to a single agent, or to the fan_out node when given several worker agents."""
+    if isinstance(next_agent, list):
+        agents = normalize_step(next_agent)
+        if isinstance(agents, list):
             return Command(
-                goto=request["target_agent"],
+                goto="fan_out",
                 update={
                     **state,
-                    "current_agent": request["target_agent"],
-                    "pending_request": None
+                    "current_agent": "fan_out",
+                    "parallel_agents": agents,
+                    **update
                 }
             )
+        next_agent = agents or "human_interaction"
+    return Command(
+        goto=next_agent,
+        update={
+            **state,
+            "current_agent": next_agent,
+            **update
+        }
+    )
+
+def fan_in(state: State, agents: List[str], results: List[Any]) -> Command[str]:
+    """Merge the results of parallel worker agents; failed agents are logged and left out."""
+    updates = []
+    for agent, result in zip(agents, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error in parallel agent {agent}: {str(result)}")
+        else:
+            updates.append(result.update)
+    if not updates:
+        raise RuntimeError(f"All parallel agents failed: {agents}")
+
+    merged = merge_worker_updates(state, updates)
+    # In loop mode the merged results go straight to the user unless a worker needs more information
+    goto = "supervisor" if SUPERVISOR_MODE == "plan" or merged["replan"] else "human_interaction"
+    return Command(
+        goto=goto,
+        update={
+            **merged,
+            "current_agent": "human_interaction" if goto == "human_interaction" else "fan_out",
+            "parallel_agents": None
+        }
+    )
+
+async def fan_out_node(state: State) -> Command[str]:
+    """Run independent worker agents at the same time, as tasks on the event loop, and merge their results into the state."""
+    agents = state.get("parallel_agents") or []
+    logger.debug(f"Running agents in parallel: {agents}")
+    results = await asyncio.gather(*(WORKER_NODES[agent](state) for agent in agents), return_exceptions=True)
+    return fan_in(state, agents, results)
+
+def immediate_route(state: State) -> Optional[Command[str]]:
+    """End the turn after human_interaction, or route a pending request to its target agent."""
+    current_agent = state.get("current_agent")
+    pending_request = state.get("pending_request", None)
+    logger.debug(f"Pending request: {pending_request}")
+    # If we just came from human_interaction, end the flow
+    if current_agent == "human_interaction":
+        return Command(goto=END, update=state)
         
-        # No pending requests, analyze conversation for next step
-        analysis = analyze_conversation(state["messages"], current_agent)
-        logger.debug(f"Analysis: {analysis}")
-        next_agent = analysis["next_agent"]
-        if next_agent == current_agent:
-            next_agent = "human_interaction"
+    # Process any pending requests
+    if pending_request:
+        request = pending_request
         
+        # Validate the request
+        if not validate_agent_request(request):
+            logger.error(f"Invalid request from {request['requesting_agent']} to {request['target_agent']}")
+            # Route to human_interaction with error
+            return Command(
+                goto="human_interaction",
+                update={
+                    **state,
+                    "current_agent": "human_interaction",
+                    "pending_request": None,
+                    "conversation_state": {
+                        **state.get("conversation_state", {}),
+                        "error": f"Invalid request from {request['requesting_agent']}"
+                    }
+                }
+            )
+        
+        # Route to the target agent
         return Command(
-            goto=next_agent,
+            goto=request["target_agent"],
             update={
                 **state,
-                "current_agent": next_agent
+                "current_agent": request["target_agent"],
+                "pending_request": None
             }
         )
-        
+    return None
+
+def route_after_analysis(state: State, analysis: Router) -> Command[str]:
+    logger.debug(f"Analysis: {analysis}")
+    next_agent = analysis.get("parallel_agents") or analysis["next_agent"]
+    if next_agent == state.get("current_agent"):
+        next_agent = "human_interaction"
+    # The request type describes the turn, so handing the results to human_interaction keeps it
+    update = request_fields(analysis) if next_agent != "human_interaction" else {}
+    return route_to(state, next_agent, **update)
+
+async def supervisor_node(state: State) -> Command[str]:
+    try:
+        logger.debug(f"Supervisor node state: {state_summary(state)}")
+        command = immediate_route(state)
+        if command is not None:
+            return command
+
+        if SUPERVISOR_MODE == "plan":
+            return await next_planned_step(state)
+
+        # No pending requests, try the rule-based router before asking the LLM
+        analysis = fast_route(state["messages"], state.get("current_agent"))
+        if analysis is None:
+            analysis = await analyze_conversation(state["messages"], state.get("current_agent"))
+        return route_after_analysis(state, analysis)
+
     except Exception as e:
         logger.error(f"Error in supervisor_node: {str(e)}")
         raise
@@ -157,18 +314,20 @@ def supervisor_node(state: State) -> Command[str]:
 def build_supervisor_graph():
     builder = StateGraph(State)
     
-    # Add nodes
+    # Add nodes. They are all async: get_llm_response runs the graph with
+    # astream, so there is no sync path through it.
     builder.add_node("supervisor", supervisor_node)
     builder.add_node("human_interaction", human_interaction_node)
-    builder.add_node("product_search_agent", product_search_agent_node)
-    builder.add_node("product_info_agent", product_info_agent_node)
-    builder.add_node("store_search_agent", store_search_agent_node)
-    builder.add_node("store_info_agent", store_info_agent_node)
+    for name, node in WORKER_NODES.items():
+        builder.add_node(name, node)
+    builder.add_node("fan_out", fan_out_node)
     # START always goes to supervisor
     builder.add_edge(START, "supervisor")
-    
-    
-    
-
-    
     return builder.compile()
+
+SUPERVISOR_GRAPH = "supervisor_graph"
+agent_registry.register(SUPERVISOR_GRAPH, build_supervisor_graph)
+
+def get_supervisor_graph():
+    """Return the process-wide compiled supervisor graph, compiling it on first use."""
+    return agent_registry.get(SUPERVISOR_GRAPH)
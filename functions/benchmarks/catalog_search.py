@@ -0,0 +1,82 @@
+"""Compare local product catalog search latency with the remote Klevu and Azure searches.
+
+Run from the functions directory:
+
+    python benchmarks/catalog_search.py --catalog catalog.json --remote
+    python benchmarks/catalog_search.py --synthetic 20000
+
+The remote searches bypass the response cache so every call is a real round trip.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.product_catalog import ProductCatalog, load_records  # noqa: E402
+
+DEFAULT_QUERIES = ["pool pump", "PS11752778", "filter cartridge", "chlorinator cell", "SP2610X15", "pump motor 1.5 hp", "skimmer basket"]
+
+WORDS = ["pump", "filter", "cartridge", "valve", "heater", "motor", "seal", "gasket", "basket", "skimmer", "cleaner",
+         "hose", "chlorinator", "cell", "salt", "lid", "o-ring", "impeller", "diffuser", "sand", "pressure", "gauge"]
+BRANDS = ["Hayward", "Pentair", "Jandy", "Zodiac", "Polaris", "Raypak"]
+
+
+def synthetic_records(count: int):
+    rng = random.Random(0)
+    for i in range(count):
+        words = rng.sample(WORDS, 3)
+        yield {
+            "product_name": " ".join(words).title(),
+            "description": " ".join(rng.choices(WORDS, k=20)),
+            "brand": rng.choice(BRANDS),
+            "part_number": f"PS{10000000 + i}",
+            "manufacturer_id": f"SP{1000 + i}X{rng.randint(10, 99)}",
+        }
+
+
+def timed(func, queries, repeat):
+    samples = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            func(query)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{name:<16} calls={len(samples):<5} mean={statistics.mean(samples):9.3f}ms  p50={statistics.median(samples):9.3f}ms  p95={p95:9.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--catalog", help="catalog export (JSON array or JSON Lines)")
+    parser.add_argument("--synthetic", type=int, default=5000, help="number of generated products when no catalog is given")
+    parser.add_argument("--queries", nargs="*", default=DEFAULT_QUERIES)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--remote", action="store_true", help="also time the remote Klevu and Azure searches")
+    args = parser.parse_args()
+
+    catalog = ProductCatalog()
+    start = time.perf_counter()
+    records = load_records(args.catalog) if args.catalog else list(synthetic_records(args.synthetic))
+    catalog.upsert(records)
+    print(f"Indexed {len(catalog)} products in {(time.perf_counter() - start) * 1000:.0f}ms: {catalog.stats()}")
+
+    report("catalog", timed(lambda query: catalog.search(query, 5), args.queries, args.repeat))
+    if args.remote:
+        from tools.product_tools import search_klevu_products, search_azure_products
+        remote_repeat = max(1, args.repeat // 10)
+        report("klevu", timed(lambda query: search_klevu_products.__wrapped__(query), args.queries, remote_repeat))
+        report("azure", timed(lambda query: search_azure_products.__wrapped__(query), args.queries, remote_repeat))
+        report("klevu+azure", timed(lambda query: (search_klevu_products.__wrapped__(query), search_azure_products.__wrapped__(query)), args.queries, remote_repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compare the size of raw PartSelect responses with what the page tools hand to the agent.
+
+Run from the functions directory:
+
+    python benchmarks/partselect_parsers.py --remote --model WDT780SAEM1
+    python benchmarks/partselect_parsers.py --files models.html parts.html
+    python benchmarks/partselect_parsers.py --synthetic 200
+
+For each page it reports the raw size, the size of the extracted page text and
+of the parsed records, the approximate tokens of each, and the parse time.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.context_builder import count_tokens  # noqa: E402
+from lib.html_extract import extract_page  # noqa: E402
+from lib.partselect_parsers import parse_models, parse_parts, parse_problems  # noqa: E402
+from lib.render import render_table  # noqa: E402
+
+PAGE_CHROME = "<html><head><script>" + "var analytics = {};" * 2000 + "</script><style>" + ".x{color:red}" * 1000 + "</style></head><body><nav>" + "<a href='/'>Menu</a>" * 200 + "</nav>"
+
+
+def synthetic_models_page(problems: int) -> str:
+    rows = "".join(
+        f"<li><a href='/instant-repairman/?handler=GetpartsList&ModelMasterID=1234&ProblemID={i}'>Problem {i}</a><p>How to fix problem {i}</p></li>"
+        for i in range(problems)
+    )
+    return PAGE_CHROME + f"<div><a href='/instant-repairman/?ModelMasterID=1234&ModelNum=WDT780SAEM1'>WDT780SAEM1 Dishwasher</a></div><ul>{rows}</ul></body></html>"
+
+
+def synthetic_parts_page(parts: int) -> str:
+    rows = "".join(
+        f"<tr><td><a href='/PS{11750000 + i}.htm'>Part {i} Door Gasket</a></td><td>PS{11750000 + i}</td>"
+        f"<td>Manufacturer Part Number: WP{3400000 + i}</td><td>${10 + i % 90}.95</td><td>{'In stock' if i % 3 else 'Backorder'}</td></tr>"
+        for i in range(parts)
+    )
+    return PAGE_CHROME + f"<table>{rows}</table></body></html>"
+
+
+def parsed(body: str, url: str) -> str:
+    sections = [("Models", parse_models(body, url)), ("Problems", parse_problems(body, url)), ("Parts", parse_parts(body, url))]
+    return "\n\n".join(f"{title}:\n{render_table(records)}" for title, records in sections if records)
+
+
+def report(name: str, body: str, url: str = "") -> None:
+    start = time.perf_counter()
+    text = extract_page([body], url).render()
+    extracted = time.perf_counter() - start
+    start = time.perf_counter()
+    records = parsed(body, url)
+    parse_seconds = time.perf_counter() - start
+    print(
+        f"{name:<24} raw={len(body):>9,} chars ({count_tokens(body):>7,} tok)  "
+        f"page text={len(text):>7,} ({count_tokens(text):>6,} tok, {extracted * 1000:6.1f}ms)  "
+        f"records={len(records):>7,} ({count_tokens(records):>6,} tok, {parse_seconds * 1000:6.1f}ms)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", nargs="*", default=[], help="saved responses to measure")
+    parser.add_argument("--synthetic", type=int, default=100, help="rows in the generated pages when no files are given")
+    parser.add_argument("--remote", action="store_true", help="also fetch live instant-repairman pages")
+    parser.add_argument("--model", default="WDT780SAEM1", help="model number for --remote")
+    args = parser.parse_args()
+
+    for path in args.files:
+        with open(path) as f:
+            report(os.path.basename(path), f.read())
+    if not args.files:
+        report("synthetic models", synthetic_models_page(args.synthetic))
+        report("synthetic parts", synthetic_parts_page(args.synthetic))
+    if args.remote:
+        from tools.request_tools import fetch_text
+        url = f"https://www.partselect.com/instant-repairman/?handler=SearchModels&ModelNum={args.model}"
+        body = fetch_text(url)
+        report("models (remote)", body, url)
+        problems = parse_problems(body, url)
+        if problems and problems[0].get("model_master_id"):
+            problem = problems[0]
+            url = f"https://www.partselect.com/instant-repairman/?handler=GetpartsList&ModelMasterID={problem['model_master_id']}&ProblemID={problem['problem_id']}"
+            report("parts (remote)", fetch_text(url), url)
+
+
+if __name__ == "__main__":
+    main()
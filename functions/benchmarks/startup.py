@@ -0,0 +1,91 @@
+"""Measure cold import time of the function entry point, per module.
+
+Run from the functions directory:
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --module langchain_client --top 20
+    python benchmarks/startup.py --budget 1.5
+
+Each run imports the module in a fresh interpreter with `-X importtime` (and
+PRELOAD_AGENTS=false, so the background preload does not overlap the
+measurement) and reports the median total and the slowest modules. With
+--budget the script exits non-zero when the median total is over the budget,
+so it can gate a deploy or CI step against import-time regressions.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+FUNCTIONS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# import time: self [us] | cumulative | imported package
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def profile_import(module: str) -> List[Tuple[str, int, float, float]]:
+    """(module, depth, self seconds, cumulative seconds) for every module imported by `import module`."""
+    env = dict(os.environ, PRELOAD_AGENTS="false")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=FUNCTIONS_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, (len(indent) - 1) // 2, int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return rows
+
+
+def top_level(rows: List[Tuple[str, int, float, float]], module: str) -> Dict[str, float]:
+    """Cumulative seconds per package imported directly by `module`, the cost of each of its import statements."""
+    # A module's line follows the lines of everything it imported
+    end = next(index for index, (name, depth, _, _) in enumerate(rows) if depth == 0 and name == module)
+    start = max((index + 1 for index in range(end) if rows[index][1] == 0), default=0)
+    totals: Dict[str, float] = {}
+    for name, depth, _, cumulative in rows[start:end]:
+        if depth == 1:
+            package = name.split(".")[0]
+            totals[package] = totals.get(package, 0.0) + cumulative
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main", help="module to import (default main)")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters to measure; the median is reported")
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--budget", type=float, default=None, help="fail when the median import takes longer than this many seconds")
+    args = parser.parse_args()
+
+    # The first import may compile bytecode; measure warm .pyc files like a deployed instance
+    profile_import(args.module)
+    runs = [profile_import(args.module) for _ in range(args.runs)]
+    totals = [next(cumulative for name, _, _, cumulative in rows if name == args.module) for rows in runs]
+    total = statistics.median(totals)
+    rows = runs[totals.index(total)]
+
+    print(f"import {args.module}: {total:.3f}s median of {args.runs} ({', '.join(f'{t:.3f}' for t in totals)})")
+    print("\nBy top-level package (cumulative):")
+    for package, seconds in sorted(top_level(rows, args.module).items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {seconds:8.3f}s  {package}")
+    print("\nBy module (self):")
+    for name, _, self_seconds, _ in sorted(rows, key=lambda row: -row[2])[:args.top]:
+        print(f"  {self_seconds:8.3f}s  {name}")
+
+    if args.budget is not None:
+        if total > args.budget:
+            print(f"\nOver budget: {total:.3f}s > {args.budget:.3f}s")
+            sys.exit(1)
+        print(f"\nWithin budget: {total:.3f}s <= {args.budget:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,91 @@
-from langchain.schema import HumanMessage, SystemMessage, AIMessage
+from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from firebase_functions import logger
 from dotenv import load_dotenv
-from agents.supervisor_agent import build_supervisor_graph
+from agents.supervisor_agent import get_supervisor_graph, SUPERVISOR_MODE
 from lib.types import State
+from lib import agent_registry
 import json
 from lib.agent_utils import convert_dict_to_langchain_messages
+from lib.turn_stats import TurnStats, LLMCallCounter, TraceHandler, set_last_turn
+from lib.tracing import current_trace, export_trace, start_trace, tracing_to
+from lib.reply_stream import BackgroundSink, streaming_to
+from lib.async_runtime import run_sync
+from lib.store_index import get_store_index
+from lib.response_cache import get_response_cache
+from lib.page_cache import PAGE_CACHE_WARM, get_page_cache
+from tools.request_tools import warm_page_cache
+import asyncio
+import threading
 load_dotenv()
 
+def warm_up() -> None:
+    """Cold-start work, run by main's preload thread: build the supervisor graph and every
+    react agent so the first message does not compile them, and start loading the store index
+    (and, with PAGE_CACHE_WARM, the repair guides) in the background."""
+    try:
+        agent_registry.warm_up()
+    except Exception as e:
+        logger.error(f"Failed to warm up agent registry: {str(e)}")
+
+    # Start loading the store index in the background so the first store question is served from memory
+    store_index = get_store_index()
+    if store_index is not None:
+        store_index.maybe_refresh()
+
+    # Fetch the repair guides into the page cache in the background
+    if PAGE_CACHE_WARM and get_page_cache() is not None:
+        threading.Thread(target=warm_page_cache, name="page-cache-warm", daemon=True).start()
+
+
+def get_llm_response(messages, on_reply_chunk=None):
+    """Run the supervisor graph on the conversation and return (message, output_image).
+
+    If `on_reply_chunk(body, media_url=None)` is given, the final reply is also streamed to it
+    in parts as it is generated. Blocking wrapper around aget_llm_response; the turn runs on
+    the shared background event loop.
+    """
+    return run_sync(aget_llm_response(messages, on_reply_chunk))
+
+
+async def aget_llm_response(messages, on_reply_chunk=None):
+    """Async variant of get_llm_response. `on_reply_chunk` may block; it is called off the event loop."""
+    trace = start_trace(SUPERVISOR_MODE)
+    with tracing_to(trace):
+        try:
+            return await _arespond(messages, on_reply_chunk)
+        finally:
+            if trace is not None:
+                await asyncio.to_thread(export_trace, trace.finish())
+
+
+async def _arespond(messages, on_reply_chunk=None):
+    response_cache = get_response_cache()
+    query = next((message.get("content") for message in reversed(messages) if isinstance(message, dict) and message.get("role") == "user"), None)
+    history = messages[:-1]
+    cached = response_cache.get(query, history) if response_cache is not None and query else None
+    if cached is not None:
+        logger.debug(f"Response cache hit: {response_cache.stats()}")
+        message, image = cached
+        if on_reply_chunk:
+            await asyncio.to_thread(on_reply_chunk, message, **({"media_url": image} if image else {}))
+        return cached
+
+    sink = BackgroundSink(on_reply_chunk) if on_reply_chunk else None
+    try:
+        with streaming_to(sink):
+            output_message, output_image, final_state = await _aget_llm_response(messages)
+    finally:
+        if sink is not None:
+            await sink.aclose()
+    if response_cache is not None and query:
+        response_cache.put(query, (output_message, output_image), final_state, history)
+    return output_message, output_image
 
 
-def get_llm_response(messages):
+async def _aget_llm_response(messages):
     try:
         # Convert incoming messages to LangChain format
-        logger.debug(f"Converting messages to langchain format: {messages}")
+        logger.debug(f"Converting {len(messages)} messages to langchain format")
         try:
             langchain_messages = convert_dict_to_langchain_messages(messages)
             logger.debug("Messages converted successfully")
@@ -30,16 +103,21 @@ def get_llm_response(messages):
             raise
 
         try:
-            logger.debug("Building supervisor graph")
-            graph = build_supervisor_graph()
-            logger.debug("Supervisor graph built successfully")
+            logger.debug("Getting supervisor graph")
+            graph = get_supervisor_graph()
+            logger.debug(f"Agent registry metrics: {agent_registry.get_metrics()}")
         except Exception as e:
             logger.error(f"Failed to build graph: {str(e)}")
             raise
 
         try:
             logger.debug("Running supervisor graph")
-            response = graph.stream(state)
+            turn_stats = TurnStats(SUPERVISOR_MODE)
+            callbacks = [LLMCallCounter(turn_stats)]
+            trace = current_trace()
+            if trace is not None:
+                callbacks.append(TraceHandler(trace))
+            response = graph.astream(state, config={"callbacks": callbacks})
             logger.debug("Graph stream created successfully")
         except Exception as e:
             logger.error(f"Failed to create graph stream: {str(e)}")
@@ -50,14 +128,17 @@ def get_llm_response(messages):
         
         output_image = None
         output = None
+        # The structured results the reply was built from, for the response cache
+        final_state = {}
         try:
             logger.debug("Processing chunks")
-            for chunk in response:
-                logger.debug(f"Processing chunk: {json.dumps(chunk, default=str)}")
+            async for chunk in response:
                 chunks.append(chunk)
                 for node_name, data in chunk.items():
-                    logger.debug(f"Processing node {node_name}")
-                    logger.debug(f"Data: {json.dumps(data, default=str)}")
+                    # Only the updated keys: serializing the whole state on every chunk cost more than the turn's tracing
+                    logger.debug(f"Processing node {node_name}: {', '.join(data) if isinstance(data, dict) else type(data).__name__}")
+                    turn_stats.record_node(node_name)
+                    final_state.update({key: data[key] for key in ("products", "stores", "pricing", "agent_results") if isinstance(data, dict) and key in data})
                     if "messages" in data:
                         messages = data["messages"]
                         if messages and isinstance(messages[-1], AIMessage):
@@ -74,7 +155,9 @@ def get_llm_response(messages):
         except Exception as e:
             logger.error(f"Failed to process chunks: {str(e)}")
             raise
-        return output_message, output_image
+        set_last_turn(turn_stats.finish())
+        logger.info(f"Turn stats: {turn_stats.as_dict()}")
+        return output_message, output_image, final_state
         
     except Exception as e:
         logger.error(f"Error in get_llm_response: {str(e)}")
@@ -0,0 +1,91 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from firebase_functions import logger
+
+# Process-level registry for compiled graphs and prebuilt react agents.
+# Builders are registered at import time and built once (at cold start via
+# warm_up, or lazily on first use); warm instances reuse the same objects.
+
+_builders: Dict[str, Callable[[], Any]] = {}
+_instances: Dict[str, Any] = {}
+_metrics: Dict[str, Dict[str, float]] = {}
+_lock = threading.RLock()
+
+
+def registry_key(name: str, response_format: Optional[type] = None) -> str:
+    """Build the registry key for an agent, e.g. `product_search_agent:ProductList`."""
+    if response_format is None:
+        return name
+    return f"{name}:{response_format.__name__}"
+
+
+def register(key: str, builder: Callable[[], Any]) -> None:
+    """Register a zero-argument builder under `key`. Re-registering drops any built instance."""
+    with _lock:
+        _builders[key] = builder
+        _instances.pop(key, None)
+        _metrics.setdefault(key, {"build_seconds": 0.0, "builds": 0, "hits": 0})
+
+
+def register_agent(name: str, response_format: Optional[type], builder: Callable[[], Any]) -> None:
+    register(registry_key(name, response_format), builder)
+
+
+def get(key: str) -> Any:
+    """Return the instance for `key`, building it on first use."""
+    instance = _instances.get(key)
+    if instance is not None:
+        _metrics[key]["hits"] += 1
+        return instance
+
+    with _lock:
+        instance = _instances.get(key)
+        if instance is not None:
+            _metrics[key]["hits"] += 1
+            return instance
+        if key not in _builders:
+            raise KeyError(f"Nothing registered under {key}")
+
+        start = time.perf_counter()
+        instance = _builders[key]()
+        elapsed = time.perf_counter() - start
+
+        _instances[key] = instance
+        _metrics[key]["build_seconds"] += elapsed
+        _metrics[key]["builds"] += 1
+        logger.debug(f"Built {key} in {elapsed:.3f}s")
+        return instance
+
+
+def get_agent(name: str, response_format: Optional[type] = None) -> Any:
+    return get(registry_key(name, response_format))
+
+
+def warm_up() -> Dict[str, Any]:
+    """Build everything that has been registered. Returns the registry metrics."""
+    start = time.perf_counter()
+    for key in list(_builders):
+        get(key)
+    logger.info(f"Agent registry warmed up {len(_instances)} entries in {time.perf_counter() - start:.3f}s")
+    return get_metrics()
+
+
+def reset() -> None:
+    """Drop all built instances, keeping the registered builders."""
+    with _lock:
+        _instances.clear()
+        for entry in _metrics.values():
+            entry.update({"build_seconds": 0.0, "builds": 0, "hits": 0})
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Build-time metrics: per-entry build seconds, build count and reuse hits."""
+    with _lock:
+        entries = {key: dict(values) for key, values in _metrics.items()}
+    return {
+        "registered": len(_builders),
+        "built": len(_instances),
+        "total_build_seconds": sum(entry["build_seconds"] for entry in entries.values()),
+        "entries": entries,
+    }
@@ -1,5 +1,8 @@
 from typing import Dict, Any, List, Optional, Callable
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, BaseMessage
+from langgraph.types import Command
+from lib.context_builder import build_context, fit_messages, result_message_content
+from lib.render import merge_records, product_key, render_result, store_key, structured_records
 
 def convert_dict_to_langchain_messages(messages: List[Dict[str, str]]) -> List[BaseMessage]:
     """Convert dictionary messages to LangChain message format."""
@@ -17,3 +20,82 @@ def convert_dict_to_langchain_messages(messages: List[Dict[str, str]]) -> List[B
     return converted_messages
 
 
+def state_summary(state: Dict[str, Any]) -> str:
+    """The fields set in a graph state, with sizes for lists and dicts, for debug logs that should not render the values."""
+    return ", ".join(
+        f"{key}={len(value)}" if isinstance(value, (list, dict)) else key
+        for key, value in state.items() if value not in (None, "", [], {})
+    )
+
+
+def needs_followup(structured_response: Optional[Dict[str, Any]]) -> bool:
+    """True if a worker's structured response asks for information it could not get itself."""
+    if not isinstance(structured_response, dict):
+        return False
+    return bool(structured_response.get("info_needed") or structured_response.get("pending_request"))
+
+
+def pending_request_prompt(state: Dict[str, Any], pending_request: Dict[str, Any], agent_name: str) -> str:
+    """Prompt a worker agent answers another agent's pending request with."""
+    return f"You have a pending request from the {pending_request.get('requesting_agent')} agent. Use the provided tools to provide a response. \
+                      Use the information provided by  {pending_request.get('request_info')}  to respond to the user. Here is what is known about the conversation:\n{build_context(state, agent_name)}\n\
+                      If a given number is ambigious, ask the user to clarify which number they are referring to."
+
+
+def worker_input(state: Dict[str, Any], agent_name: str) -> Dict[str, Any]:
+    """The state an agent is invoked with, its messages trimmed to the agent's token budget."""
+    return {**state, "messages": fit_messages(state["messages"], agent_name)}
+
+
+def record_updates(state: Dict[str, Any], structured_response: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """State's products, stores and prices with a worker's results merged in."""
+    records = structured_records(structured_response)
+    pricing = {
+        product["part_number"]: product["price"]
+        for product in records["products"] if isinstance(product, dict) and product.get("part_number") and product.get("price")
+    }
+    return {
+        "products": merge_records(state.get("products"), records["products"], product_key),
+        "stores": merge_records(state.get("stores"), records["stores"], store_key),
+        "pricing": {**(state.get("pricing") or {}), **pricing},
+    }
+
+
+def worker_command(state: Dict[str, Any], agent_name: str, structured_response: Optional[Dict[str, Any]], **update: Any) -> Command[str]:
+    """Hand a worker agent's result back to the supervisor."""
+    content = render_result(agent_name, structured_response) or f"{agent_name}: no results"
+    return Command(
+        goto="supervisor",
+        update={
+            "messages": state["messages"] + [AIMessage(content=result_message_content(content))],
+            "replan": needs_followup(structured_response),
+            "agent_results": {**(state.get("agent_results") or {}), agent_name: structured_response},
+            **record_updates(state, structured_response),
+            **update
+        }
+    )
+
+
+def merge_worker_updates(state: Dict[str, Any], updates: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge the updates of workers that ran in parallel from the same state.
+
+    Each worker returns the full message list with its own messages appended, so only the
+    messages past the shared prefix are kept, in the order the updates are given.
+    """
+    base_messages = state["messages"]
+    merged = {
+        "messages": list(base_messages),
+        "replan": False,
+        "agent_results": dict(state.get("agent_results") or {}),
+        "products": list(state.get("products") or []),
+        "stores": list(state.get("stores") or []),
+        "pricing": dict(state.get("pricing") or {}),
+    }
+    for update in updates:
+        merged["messages"].extend(update.get("messages", base_messages)[len(base_messages):])
+        merged["replan"] = merged["replan"] or bool(update.get("replan"))
+        merged["agent_results"].update(update.get("agent_results") or {})
+        merged["products"] = merge_records(merged["products"], update.get("products") or [], product_key)
+        merged["stores"] = merge_records(merged["stores"], update.get("stores") or [], store_key)
+        merged["pricing"].update(update.get("pricing") or {})
+    return merged
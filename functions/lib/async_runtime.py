@@ -0,0 +1,43 @@
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional, TypeVar
+
+# A single event loop on a daemon thread, shared by every synchronous caller.
+# The sync entry points (get_llm_response) submit their coroutine here and
+# block on the result, so concurrent conversations share one loop, one pooled
+# async HTTP client and one set of in-flight cache loads instead of each
+# holding a thread for the whole turn.
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _run_loop(loop: asyncio.AbstractEventLoop) -> None:
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared background event loop, starting it on first use."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=_run_loop, args=(loop,), name="async-runtime", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coroutine: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+    """Run a coroutine on the shared loop and wait for its result."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        coroutine.close()
+        raise RuntimeError("run_sync() called from a running event loop; await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coroutine, get_loop()).result(timeout)
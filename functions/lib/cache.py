@@ -0,0 +1,212 @@
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from lib import tracing
+
+# In-process response cache for backend lookups. Each endpoint gets its own
+# TTL + LRU cache; concurrent identical requests share a single backend call.
+# Cached values are shared between callers and must be treated as read-only.
+# Sync and async variants of a tool share the same cache.
+
+# Seconds a successful response stays fresh, per endpoint
+CACHE_TTL_SECONDS: Dict[str, float] = {
+    "klevu_search": 600,
+    "azure_search": 600,
+    "product_details": 3600,
+    "pricing": 30,
+    "store_search": 3600,
+    "store_details": 86400,
+}
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAXSIZE = 512
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache:
+    def __init__(self, name: str, ttl: float, maxsize: int = DEFAULT_MAXSIZE):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, _InFlight] = {}
+        self._async_in_flight: Dict[Tuple[int, Hashable], "asyncio.Future"] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return (hit, value) without loading."""
+        with self._lock:
+            return self._lookup(key)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], should_cache: Callable[[Any], bool] = lambda value: True) -> Any:
+        """Return the cached value for `key`, or call `loader` once for all concurrent callers."""
+        with self._lock:
+            hit, value = self._lookup(key)
+            if hit:
+                self.hits += 1
+                tracing.record_cache(self.name, "hit")
+                return value
+            call = self._in_flight.get(key)
+            leader = call is None
+            tracing.record_cache(self.name, "miss" if leader else "coalesced")
+            if leader:
+                self.misses += 1
+                call = self._in_flight[key] = _InFlight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = loader()
+            if should_cache(call.result):
+                self.set(key, call.result)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            call.done.set()
+
+    async def aget_or_load(self, key: Hashable, loader: Callable[[], Any], should_cache: Callable[[Any], bool] = lambda value: True) -> Any:
+        """Async counterpart of `get_or_load`; `loader` returns an awaitable."""
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self._lock:
+            hit, value = self._lookup(key)
+            if hit:
+                self.hits += 1
+                tracing.record_cache(self.name, "hit")
+                return value
+            future = self._async_in_flight.get(flight_key)
+            leader = future is None
+            tracing.record_cache(self.name, "miss" if leader else "coalesced")
+            if leader:
+                self.misses += 1
+                future = self._async_in_flight[flight_key] = loop.create_future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            result = await loader()
+            if should_cache(result):
+                self.set(key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting for it
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._async_in_flight.pop(flight_key, None)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_caches: Dict[str, TTLCache] = {}
+
+
+def get_cache(name: str) -> TTLCache:
+    """Return the cache for endpoint `name`, creating it with the configured TTL."""
+    cache = _caches.get(name)
+    if cache is None:
+        cache = _caches.setdefault(name, TTLCache(name, CACHE_TTL_SECONDS.get(name, DEFAULT_TTL_SECONDS)))
+    return cache
+
+
+def is_successful_response(value: Any) -> bool:
+    """Tools return the error message as a string on failure; only cache real responses."""
+    return value is not None and not isinstance(value, str)
+
+
+def cached(name: str, key: Optional[Callable[..., Hashable]] = None, should_cache: Callable[[Any], bool] = is_successful_response):
+    """Cache a tool function's results in the `name` endpoint cache.
+
+    `key` maps the call arguments to a cache key; by default the positional and keyword
+    arguments are used as-is.
+    """
+    cache = get_cache(name)
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                cache_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+                return await cache.aget_or_load(cache_key, lambda: func(*args, **kwargs), should_cache)
+            async_wrapper.cache = cache
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            return cache.get_or_load(cache_key, lambda: func(*args, **kwargs), should_cache)
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage
+from firebase_functions import logger
+from lib.conversation_summary import is_summary_message
+from lib.patterns import ZIP_PATTERN, find_part_numbers, find_store_ids
+from lib.render import render_result, render_state_records
+
+# Token-budgeted prompt context. Instead of stringifying the whole State into
+# a prompt, each agent gets the fields it needs (the last user message, the ids
+# mentioned in the conversation, the request it is answering and earlier
+# agents' structured results, then the conversation summary), assembled in
+# priority order until its token budget is spent. Message lists passed to agents are trimmed the same way,
+# newest first. Every trim is counted so the savings show up in the logs.
+
+TOKENIZER_MODEL = os.getenv("TOKENIZER_MODEL", "gpt-4o")
+# Rough characters per token, used when tiktoken or its encoding files are unavailable
+CHARS_PER_TOKEN = 4
+
+# Prompt budgets in tokens, per agent
+AGENT_BUDGETS: Dict[str, int] = {
+    "supervisor": 2000,
+    "product_search_agent": 1500,
+    "product_info_agent": 1500,
+    "store_search_agent": 800,
+    "store_info_agent": 800,
+    "human_interaction": 3000,
+}
+DEFAULT_BUDGET = 1500
+# Budget for one worker's result as it is added to the conversation
+RESULT_MESSAGE_BUDGET = int(os.getenv("RESULT_MESSAGE_BUDGET", "600"))
+TRUNCATION_MARKER = " …[trimmed]"
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+_stats = {"prompts": 0, "tokens": 0, "trimmed_tokens": 0}
+_stats_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+                except Exception as e:
+                    logger.warn(f"tiktoken unavailable ({e}), estimating tokens from length")
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate(text: str, budget: int) -> Tuple[str, int]:
+    """`text` cut to at most `budget` tokens, TRUNCATION_MARKER included, and the number of tokens removed."""
+    tokens = count_tokens(text)
+    if tokens <= budget:
+        return text, 0
+    encoding = _get_encoding()
+    encoded = encoding.encode(text, disallowed_special=()) if encoding is not None else None
+    keep = budget - count_tokens(TRUNCATION_MARKER)
+    while keep > 0:
+        kept = (text[:keep * CHARS_PER_TOKEN] if encoded is None else encoding.decode(encoded[:keep])) + TRUNCATION_MARKER
+        # Tokens can merge across the cut, so check the result rather than assume it fits
+        if count_tokens(kept) <= budget:
+            return kept, tokens - keep
+        keep -= 1
+    return "", tokens
+
+
+def _record(agent_name: str, tokens: int, trimmed: int) -> None:
+    with _stats_lock:
+        _stats["prompts"] += 1
+        _stats["tokens"] += tokens
+        _stats["trimmed_tokens"] += trimmed
+    if trimmed:
+        logger.debug(f"Context for {agent_name}: {tokens} tokens, trimmed {trimmed}")
+
+
+def get_context_stats() -> Dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def compact(value: Any) -> str:
+    """Compact JSON with empty fields dropped."""
+    def prune(item):
+        if isinstance(item, dict):
+            return {key: prune(val) for key, val in item.items() if val not in (None, "", [], {})}
+        if isinstance(item, (list, tuple)):
+            return [prune(val) for val in item]
+        return item
+    if isinstance(value, str):
+        return value
+    return json.dumps(prune(value), default=str, ensure_ascii=False, separators=(",", ":"))
+
+
+def _content(message: Any) -> str:
+    return message.get("content", "") if isinstance(message, dict) else str(getattr(message, "content", ""))
+
+
+def _is_user(message: Any) -> bool:
+    return isinstance(message, HumanMessage) or (isinstance(message, dict) and message.get("role") == "user")
+
+
+def mentioned_ids(messages: List[Any]) -> Dict[str, List[str]]:
+    """Part numbers, store ids and ZIP codes the user has mentioned, most recent first."""
+    part_numbers, store_ids, zip_codes = [], [], []
+    for message in reversed(messages):
+        if not _is_user(message):
+            continue
+        text = _content(message)
+        message_store_ids, _ = find_store_ids(text)
+        store_ids.extend(message_store_ids)
+        zip_codes.extend(zip_code for zip_code in ZIP_PATTERN.findall(text) if zip_code not in message_store_ids)
+        part_numbers.extend(find_part_numbers(text, message_store_ids))
+    ids = {"part_numbers": part_numbers, "store_ids": store_ids, "zip_codes": zip_codes}
+    return {key: list(dict.fromkeys(values)) for key, values in ids.items() if values}
+
+
+def build_context(state: Dict[str, Any], agent_name: str, budget: Optional[int] = None) -> str:
+    """The parts of `state` an agent needs, highest priority first, within its token budget."""
+    budget = budget or AGENT_BUDGETS.get(agent_name, DEFAULT_BUDGET)
+    messages = state.get("messages") or []
+    last_user = next((_content(message) for message in reversed(messages) if _is_user(message)), None)
+    ids = mentioned_ids(messages)
+    summary = next((_content(message) for message in messages if is_summary_message(message)), None)
+    sections = [
+        f"Latest user message: {last_user}" if last_user else None,
+        f"Ids mentioned by the user: {compact(ids)}" if ids else None,
+        f"Request: {compact(state.get('pending_request'))}" if state.get("pending_request") else None,
+        render_state_records(state),
+    ]
+    # Newest results first, so older ones are the first to be trimmed
+    for name, result in reversed(list((state.get("agent_results") or {}).items())):
+        if name != agent_name and result:
+            sections.append(render_result(name, result, include_records=False))
+    sections.append(summary)
+
+    parts, used, trimmed = [], 0, 0
+    for section in filter(None, sections):
+        text, cut = truncate(section, budget - used)
+        trimmed += cut
+        if text:
+            parts.append(text)
+            used += count_tokens(text)
+    _record(agent_name, used, trimmed)
+    return "\n".join(parts)
+
+
+def fit_messages(messages: List[BaseMessage], agent_name: str, budget: Optional[int] = None) -> List[BaseMessage]:
+    """The newest messages that fit in the agent's budget, always keeping the summary and the last user message."""
+    budget = budget or AGENT_BUDGETS.get(agent_name, DEFAULT_BUDGET)
+    summary = [message for message in messages[:1] if is_summary_message(message)]
+    kept, used, trimmed = [], sum(count_tokens(_content(message)) for message in summary), 0
+    recent = messages[len(summary):]
+    # Keep a contiguous run of the newest messages, reaching back at least to the last user message
+    last_user = max((i for i, message in enumerate(recent) if _is_user(message)), default=len(recent))
+    for i in range(len(recent) - 1, -1, -1):
+        tokens = count_tokens(_content(recent[i]))
+        if used + tokens > budget and i < last_user:
+            trimmed = sum(count_tokens(_content(message)) for message in recent[:i + 1])
+            break
+        kept.append(recent[i])
+        used += tokens
+    _record(agent_name, used, trimmed)
+    return summary + list(reversed(kept))
+
+
+def result_message_content(structured_response: Any) -> str:
+    """A worker's structured result as it is added to the conversation: compact and within RESULT_MESSAGE_BUDGET."""
+    text, trimmed = truncate(compact(structured_response), RESULT_MESSAGE_BUDGET)
+    if trimmed:
+        _record("result_message", count_tokens(text), trimmed)
+    return text
@@ -0,0 +1,48 @@
+import os
+from typing import Dict, List
+from firebase_functions import logger
+from lib.history_store import ConversationStore
+from lib.utils import fold_into_summary
+
+# Rolling per-conversation summary. Agents see the summary plus the last
+# CONTEXT_MESSAGES messages instead of the whole transcript. After each turn,
+# the messages that fell out of that window are folded into the stored
+# summary, so each update only sends the newly dropped messages to the LLM
+# and prompt size stays flat as the conversation grows.
+
+SUMMARY_ENABLED = os.getenv("CONVERSATION_SUMMARY", "true").lower() == "true"
+CONTEXT_MESSAGES = int(os.getenv("CONTEXT_MESSAGES", "6"))
+# Upper bound on messages folded in one update, e.g. when summaries are first enabled on a long history
+MAX_FOLD_MESSAGES = 40
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+
+def summary_message(summary: str) -> Dict[str, str]:
+    return {"role": "system", "content": f"{SUMMARY_PREFIX} {summary}"}
+
+
+def is_summary_message(message) -> bool:
+    content = message.get("content") if isinstance(message, dict) else getattr(message, "content", "")
+    return isinstance(content, str) and content.startswith(SUMMARY_PREFIX)
+
+
+def conversation_context(store: ConversationStore, phone_number: str, keep_last: int = CONTEXT_MESSAGES) -> List[Dict[str, str]]:
+    """The stored summary (if any) followed by the last `keep_last` messages."""
+    summary, _ = store.get_summary(phone_number)
+    messages = store.recent(phone_number, keep_last)
+    return ([summary_message(summary)] if summary else []) + messages
+
+
+def update_summary(store: ConversationStore, phone_number: str, keep_last: int = CONTEXT_MESSAGES) -> bool:
+    """Fold messages that have left the context window into the summary. Returns True if it changed."""
+    window = store.recent_with_ids(phone_number, keep_last)
+    if not window:
+        return False
+    summary, through_id = store.get_summary(phone_number)
+    dropped = store.between(phone_number, through_id, window[0][0], MAX_FOLD_MESSAGES)
+    if not dropped:
+        return False
+    summary = fold_into_summary(summary, [message for _, message in dropped])
+    store.set_summary(phone_number, summary, dropped[-1][0])
+    logger.debug(f"Folded {len(dropped)} messages into the summary for {phone_number}")
+    return True
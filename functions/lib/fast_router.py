@@ -0,0 +1,116 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage
+from firebase_functions import logger
+from lib.patterns import ZIP_PATTERN, confirmed_part_number, find_part_numbers, find_store_ids, mentions, normalize_text
+from lib.types import Router
+
+# Deterministic pre-router for the supervisor. Obvious intents (greetings, bare
+# part numbers, store ids, ZIP codes and coordinates) are routed without an LLM
+# call; anything ambiguous returns None so the supervisor falls back to the LLM.
+
+FAST_ROUTER_ENABLED = os.getenv("FAST_ROUTER", "true").lower() == "true"
+MIN_CONFIDENCE = float(os.getenv("FAST_ROUTER_MIN_CONFIDENCE", "0.8"))
+
+GREETINGS = {
+    "hi", "hello", "hey", "hiya", "yo", "good morning", "good afternoon", "good evening",
+    "thanks", "thank you", "thank you so much", "thx", "ty", "ok", "okay", "cool", "great", "bye", "goodbye",
+}
+STORE_WORDS = {"store", "stores", "location", "locations", "branch", "near", "nearest", "closest", "nearby", "hours", "open", "address"}
+PRICE_WORDS = {"price", "prices", "pricing", "cost", "costs", "how much"}
+STOCK_WORDS = {"stock", "in stock", "available", "availability", "inventory", "on hand"}
+HOURS_WORDS = {"hours", "open", "close", "closing", "opening"}
+
+COMMAND_PATTERN = re.compile(r"^/\w+$")
+COORDINATES_PATTERN = re.compile(r"(-?\d{1,2}\.\d+)\s*,\s*(-?\d{1,3}\.\d+)")
+# Confidence of a route that rests on a number that may be either a store id or a ZIP code,
+# or on a code-like token that is neither PS/W-prefixed nor in the product catalog
+AMBIGUOUS_CONFIDENCE = 0.6
+
+
+def _last_user_message(messages: List[Any]) -> Optional[str]:
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return message.content
+        if isinstance(message, BaseMessage):
+            continue
+        if message.get("role") == "user":
+            return message.get("content")
+    return None
+
+
+def _route(next_agent: str, request_type: str, request_info: Dict[str, Any]) -> Router:
+    return {"next_agent": next_agent, "request_type": request_type, "request_info": request_info}
+
+
+def classify(text: str) -> Tuple[Optional[Router], float]:
+    """Return a routing decision for a user message and the confidence in it."""
+    normalized = normalize_text(text)
+    if not normalized:
+        return None, 0.0
+
+    if COMMAND_PATTERN.match(normalized):
+        return _route("human_interaction", "command", {"command": normalized}), 0.95
+
+    if normalized.rstrip(".!?,") in GREETINGS:
+        return _route("human_interaction", "greeting", {}), 0.95
+
+    store_context = mentions(normalized, STORE_WORDS)
+    store_ids, ambiguous_store_id = find_store_ids(text)
+    coordinates = COORDINATES_PATTERN.search(text)
+    zip_codes = ZIP_PATTERN.findall(text)
+    part_numbers = find_part_numbers(text, store_ids)
+
+    store_routes = []
+    if store_ids:
+        request_type = "store_hours" if mentions(normalized, HOURS_WORDS) else "store_details"
+        store_routes.append((_route("store_info_agent", request_type, {"store_id": store_ids[0]}), AMBIGUOUS_CONFIDENCE if ambiguous_store_id else 0.9))
+    elif coordinates:
+        latitude, longitude = float(coordinates.group(1)), float(coordinates.group(2))
+        store_routes.append((_route("store_search_agent", "store_search", {"latitude": latitude, "longitude": longitude}), 0.9 if store_context else 0.7))
+    elif zip_codes and store_context:
+        store_routes.append((_route("store_search_agent", "store_search", {"zip_code": zip_codes[0]}), 0.85))
+
+    product_routes = []
+    if part_numbers:
+        if mentions(normalized, PRICE_WORDS):
+            request_type = "price_check"
+        elif mentions(normalized, STOCK_WORDS):
+            request_type = "availability"
+        else:
+            request_type = "product_details"
+        if not all(confirmed_part_number(number) for number in part_numbers):
+            confidence = AMBIGUOUS_CONFIDENCE
+        else:
+            confidence = 0.95 if len(normalized.split()) == 1 else 0.85
+        product_routes.append((_route("product_info_agent", request_type, {"part_numbers": part_numbers}), confidence))
+
+    # Compound questions (a part and a store) run both agents at the same time
+    if store_routes and product_routes:
+        (product_route, product_confidence), (store_route, store_confidence) = product_routes[0], store_routes[0]
+        return {
+            **product_route,
+            "parallel_agents": [product_route["next_agent"], store_route["next_agent"]],
+            "request_info": {**product_route["request_info"], **store_route["request_info"]},
+        }, min(product_confidence, store_confidence)
+    routes = store_routes or product_routes
+    if not routes:
+        return None, 0.0
+    return routes[0]
+
+
+def fast_route(messages: List[Any], current_agent: Optional[str] = None) -> Optional[Router]:
+    """Route the start of a turn without the LLM, or return None when the supervisor should ask the LLM."""
+    # Only the first hop of a turn is decided from the user message alone; once a worker
+    # has answered, the supervisor needs to read its output.
+    if not FAST_ROUTER_ENABLED or current_agent is not None:
+        return None
+    text = _last_user_message(messages)
+    if not text:
+        return None
+    decision, confidence = classify(text)
+    if decision is None or confidence < MIN_CONFIDENCE:
+        return None
+    logger.debug(f"Fast router sent message to {decision['next_agent']} ({decision['request_type']}, confidence {confidence})")
+    return decision
@@ -0,0 +1,82 @@
+import csv
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from firebase_functions import logger
+
+# Vectorized haversine index over a fixed set of points. The store catalog is
+# small enough (thousands of points) that one NumPy pass over every point is
+# faster than walking a tree in Python, so queries compute all distances at
+# once and only sort the points that matter.
+
+EARTH_RADIUS_MILES = 3958.8
+
+# Optional CSV of ZIP code centroids (zip,latitude,longitude) used to resolve "nearest store to ZIP X"
+ZIP_CENTROIDS_PATH = os.getenv("ZIP_CENTROIDS_PATH", "")
+
+
+def haversine_miles(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Distances in miles from one point to arrays of points, all in radians."""
+    a = np.sin((latitudes - latitude) / 2) ** 2 + np.cos(latitude) * np.cos(latitudes) * np.sin((longitudes - longitude) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GeoIndex:
+    def __init__(self, ids: Sequence[str], coordinates: Sequence[Tuple[float, float]]):
+        self.ids = list(ids)
+        points = np.radians(np.asarray(coordinates, dtype=np.float64).reshape(-1, 2))
+        self.latitudes = np.ascontiguousarray(points[:, 0])
+        self.longitudes = np.ascontiguousarray(points[:, 1])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def distances(self, latitude: float, longitude: float) -> np.ndarray:
+        return haversine_miles(np.radians(latitude), np.radians(longitude), self.latitudes, self.longitudes)
+
+    def _page(self, order: np.ndarray, distances: np.ndarray, page_size: int, page: int) -> List[Tuple[str, float]]:
+        start = (max(int(page), 1) - 1) * int(page_size)
+        return [(self.ids[i], float(distances[i])) for i in order[start:start + int(page_size)]]
+
+    def within(self, latitude: float, longitude: float, radius: float, page_size: int = 10, page: int = 1) -> Tuple[List[Tuple[str, float]], int]:
+        """One page of (id, miles) within `radius` miles, nearest first, and the total number of matches."""
+        if not self.ids:
+            return [], 0
+        distances = self.distances(latitude, longitude)
+        matches = np.flatnonzero(distances <= radius)
+        order = matches[np.argsort(distances[matches], kind="stable")]
+        return self._page(order, distances, page_size, page), len(matches)
+
+    def nearest(self, latitude: float, longitude: float, page_size: int = 10, page: int = 1) -> List[Tuple[str, float]]:
+        """One page of the (id, miles) nearest to the point, nearest first."""
+        if not self.ids:
+            return []
+        distances = self.distances(latitude, longitude)
+        k = min(max(int(page), 1) * int(page_size), len(self.ids))
+        # Only the first k points need to be sorted
+        candidates = np.argpartition(distances, k - 1)[:k] if k < len(self.ids) else np.arange(len(self.ids))
+        order = candidates[np.argsort(distances[candidates], kind="stable")]
+        return self._page(order, distances, page_size, page)
+
+
+_zip_centroids: Optional[Dict[str, Tuple[float, float]]] = None
+
+
+def get_zip_centroids() -> Dict[str, Tuple[float, float]]:
+    """ZIP code -> (latitude, longitude) from ZIP_CENTROIDS_PATH, or an empty table when it is not set."""
+    global _zip_centroids
+    if _zip_centroids is None:
+        centroids = {}
+        if ZIP_CENTROIDS_PATH:
+            try:
+                with open(ZIP_CENTROIDS_PATH, newline="") as f:
+                    for row in csv.reader(f):
+                        try:
+                            centroids[row[0].strip().zfill(5)] = (float(row[1]), float(row[2]))
+                        except (IndexError, ValueError):
+                            continue
+                logger.info(f"Loaded {len(centroids)} ZIP centroids")
+            except OSError as e:
+                logger.error(f"Error loading ZIP centroids from {ZIP_CENTROIDS_PATH}: {e}")
+        _zip_centroids = centroids
+    return _zip_centroids
@@ -0,0 +1,192 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from firebase_functions import logger
+
+# Conversation history backends. Messages are appended as they are received or
+# sent and read back per phone number, so building history no longer depends on
+# the total volume of the Twilio account. Each conversation can also keep a
+# running summary of the messages older than the context window, stored with
+# the id of the last message folded into it.
+
+
+class ConversationStore:
+    """Interface for conversation history backends."""
+
+    def append(self, phone_number: str, role: str, content: str) -> None:
+        raise NotImplementedError
+
+    def recent(self, phone_number: str, limit: int) -> List[Dict[str, str]]:
+        """Return the last `limit` messages for `phone_number`, oldest first."""
+        raise NotImplementedError
+
+    def clear(self, phone_number: str) -> int:
+        """Delete every message and the summary for `phone_number`. Returns the number of messages deleted."""
+        raise NotImplementedError
+
+    def recent_with_ids(self, phone_number: str, limit: int) -> List[Tuple[int, Dict[str, str]]]:
+        """Like `recent`, with each message's id. Ids increase with every append."""
+        raise NotImplementedError
+
+    def between(self, phone_number: str, after_id: int, before_id: int, limit: int) -> List[Tuple[int, Dict[str, str]]]:
+        """Up to `limit` of the newest messages with after_id < id < before_id, oldest first."""
+        raise NotImplementedError
+
+    def get_summary(self, phone_number: str) -> Tuple[Optional[str], int]:
+        """The running summary and the id of the last message it covers (0 if there is none)."""
+        raise NotImplementedError
+
+    def set_summary(self, phone_number: str, summary: str, through_id: int) -> None:
+        raise NotImplementedError
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Process-local store. History is lost when the instance is recycled."""
+
+    def __init__(self, max_messages: int = 200):
+        self.max_messages = max_messages
+        self._conversations: Dict[str, Deque[Tuple[int, Dict[str, str]]]] = {}
+        self._summaries: Dict[str, Tuple[str, int]] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def append(self, phone_number: str, role: str, content: str) -> None:
+        with self._lock:
+            conversation = self._conversations.setdefault(phone_number, deque(maxlen=self.max_messages))
+            conversation.append((self._next_id, {"role": role, "content": content}))
+            self._next_id += 1
+
+    def recent(self, phone_number: str, limit: int) -> List[Dict[str, str]]:
+        return [message for _, message in self.recent_with_ids(phone_number, limit)]
+
+    def recent_with_ids(self, phone_number: str, limit: int) -> List[Tuple[int, Dict[str, str]]]:
+        with self._lock:
+            conversation = self._conversations.get(phone_number)
+            if not conversation:
+                return []
+            start = max(len(conversation) - limit, 0)
+            return [(conversation[i][0], dict(conversation[i][1])) for i in range(start, len(conversation))]
+
+    def between(self, phone_number: str, after_id: int, before_id: int, limit: int) -> List[Tuple[int, Dict[str, str]]]:
+        with self._lock:
+            messages = [(message_id, dict(message)) for message_id, message in self._conversations.get(phone_number, ()) if after_id < message_id < before_id]
+        return messages[-limit:] if limit > 0 else []
+
+    def get_summary(self, phone_number: str) -> Tuple[Optional[str], int]:
+        with self._lock:
+            return self._summaries.get(phone_number, (None, 0))
+
+    def set_summary(self, phone_number: str, summary: str, through_id: int) -> None:
+        with self._lock:
+            self._summaries[phone_number] = (summary, through_id)
+
+    def clear(self, phone_number: str) -> int:
+        with self._lock:
+            self._summaries.pop(phone_number, None)
+            conversation = self._conversations.pop(phone_number, None)
+            return len(conversation) if conversation else 0
+
+
+class SqliteConversationStore(ConversationStore):
+    """SQLite-backed store. Reads use the (phone_number, id) index, so they cost O(limit)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    phone_number TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS messages_phone_number_id ON messages (phone_number, id)"
+            )
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS summaries (
+                    phone_number TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    through_id INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+
+    def append(self, phone_number: str, role: str, content: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO messages (phone_number, role, content, created_at) VALUES (?, ?, ?, ?)",
+                (phone_number, role, content, time.time()),
+            )
+
+    def recent(self, phone_number: str, limit: int) -> List[Dict[str, str]]:
+        return [message for _, message in self.recent_with_ids(phone_number, limit)]
+
+    def recent_with_ids(self, phone_number: str, limit: int) -> List[Tuple[int, Dict[str, str]]]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, role, content FROM messages WHERE phone_number = ? ORDER BY id DESC LIMIT ?",
+                (phone_number, limit),
+            ).fetchall()
+        return [(message_id, {"role": role, "content": content}) for message_id, role, content in reversed(rows)]
+
+    def between(self, phone_number: str, after_id: int, before_id: int, limit: int) -> List[Tuple[int, Dict[str, str]]]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, role, content FROM messages WHERE phone_number = ? AND id > ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (phone_number, after_id, before_id, limit),
+            ).fetchall()
+        return [(message_id, {"role": role, "content": content}) for message_id, role, content in reversed(rows)]
+
+    def get_summary(self, phone_number: str) -> Tuple[Optional[str], int]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT summary, through_id FROM summaries WHERE phone_number = ?", (phone_number,)
+            ).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+    def set_summary(self, phone_number: str, summary: str, through_id: int) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO summaries (phone_number, summary, through_id, updated_at) VALUES (?, ?, ?, ?)",
+                (phone_number, summary, through_id, time.time()),
+            )
+
+    def clear(self, phone_number: str) -> int:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM summaries WHERE phone_number = ?", (phone_number,))
+            cursor = self._connection.execute("DELETE FROM messages WHERE phone_number = ?", (phone_number,))
+        return cursor.rowcount
+
+
+_store: Optional[ConversationStore] = None
+_store_lock = threading.Lock()
+
+
+def create_history_store(backend: str = None) -> ConversationStore:
+    """Create the backend named by `backend` or the HISTORY_BACKEND env var ("sqlite" or "memory")."""
+    backend = (backend or os.getenv("HISTORY_BACKEND", "sqlite")).lower()
+    if backend == "memory":
+        return InMemoryConversationStore()
+    if backend == "sqlite":
+        return SqliteConversationStore(os.getenv("HISTORY_DB_PATH", "/tmp/conversation_history.db"))
+    raise ValueError(f"Unknown history backend: {backend}")
+
+
+def get_history_store() -> ConversationStore:
+    """Return the process-wide conversation store."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_history_store()
+                logger.info(f"Using {type(_store).__name__} for conversation history")
+    return _store
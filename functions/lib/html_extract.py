@@ -0,0 +1,221 @@
+import os
+import re
+from html.parser import HTMLParser
+from typing import AsyncIterable, Dict, Iterable, List, Optional
+from urllib.parse import urljoin
+
+# Incremental HTML-to-text extraction for PartSelect pages. The parser is fed
+# the response as it arrives from the socket and keeps only what the agents use:
+# visible text (without scripts, styles, navigation and other page chrome), the
+# PartSelect ids found in links and attributes (problem ids, model master ids,
+# part numbers) and the page's links. The page is never buffered whole: text
+# stops at the text cap, while ids and links, which often come after the
+# content, are collected until the page ends or PAGE_MAX_BYTES is read.
+
+# Characters of page text kept for the agent
+PAGE_TEXT_MAX_CHARS = int(os.getenv("PAGE_TEXT_MAX_CHARS", "6000"))
+# Bytes read from the socket before giving up on the rest of the page
+PAGE_MAX_BYTES = int(os.getenv("PAGE_MAX_BYTES", "2000000"))
+MAX_LINKS = 40
+MAX_IDS_PER_NAME = 20
+CHUNK_BYTES = 16384
+
+# Elements whose content is never shown to the agent. A header is only skipped
+# at page level; inside an article or section it holds that content's title.
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "iframe", "head"}
+SECTIONING_TAGS = {"article", "section", "main", "aside"}
+# Elements that end a line of text
+BLOCK_TAGS = {"p", "div", "li", "tr", "br", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "table", "ul", "ol", "dt", "dd"}
+# Void elements have no end tag, so they must not open a skipped block
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+# Query parameters and data attributes that carry PartSelect ids
+ID_PARAMETER_PATTERN = re.compile(r"\b(ModelMasterID|ProblemID|ModelID|ModelNum|InventoryID|PartID)=([\w-]+)", re.IGNORECASE)
+ID_NAMES = {
+    "modelmasterid": "model_master_id",
+    "problemid": "problem_id",
+    "modelid": "model_id",
+    "modelnum": "model_id",
+    "inventoryid": "part_id",
+    "partid": "part_id",
+}
+PART_NUMBER_PATTERN = re.compile(r"\bPS\d{5,}\b")
+WHITESPACE = re.compile(r"\s+")
+
+
+class ChromeFilter:
+    """Tracks whether a parser is inside an element whose content is skipped."""
+
+    def __init__(self):
+        self.depth = 0
+        self._sections = 0
+        # Whether each open header is the page's (skipped) or a section's
+        self._headers: List[bool] = []
+
+    def start(self, tag: str) -> None:
+        if tag in VOID_TAGS:
+            return
+        if tag == "header":
+            self._headers.append(self._sections == 0)
+            if self._headers[-1]:
+                self.depth += 1
+        elif tag in SKIPPED_TAGS:
+            self.depth += 1
+        elif tag in SECTIONING_TAGS:
+            self._sections += 1
+
+    def end(self, tag: str) -> bool:
+        """Close `tag`; True if it ended a skipped element."""
+        if tag in VOID_TAGS:
+            return False
+        if tag == "header":
+            skipped = self._headers.pop() if self._headers else self._sections == 0
+        elif tag in SKIPPED_TAGS:
+            skipped = True
+        else:
+            if tag in SECTIONING_TAGS:
+                self._sections = max(self._sections - 1, 0)
+            return False
+        if skipped:
+            self.depth = max(self.depth - 1, 0)
+        return skipped
+
+
+class PageExtractor(HTMLParser):
+    def __init__(self, base_url: str = "", max_chars: int = PAGE_TEXT_MAX_CHARS, max_links: int = MAX_LINKS):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.max_chars = max_chars
+        self.max_links = max_links
+        self.title = ""
+        self.links: Dict[str, str] = {}
+        self.ids: Dict[str, List[str]] = {}
+        self.truncated = False
+        self.bytes_read = 0
+        self._lines: List[str] = []
+        self._line: List[str] = []
+        self._chars = 0
+        self._chrome = ChromeFilter()
+        self._in_title = False
+        self._link: Optional[str] = None
+        self._link_text: List[str] = []
+
+    def _add_id(self, name: str, value: str) -> None:
+        values = self.ids.setdefault(ID_NAMES.get(name.lower(), name.lower()), [])
+        if value not in values and len(values) < MAX_IDS_PER_NAME:
+            values.append(value)
+
+    def _scan_attributes(self, attrs) -> None:
+        for name, value in attrs:
+            if not value:
+                continue
+            for id_name, id_value in ID_PARAMETER_PATTERN.findall(value):
+                self._add_id(id_name, id_value)
+            if name.startswith("data-") and name.endswith("id") and value.strip().isalnum():
+                self._add_id(name[len("data-"):].replace("-", ""), value.strip())
+
+    def _end_line(self) -> None:
+        line = WHITESPACE.sub(" ", "".join(self._line)).strip()
+        self._line = []
+        # Scanned per line rather than per data call, which can split a number across socket chunks
+        for part_number in PART_NUMBER_PATTERN.findall(line):
+            self._add_id("part_number", part_number)
+        if not line or self.truncated:
+            return
+        if self._chars + len(line) > self.max_chars:
+            line = line[:max(self.max_chars - self._chars, 0)]
+            self.truncated = True
+        if line:
+            self._lines.append(line)
+            self._chars += len(line) + 1
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        self._chrome.start(tag)
+        self._scan_attributes(attrs)
+        if self._chrome.depth:
+            return
+        if tag in BLOCK_TAGS:
+            self._end_line()
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href and not href.startswith(("#", "javascript:", "mailto:", "tel:")):
+                self._link = urljoin(self.base_url, href)
+                self._link_text = []
+
+    def handle_startendtag(self, tag, attrs):
+        self._scan_attributes(attrs)
+        if tag == "br" and not self._chrome.depth:
+            self._end_line()
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        if self._chrome.end(tag) or self._chrome.depth:
+            return
+        if tag == "a" and self._link:
+            text = WHITESPACE.sub(" ", "".join(self._link_text)).strip()
+            if text and self._link not in self.links and len(self.links) < self.max_links:
+                self.links[self._link] = text
+            self._link = None
+        if tag in BLOCK_TAGS:
+            self._end_line()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        if self._chrome.depth:
+            return
+        self._line.append(data)
+        if self._link is not None:
+            self._link_text.append(data)
+
+    def feed_chunk(self, chunk: str) -> None:
+        self.bytes_read += len(chunk)
+        self.feed(chunk)
+
+    def close(self) -> None:
+        super().close()
+        self._end_line()
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self._lines)
+
+    def render(self) -> str:
+        """The extracted page as compact text for an agent."""
+        sections = []
+        if self.title.strip():
+            sections.append(f"Title: {WHITESPACE.sub(' ', self.title).strip()}")
+        if self.ids:
+            sections.append("Ids:\n" + "\n".join(f"{name}: {', '.join(values)}" for name, values in self.ids.items()))
+        sections.append("Text:\n" + self.text + (" …[page truncated]" if self.truncated else ""))
+        if self.links:
+            sections.append("Links:\n" + "\n".join(f"{text}: {url}" for url, text in self.links.items()))
+        return "\n\n".join(sections)
+
+
+def extract_page(chunks: Iterable[str], base_url: str = "", max_bytes: int = PAGE_MAX_BYTES) -> PageExtractor:
+    """Feed decoded chunks to a PageExtractor until the page ends or max_bytes is read."""
+    extractor = PageExtractor(base_url)
+    for chunk in chunks:
+        # Only a chunk past the cap shows that the page was cut short
+        if extractor.bytes_read >= max_bytes:
+            extractor.truncated = True
+            break
+        extractor.feed_chunk(chunk)
+    extractor.close()
+    return extractor
+
+
+async def aextract_page(chunks: AsyncIterable[str], base_url: str = "", max_bytes: int = PAGE_MAX_BYTES) -> PageExtractor:
+    """Async variant of extract_page."""
+    extractor = PageExtractor(base_url)
+    async for chunk in chunks:
+        if extractor.bytes_read >= max_bytes:
+            extractor.truncated = True
+            break
+        extractor.feed_chunk(chunk)
+    extractor.close()
+    return extractor
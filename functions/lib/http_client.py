@@ -0,0 +1,320 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from typing import Any, Dict, Optional, Tuple
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from firebase_functions import logger
+from lib import tracing
+
+# Shared transport for every tool that talks to the backend or PartSelect.
+# One pooled keep-alive session, per-endpoint (connect, read) timeouts, bounded
+# retries with jittered backoff on 429/5xx, a circuit breaker per endpoint and
+# per-endpoint latency/error counters. The async variants (arequest, aget,
+# apost) share the retry policy, breakers and counters, with one pooled
+# httpx.AsyncClient per event loop.
+
+DEFAULT_TIMEOUT: Tuple[float, float] = (3.05, 20)
+ENDPOINT_TIMEOUTS: Dict[str, Tuple[float, float]] = {
+    "klevu_search": (3.05, 10),
+    "azure_search": (3.05, 15),
+    "product_details": (3.05, 10),
+    "pricing": (3.05, 10),
+    "store_search": (3.05, 10),
+    "store_details": (3.05, 10),
+    "partselect_page": (3.05, 20),
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 2
+BACKOFF_BASE_SECONDS = 0.25
+BACKOFF_MAX_SECONDS = 2.0
+
+POOL_CONNECTIONS = 8  # number of hosts with a cached connection pool
+POOL_MAXSIZE = 16  # connections kept alive per host
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30.0
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while an endpoint's circuit is open."""
+
+
+# Everything the sync or async transport can raise for a failed request
+HTTP_ERRORS = (requests.exceptions.RequestException, httpx.HTTPError)
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and lets one trial request through after `reset_timeout`."""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """End a request that neither succeeded nor failed (it was cancelled) without changing the state."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+def _new_stats() -> Dict[str, Any]:
+    return {
+        "requests": 0,
+        "errors": 0,
+        "retries": 0,
+        "circuit_rejections": 0,
+        "total_seconds": 0.0,
+        "max_seconds": 0.0,
+        "status_codes": {},
+    }
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_breakers: Dict[str, CircuitBreaker] = {}
+_stats: Dict[str, Dict[str, Any]] = {}
+_stats_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the pooled async client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=POOL_CONNECTIONS * POOL_MAXSIZE, max_keepalive_connections=POOL_MAXSIZE)
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def _breaker(endpoint: str) -> CircuitBreaker:
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        with _stats_lock:
+            breaker = _breakers.setdefault(endpoint, CircuitBreaker())
+    return breaker
+
+
+def _record(endpoint: str, elapsed: float = 0.0, status: Optional[int] = None, error: bool = False, retry: bool = False, rejected: bool = False) -> None:
+    tracing.record_http(endpoint, elapsed, status=status, error=error, retry=retry, rejected=rejected)
+    with _stats_lock:
+        stats = _stats.setdefault(endpoint, _new_stats())
+        if rejected:
+            stats["circuit_rejections"] += 1
+            stats["errors"] += 1
+            return
+        stats["requests"] += 1
+        stats["total_seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+        if status is not None:
+            stats["status_codes"][status] = stats["status_codes"].get(status, 0) + 1
+        if error:
+            stats["errors"] += 1
+        if retry:
+            stats["retries"] += 1
+
+
+def _backoff(attempt: int, response: Optional[Any] = None) -> float:
+    """Full-jitter exponential backoff, honouring a numeric Retry-After header up to the cap."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX_SECONDS)
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+def request(endpoint: str, method: str, url: str, **kwargs) -> requests.Response:
+    """Send a request through the shared session.
+
+    Retries connection errors, timeouts, 429 and 5xx responses up to MAX_RETRIES times.
+    Raises requests.exceptions.RequestException subclasses on failure, so callers can keep
+    handling errors the way they did with bare `requests` calls.
+    """
+    breaker = _breaker(endpoint)
+    if not breaker.allow():
+        _record(endpoint, rejected=True)
+        raise CircuitOpenError(f"Circuit open for {endpoint}, not calling {url}")
+
+    kwargs.setdefault("timeout", ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+    session = get_session()
+    for attempt in range(MAX_RETRIES + 1):
+        retrying = attempt < MAX_RETRIES
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            _record(endpoint, time.perf_counter() - start, error=True, retry=retrying)
+            if not retrying:
+                breaker.record_failure()
+                raise
+            logger.warn(f"{endpoint} request failed ({e}), retrying")
+            time.sleep(_backoff(attempt))
+            continue
+        except Exception:
+            # Anything else (a bad URL, a redirect loop, a broken body) fails at once. It is often the
+            # caller's input, such as an LLM-chosen URL, so it is not counted against the endpoint,
+            # but it must still end a half-open trial
+            _record(endpoint, time.perf_counter() - start, error=True)
+            breaker.release()
+            raise
+        except BaseException:
+            # Cancelled or interrupted: not the endpoint's fault, but the trial slot must be freed
+            breaker.release()
+            raise
+
+        status = response.status_code
+        failed = status in RETRY_STATUSES
+        _record(endpoint, time.perf_counter() - start, status=status, error=failed or status >= 400, retry=failed and retrying)
+        if failed and retrying:
+            logger.warn(f"{endpoint} returned {status}, retrying")
+            response.close()
+            time.sleep(_backoff(attempt, response))
+            continue
+
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+
+def get(endpoint: str, url: str, **kwargs) -> requests.Response:
+    return request(endpoint, "GET", url, **kwargs)
+
+
+def post(endpoint: str, url: str, **kwargs) -> requests.Response:
+    return request(endpoint, "POST", url, **kwargs)
+
+
+async def arequest(endpoint: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """Async counterpart of `request`, with the same retries, circuit breaker and counters.
+
+    Accepts the same keyword arguments as `request` for the options the tools use
+    (`headers`, `json`, `timeout`, `allow_redirects`, `stream`). A streamed response must
+    be closed by the caller. Raises httpx.HTTPError subclasses or CircuitOpenError on failure.
+    """
+    breaker = _breaker(endpoint)
+    if not breaker.allow():
+        _record(endpoint, rejected=True)
+        raise CircuitOpenError(f"Circuit open for {endpoint}, not calling {url}")
+
+    connect_timeout, read_timeout = kwargs.pop("timeout", ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+    kwargs["timeout"] = httpx.Timeout(read_timeout, connect=connect_timeout)
+    follow_redirects = kwargs.pop("allow_redirects", True)
+    stream = kwargs.pop("stream", False)
+    client = get_async_client()
+    for attempt in range(MAX_RETRIES + 1):
+        retrying = attempt < MAX_RETRIES
+        start = time.perf_counter()
+        try:
+            response = await client.send(client.build_request(method, url, **kwargs), stream=stream, follow_redirects=follow_redirects)
+        except httpx.TransportError as e:
+            _record(endpoint, time.perf_counter() - start, error=True, retry=retrying)
+            if not retrying:
+                breaker.record_failure()
+                raise
+            logger.warn(f"{endpoint} request failed ({e}), retrying")
+            await asyncio.sleep(_backoff(attempt))
+            continue
+        except Exception:
+            # Anything else (a bad URL, a redirect loop, a broken body) fails at once. It is often the
+            # caller's input, such as an LLM-chosen URL, so it is not counted against the endpoint,
+            # but it must still end a half-open trial
+            _record(endpoint, time.perf_counter() - start, error=True)
+            breaker.release()
+            raise
+        except BaseException:
+            # Cancelled or interrupted: not the endpoint's fault, but the trial slot must be freed
+            breaker.release()
+            raise
+
+        status = response.status_code
+        failed = status in RETRY_STATUSES
+        _record(endpoint, time.perf_counter() - start, status=status, error=failed or status >= 400, retry=failed and retrying)
+        if failed and retrying:
+            logger.warn(f"{endpoint} returned {status}, retrying")
+            await response.aclose()
+            await asyncio.sleep(_backoff(attempt, response))
+            continue
+
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+
+async def aget(endpoint: str, url: str, **kwargs) -> httpx.Response:
+    return await arequest(endpoint, "GET", url, **kwargs)
+
+
+async def apost(endpoint: str, url: str, **kwargs) -> httpx.Response:
+    return await arequest(endpoint, "POST", url, **kwargs)
+
+
+def get_endpoint_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-endpoint request, error and retry counters plus mean/max latency."""
+    with _stats_lock:
+        snapshot = {}
+        for endpoint, stats in _stats.items():
+            entry = dict(stats, status_codes=dict(stats["status_codes"]))
+            entry["mean_seconds"] = stats["total_seconds"] / stats["requests"] if stats["requests"] else 0.0
+            breaker = _breakers.get(endpoint)
+            entry["circuit"] = breaker.state if breaker else "closed"
+            snapshot[endpoint] = entry
+        return snapshot
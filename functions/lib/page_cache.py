@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, NamedTuple, Optional
+from firebase_functions import logger
+from lib import tracing
+
+# Disk cache for scraped PartSelect pages. Each entry holds what a page tool
+# returned for a URL (extracted text or parsed records, zlib-compressed) with
+# the response's ETag and Last-Modified. Within its kind's freshness window an
+# entry is served without touching the network; after that it is revalidated
+# with a conditional GET, and a 304 keeps the stored text. The file is bounded
+# by PAGE_CACHE_MAX_BYTES, evicting the least recently used entries.
+
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE", "true").lower() == "true"
+PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH", "/tmp/page_cache.db")
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Load the repair guides into the cache at cold start
+PAGE_CACHE_WARM = os.getenv("PAGE_CACHE_WARM", "false").lower() == "true"
+
+# Seconds an entry is served without revalidation, by the kind of page
+FRESH_SECONDS: Dict[str, float] = {
+    "repair_guide": 7 * 86400,
+    "blog": 86400,
+    "models": 86400,
+    "search": 3600,
+    "page": 3600,
+    # Parts lists carry prices, so they are always revalidated
+    "parts": 0,
+}
+DEFAULT_FRESH_SECONDS = 3600
+COMPRESSION_LEVEL = 6
+
+
+class CachedPage(NamedTuple):
+    text: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+
+class PageCache:
+    def __init__(self, path: str = PAGE_CACHE_PATH, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS pages (
+                    key TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)")
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(kind: str, url: str) -> str:
+        return f"{kind}:{url}"
+
+    def get(self, kind: str, url: str) -> Optional[CachedPage]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM pages WHERE key = ?", (self.key(kind, url),)
+            ).fetchone()
+        if row is None:
+            return None
+        body, etag, last_modified, fetched_at = row
+        return CachedPage(zlib.decompress(body).decode("utf-8"), etag, last_modified, fetched_at)
+
+    def is_fresh(self, kind: str, page: CachedPage) -> bool:
+        return time.time() - page.fetched_at < FRESH_SECONDS.get(kind, DEFAULT_FRESH_SECONDS)
+
+    def conditional_headers(self, page: Optional[CachedPage]) -> Dict[str, str]:
+        """Validators for a conditional GET of a cached page."""
+        headers = {}
+        if page is not None and page.etag:
+            headers["If-None-Match"] = page.etag
+        if page is not None and page.last_modified:
+            headers["If-Modified-Since"] = page.last_modified
+        return headers
+
+    def record_hit(self, kind: str, url: str, revalidated: bool = False) -> None:
+        """Mark an entry as used; a revalidated entry also starts a new freshness window."""
+        now = time.time()
+        with self._lock, self._connection:
+            tracing.record_cache("page_cache", "revalidated" if revalidated else "hit")
+            if revalidated:
+                self.revalidated += 1
+                self._connection.execute("UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE key = ?", (now, now, self.key(kind, url)))
+            else:
+                self.hits += 1
+                self._connection.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (now, self.key(kind, url)))
+
+    def put(self, kind: str, url: str, text: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        body = zlib.compress(text.encode("utf-8"), COMPRESSION_LEVEL)
+        now = time.time()
+        tracing.record_cache("page_cache", "miss")
+        with self._lock, self._connection:
+            self.misses += 1
+            self._connection.execute(
+                "INSERT OR REPLACE INTO pages (key, body, size, etag, last_modified, fetched_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.key(kind, url), body, len(body), etag, last_modified, now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._connection.execute("SELECT key, size FROM pages ORDER BY accessed_at").fetchall():
+            self._connection.execute("DELETE FROM pages WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM pages")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+            lookups = self.hits + self.revalidated + self.misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.revalidated) / lookups if lookups else 0.0,
+            }
+
+
+_page_cache: Optional[PageCache] = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> Optional[PageCache]:
+    """Return the process-wide page cache, or None if PAGE_CACHE is off or the file cannot be opened."""
+    global _page_cache
+    if not PAGE_CACHE_ENABLED:
+        return None
+    if _page_cache is None:
+        with _page_cache_lock:
+            if _page_cache is None:
+                try:
+                    _page_cache = PageCache()
+                except sqlite3.Error as e:
+                    logger.error(f"Page cache {PAGE_CACHE_PATH} unavailable: {e}")
+                    return None
+    return _page_cache
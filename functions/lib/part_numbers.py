@@ -0,0 +1,21 @@
+import re
+
+# Part and manufacturer numbers are written many ways ("PS-11752778", "ps 11752778",
+# "W10321304"). normalize_part_number reduces them to one lookup form: upper case,
+# no separators, and no PartSelect "PS" / Whirlpool-style "W" prefix in front of
+# a numeric id.
+
+SEPARATORS = re.compile(r"[\s\-_./]+")
+PREFIXED_ID = re.compile(r"^(?:PS|W)(\d+)$")
+
+
+def compact_part_number(part_number: str) -> str:
+    """Upper case without spaces, dashes, dots or slashes."""
+    return SEPARATORS.sub("", str(part_number)).upper()
+
+
+def normalize_part_number(part_number: str) -> str:
+    """The canonical lookup form of a part or manufacturer number."""
+    compact = compact_part_number(part_number)
+    match = PREFIXED_ID.match(compact)
+    return match.group(1) if match else compact
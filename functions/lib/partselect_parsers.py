@@ -0,0 +1,291 @@
+import json
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin
+from typing_extensions import TypedDict
+from lib.html_extract import ID_NAMES, ID_PARAMETER_PATTERN, WHITESPACE, ChromeFilter
+
+# Parsers for the PartSelect responses the data agent works with. Instead of
+# handing the agent a page and asking it to find ModelMasterID and ProblemID in
+# it, the tools return typed records: models with their master ids, problems
+# with their ids, parts with numbers and prices, and a boolean compatibility
+# result. Both HTML partials and JSON handler responses are understood; ids are
+# read from links, onclick handlers and data attributes.
+
+MAX_RECORDS = 25
+
+PART_NUMBER_PATTERN = re.compile(r"\bPS\d{5,}\b")
+PRICE_PATTERN = re.compile(r"\$\s?\d[\d,]*(?:\.\d{2})?")
+# Labels left at the end of a part name once the number after them is cut off
+TRAILING_LABEL_PATTERN = re.compile(r"\s*(?:PartSelect|Manufacturer)?\s*(?:Part\s*)?(?:Number|#)\s*:?\s*$", re.IGNORECASE)
+MANUFACTURER_NUMBER_PATTERN = re.compile(r"Manufacturer(?:\s+Part)?\s*(?:Number|#)\s*:?\s*([A-Z0-9][A-Z0-9-]{3,})", re.IGNORECASE)
+# Everything in a part row that is not its name: numbers, prices and labelled manufacturer numbers
+NOT_NAME_PATTERN = re.compile(rf"{PART_NUMBER_PATTERN.pattern}|{PRICE_PATTERN.pattern}|Manufacturer(?:\s+Part)?\s*(?:Number|#)\s*:?\s*[A-Z0-9][A-Z0-9-]{{3,}}", re.IGNORECASE)
+NAME_PATTERN = re.compile(r"[A-Za-z]{3,}")
+# Containers that hold one record in a list
+RECORD_TAGS = {"div", "li", "tr", "article", "section", "a"}
+
+
+class ModelRecord(TypedDict, total=False):
+    model_master_id: str
+    model_number: str
+    description: str
+    url: str
+
+
+class ProblemRecord(TypedDict, total=False):
+    problem_id: str
+    model_master_id: str
+    name: str
+    url: str
+
+
+class PartRecord(TypedDict, total=False):
+    part_number: str
+    manufacturer_number: str
+    name: str
+    price: str
+    url: str
+
+
+class CompatibilityResult(TypedDict):
+    model_number: str
+    part_id: str
+    compatible: Optional[bool]
+    result: Any
+
+
+class _Block:
+    def __init__(self, tag: str):
+        self.tag = tag
+        self.text: List[str] = []
+        self.ids: Dict[str, str] = {}
+        self.url: Optional[str] = None
+
+
+class _BlockParser(HTMLParser):
+    """Splits a page into nested blocks, each with its text, the ids in its attributes and its first link."""
+
+    def __init__(self, base_url: str = ""):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.blocks: List[_Block] = []
+        self._stack: List[_Block] = [_Block("document")]
+        self._chrome = ChromeFilter()
+
+    def handle_starttag(self, tag, attrs):
+        self._chrome.start(tag)
+        if self._chrome.depth:
+            return
+        if tag in RECORD_TAGS:
+            self._stack.append(_Block(tag))
+        block = self._stack[-1]
+        for name, value in attrs:
+            if not value:
+                continue
+            for id_name, id_value in ID_PARAMETER_PATTERN.findall(value):
+                block.ids.setdefault(ID_NAMES.get(id_name.lower(), id_name.lower()), id_value)
+            if name.startswith("data-") and name.endswith("id") and value.strip().isalnum():
+                id_name = name[len("data-"):].replace("-", "")
+                block.ids.setdefault(ID_NAMES.get(id_name, id_name), value.strip())
+            if name == "href" and block.url is None and not value.startswith(("#", "javascript:")):
+                block.url = urljoin(self.base_url, value)
+
+    def handle_endtag(self, tag):
+        if self._chrome.end(tag) or self._chrome.depth or tag not in RECORD_TAGS or len(self._stack) < 2:
+            return
+        # Close up to the matching open block, tolerating unclosed children
+        while len(self._stack) > 1:
+            block = self._stack.pop()
+            self._close(block)
+            if block.tag == tag:
+                break
+
+    def _close(self, block: _Block) -> None:
+        self.blocks.append(block)
+        parent = self._stack[-1]
+        parent.text.extend(block.text)
+        for name, value in block.ids.items():
+            parent.ids.setdefault(name, value)
+        parent.url = parent.url or block.url
+
+    def handle_data(self, data):
+        if not self._chrome.depth:
+            self._stack[-1].text.append(data)
+
+    def close(self) -> None:
+        super().close()
+        while len(self._stack) > 1:
+            self._close(self._stack.pop())
+
+
+def _text(block: _Block) -> str:
+    return WHITESPACE.sub(" ", " ".join(block.text)).strip()
+
+
+def _blocks(html: str, base_url: str) -> List[_Block]:
+    parser = _BlockParser(base_url)
+    parser.feed(html)
+    parser.close()
+    return parser.blocks
+
+
+def _json_payload(body: str) -> Optional[Any]:
+    if body.lstrip()[:1] not in ("{", "["):
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def _json_records(payload: Any) -> List[Dict[str, Any]]:
+    """Every object in a JSON payload, with keys lower-cased and stripped of separators."""
+    records, stack = [], [payload]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            records.append({re.sub(r"[^a-z0-9]", "", str(key).lower()): value for key, value in item.items()})
+            stack.extend(reversed(list(item.values())))
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+    return records
+
+
+def _first(record: Dict[str, Any], *keys: str) -> Optional[str]:
+    for key in keys:
+        value = record.get(key)
+        if value not in (None, "") and not isinstance(value, (dict, list)):
+            return str(value)
+    return None
+
+
+def _unique(records: List[Dict[str, Any]], key: str) -> List[Dict[str, Any]]:
+    seen, unique = set(), []
+    for record in records:
+        if record.get(key) and record[key] not in seen:
+            seen.add(record[key])
+            unique.append({field: value for field, value in record.items() if value})
+    return unique[:MAX_RECORDS]
+
+
+def parse_models(body: str, base_url: str = "") -> List[ModelRecord]:
+    """Models with their model master ids, from an instant-repairman model search."""
+    payload = _json_payload(body)
+    if payload is not None:
+        records = [
+            {
+                "model_master_id": _first(record, "modelmasterid", "mastermodelid"),
+                "model_number": _first(record, "modelnumber", "modelnum", "model"),
+                "description": _first(record, "description", "modeldescription", "name", "title"),
+            }
+            for record in _json_records(payload)
+        ]
+        return _unique(records, "model_master_id")
+    records = [
+        {"model_master_id": block.ids["model_master_id"], "model_number": block.ids.get("model_id"), "description": _text(block), "url": block.url}
+        for block in _blocks(body, base_url)
+        if "model_master_id" in block.ids and "problem_id" not in block.ids
+    ]
+    return _unique(records, "model_master_id")
+
+
+def parse_problems(body: str, base_url: str = "") -> List[ProblemRecord]:
+    """Common problems with their problem ids and model master ids, from an instant-repairman model search."""
+    payload = _json_payload(body)
+    if payload is not None:
+        records = [
+            {
+                "problem_id": _first(record, "problemid", "id"),
+                "model_master_id": _first(record, "modelmasterid", "mastermodelid"),
+                "name": _first(record, "problem", "problemname", "name", "description", "title"),
+            }
+            for record in _json_records(payload) if _first(record, "problemid", "problem", "problemname")
+        ]
+        return _unique(records, "problem_id")
+    # Blocks are closed innermost first, so the first block with a problem id is the tightest one around it
+    records = [
+        {"problem_id": block.ids["problem_id"], "model_master_id": block.ids.get("model_master_id"), "name": _text(block), "url": block.url}
+        for block in _blocks(body, base_url) if "problem_id" in block.ids and _text(block)
+    ]
+    # Problems listed without their own master id belong to the page's model when there is only one
+    master_ids = {record["model_master_id"] for record in records if record["model_master_id"]}
+    if len(master_ids) == 1:
+        for record in records:
+            record["model_master_id"] = record["model_master_id"] or next(iter(master_ids))
+    return _unique(records, "problem_id")
+
+
+def _part_name(text: str) -> Optional[str]:
+    """The first run of a part row's text that is not a number, a price or a label."""
+    for segment in NOT_NAME_PATTERN.split(text):
+        segment = TRAILING_LABEL_PATTERN.sub("", segment).strip(" -|:…")
+        if NAME_PATTERN.search(segment):
+            return segment[:120]
+    return None
+
+
+def _merge(records: List[Dict[str, Any]], key: str) -> List[Dict[str, Any]]:
+    """One record per key: fields of the first record for it, gaps filled from the later ones."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        existing = merged.setdefault(record[key], dict(record))
+        for field, value in record.items():
+            if value and not existing.get(field):
+                existing[field] = value
+    return [{field: value for field, value in record.items() if value} for record in merged.values()][:MAX_RECORDS]
+
+
+def parse_parts(body: str, base_url: str = "") -> List[PartRecord]:
+    """Parts with their PartSelect and manufacturer numbers, names and prices."""
+    payload = _json_payload(body)
+    if payload is not None:
+        records = [
+            {
+                "part_number": _first(record, "partselectnumber", "partnumber", "psnumber"),
+                "manufacturer_number": _first(record, "manufacturerpartnumber", "manufacturernumber", "mfgpartnumber"),
+                "name": _first(record, "name", "partname", "title", "description"),
+                "price": _first(record, "price", "saleprice", "regularprice"),
+            }
+            for record in _json_records(payload)
+        ]
+        return _unique(records, "part_number")
+    records = []
+    for block in _blocks(body, base_url):
+        text = _text(block)
+        # A part row mentions exactly one PartSelect number
+        numbers = set(PART_NUMBER_PATTERN.findall(text))
+        if len(numbers) != 1:
+            continue
+        price = PRICE_PATTERN.search(text)
+        manufacturer_number = MANUFACTURER_NUMBER_PATTERN.search(text)
+        records.append({
+            "part_number": numbers.pop(),
+            "manufacturer_number": manufacturer_number.group(1) if manufacturer_number else None,
+            "name": _part_name(text),
+            "price": price.group(0).replace(" ", "") if price else None,
+            "url": block.url,
+        })
+    # Blocks close innermost first. The tightest block around a number (often just
+    # its link) gives the url; the enclosing row, which mentions no other part,
+    # fills in the name, price and manufacturer number.
+    return _merge(records, "part_number")
+
+
+def parse_compatibility(payload: Any, model_number: str, part_id: str) -> CompatibilityResult:
+    """The compatibility check response as a boolean; None when the response does not say either way."""
+    result = payload.get("compatabilityCheckResult", payload.get("compatibilityCheckResult")) if isinstance(payload, dict) else payload
+    compatible: Optional[bool] = None
+    if isinstance(result, bool):
+        compatible = result
+    elif isinstance(result, str):
+        normalized = result.strip().lower().replace(" ", "")
+        if normalized in ("true", "yes", "compatible", "fits"):
+            compatible = True
+        elif normalized in ("false", "no", "notcompatible", "incompatible", "doesnotfit") or normalized.startswith("not"):
+            compatible = False
+    elif isinstance(result, dict):
+        flag = result.get("isCompatible", result.get("compatible"))
+        compatible = flag if isinstance(flag, bool) else None
+    return {"model_number": model_number, "part_id": part_id, "compatible": compatible, "result": result}
@@ -0,0 +1,77 @@
+import os
+import re
+from typing import Iterable, List, Optional, Tuple
+from lib.product_catalog import get_product_catalog
+from lib.store_index import get_store_index
+
+# Ids customers write in messages: part and manufacturer numbers, store ids and
+# ZIP codes. The fast router reads them to route a turn and the context builder
+# to tell agents what the user has mentioned, so both see the same ids.
+
+ZIP_PATTERN = re.compile(r"\b(\d{5})(?:-\d{4})?\b")
+STORE_ID_PATTERN = re.compile(os.getenv(
+    "STORE_ID_PATTERN",
+    r"\bstore\s*(?:id|#|number|no\.?)?\s*[:#]?\s*([A-Za-z]{0,4}-?\d{1,6})\b",
+), re.IGNORECASE)
+# An explicit "store id" / "store #" / "store number" marks what follows as a store id even if it looks like a ZIP code
+STORE_ID_MARKER_PATTERN = re.compile(r"\b(?:id|number|no)\b|#", re.IGNORECASE)
+# A ZIP-shaped number after "store" is a location when these come before it ("my nearest store 75001")
+ZIP_CONTEXT_WORDS = {"near", "nearest", "closest", "nearby", "zip", "zipcode", "postal"}
+# W12345 / PS12345 style part numbers, or manufacturer numbers such as SP2610X15
+PART_NUMBER_PATTERN = re.compile(r"\b((?:PS|W)\d{3,}|(?=[A-Z0-9-]*\d)(?=[A-Z0-9-]*[A-Z])[A-Z0-9][A-Z0-9-]{4,19})\b", re.IGNORECASE)
+PREFIXED_PART_NUMBER_PATTERN = re.compile(r"(?:PS|W)\d{3,}", re.IGNORECASE)
+# Dimensions and quantities with a unit (20x40, 1500W, 2HP, 80GPM) have the shape of a manufacturer number
+MEASUREMENT_PATTERN = re.compile(r"\d+(?:\.\d+)?(?:x\d+(?:\.\d+)?)+|\d+(?:\.\d+)?(?:w|kw|hp|gpm|gph|ft|v|in|psi|gal|lbs?|mm|cm)", re.IGNORECASE)
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"[^\w\s/#.,:-]", "", text).strip().lower()
+
+
+def mentions(text: str, words: Iterable[str]) -> bool:
+    return any(re.search(rf"\b{re.escape(word)}\b", text) for word in words)
+
+
+def _known_store(store_id: str) -> Optional[bool]:
+    """Whether the store index has `store_id`, or None while no snapshot is loaded."""
+    index = get_store_index()
+    if index is None or index.loaded_at is None:
+        return None
+    return store_id.upper() in index.stores
+
+
+def find_store_ids(text: str) -> Tuple[List[str], bool]:
+    """Store ids mentioned in a message, and whether any of them could also be a ZIP code."""
+    store_ids, ambiguous = [], False
+    for match in STORE_ID_PATTERN.finditer(text):
+        store_id = match.group(1)
+        marker = text[match.start():match.start(1)]
+        if ZIP_PATTERN.fullmatch(store_id) and not STORE_ID_MARKER_PATTERN.search(marker):
+            known = _known_store(store_id)
+            before = normalize_text(text[:match.start()])
+            if known is False or (known is None and (mentions(before, ZIP_CONTEXT_WORDS) or mentions(normalize_text(text), {"zip", "zipcode"}))):
+                # A location; ZIP_PATTERN picks it up as a ZIP code
+                continue
+            ambiguous = ambiguous or known is None
+        store_ids.append(store_id.upper())
+    return store_ids, ambiguous
+
+
+def find_part_numbers(text: str, store_ids: Iterable[str] = ()) -> List[str]:
+    """Part and manufacturer numbers mentioned in a message, leaving out ZIP codes and the given store ids."""
+    store_ids = set(store_ids)
+    return [
+        number.upper() for number in PART_NUMBER_PATTERN.findall(text)
+        if sum(char.isdigit() for char in number) >= 3
+        and not ZIP_PATTERN.fullmatch(number)
+        and not MEASUREMENT_PATTERN.fullmatch(number)
+        and number.upper() not in store_ids
+    ]
+
+
+def confirmed_part_number(number: str) -> bool:
+    """Whether a number found by find_part_numbers is PS/W-prefixed or in the product catalog, rather than any code-like token."""
+    if PREFIXED_PART_NUMBER_PATTERN.fullmatch(number):
+        return True
+    catalog = get_product_catalog()
+    return catalog is not None and bool(catalog.lookup(number))
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import re
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple, Union
+from firebase_functions import logger
+from lib import http_client
+from lib.cache import get_cache
+
+# Pricing is the highest-volume backend call, and agents tend to ask for one
+# part at a time while get_availability needs the same response again. Every
+# pricing lookup goes through this service: item codes requested within a
+# short window are coalesced into one POST to /api/pricing, each
+# (item_code, unit) result is cached briefly, and pricing and availability are
+# both served from the shared per-item results. Sync and async callers share
+# the same batches.
+
+PRICING_URL = "https://candidate-onsite-study-srs-712206638513.us-central1.run.app/api/pricing"
+DEFAULT_UNIT = "EA"
+# How long the first item of a batch waits for more item codes before the POST is sent
+BATCH_WINDOW_SECONDS = float(os.getenv("PRICING_BATCH_WINDOW_MS", "20")) / 1000
+# A batch is sent immediately once it holds this many items
+MAX_BATCH_SIZE = int(os.getenv("PRICING_MAX_BATCH_SIZE", "50"))
+
+PriceKey = Tuple[str, str]
+
+ITEM_CODE_SEPARATOR = re.compile(r"[\s,;|]+")
+
+
+def normalize_item_codes(item_codes: Union[str, List[str]]) -> List[str]:
+    """Upper-cased, de-duplicated item codes; a string may hold several codes separated by commas or spaces."""
+    if isinstance(item_codes, str):
+        item_codes = ITEM_CODE_SEPARATOR.split(item_codes)
+    codes = (str(code).strip().strip("'\"[]").upper() for code in item_codes)
+    return list(dict.fromkeys(code for code in codes if code))
+
+
+class PricingService:
+    def __init__(self, window: float = BATCH_WINDOW_SECONDS, max_batch_size: int = MAX_BATCH_SIZE):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.cache = get_cache("pricing")
+        self._pending: Dict[PriceKey, Future] = {}
+        self._in_flight: Dict[PriceKey, Future] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self.items_requested = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.batched_items = 0
+
+    def _futures(self, keys: List[PriceKey]) -> Dict[PriceKey, Future]:
+        """One future per key: resolved from the cache, shared with an earlier request, or queued for the next batch."""
+        futures: Dict[PriceKey, Future] = {}
+        with self._lock:
+            for key in keys:
+                self.items_requested += 1
+                hit, item = self.cache.get(key)
+                if hit:
+                    self.cache_hits += 1
+                    futures[key] = Future()
+                    futures[key].set_result(item)
+                elif key in self._in_flight or key in self._pending:
+                    self.coalesced += 1
+                    futures[key] = self._in_flight.get(key) or self._pending[key]
+                else:
+                    futures[key] = self._pending[key] = Future()
+            flush_now = len(self._pending) >= self.max_batch_size
+            if self._pending and not flush_now and self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            # Not inline: on the async path the caller is the shared event loop, and the POST blocks
+            threading.Thread(target=self._flush, name="pricing-flush", daemon=True).start()
+        return futures
+
+    def _flush(self) -> None:
+        """Send every queued item code in one POST and resolve their futures."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._in_flight.update(batch)
+            if batch:
+                self.batches += 1
+                self.batched_items += len(batch)
+        if not batch:
+            return
+
+        request_body = {"items": [{"item_code": item_code, "unit": unit} for item_code, unit in batch]}
+        try:
+            logger.info(f"Request body: {request_body}")
+            response = http_client.post("pricing", PRICING_URL, json=request_body)
+            response.raise_for_status()
+            logger.info(f"Pricing response: {response.json()}")
+            items = self._index_items(response.json())
+            for key, future in batch.items():
+                item = items.get(key) or items.get((key[0], None))
+                if item is not None:
+                    self.cache.set(key, item)
+                if not future.done():
+                    future.set_result(item)
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            with self._lock:
+                for key in batch:
+                    self._in_flight.pop(key, None)
+
+    @staticmethod
+    def _index_items(items: List[Dict[str, Any]]) -> Dict[Tuple[str, Optional[str]], Dict[str, Any]]:
+        """Index response items by (item_code, unit), and by item code alone for units the API does not echo."""
+        index = {}
+        for item in items or []:
+            item_code = str(item.get("item_code", "")).upper()
+            if item.get("unit"):
+                index[(item_code, str(item["unit"]).upper())] = item
+            index.setdefault((item_code, None), item)
+        return index
+
+    def _keys(self, item_codes: Union[str, List[str]], unit: str) -> List[PriceKey]:
+        return [(item_code, unit.upper()) for item_code in normalize_item_codes(item_codes)]
+
+    def get_prices(self, item_codes: Union[str, List[str]], unit: str = DEFAULT_UNIT) -> List[Dict[str, Any]]:
+        """Pricing items for `item_codes`, in request order; codes the API does not know are left out."""
+        futures = self._futures(self._keys(item_codes, unit))
+        return [item for item in (future.result() for future in futures.values()) if item is not None]
+
+    async def aget_prices(self, item_codes: Union[str, List[str]], unit: str = DEFAULT_UNIT) -> List[Dict[str, Any]]:
+        """Async variant of get_prices."""
+        futures = self._futures(self._keys(item_codes, unit))
+        # The futures are shared with every other caller waiting on the same item codes; shielded,
+        # a cancelled caller stops waiting without cancelling the lookup for the others
+        results = await asyncio.gather(*(asyncio.shield(asyncio.wrap_future(future)) for future in futures.values()))
+        return [item for item in results if item is not None]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "items_requested": self.items_requested,
+                "cache_hits": self.cache_hits,
+                "coalesced": self.coalesced,
+                "batches": self.batches,
+                "batched_items": self.batched_items,
+                "mean_batch_size": self.batched_items / self.batches if self.batches else 0.0,
+            }
+
+
+_pricing_service: Optional[PricingService] = None
+_pricing_service_lock = threading.Lock()
+
+
+def get_pricing_service() -> PricingService:
+    """Return the process-wide pricing service."""
+    global _pricing_service
+    if _pricing_service is None:
+        with _pricing_service_lock:
+            if _pricing_service is None:
+                _pricing_service = PricingService()
+    return _pricing_service
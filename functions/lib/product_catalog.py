@@ -0,0 +1,254 @@
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from firebase_functions import logger
+from lib.part_numbers import normalize_part_number
+
+# Local product catalog built from a catalog export (PRODUCT_CATALOG_PATH, a
+# JSON array or JSON Lines file of product records as returned by the Azure
+# product search). Exact part and manufacturer numbers are answered from
+# lookup tables; everything else is ranked with BM25 over an inverted index of
+# names, brands, numbers and descriptions. Results are Product-shaped, so one
+# call replaces a Klevu search followed by an Azure search.
+#
+# refresh() re-reads the export when it changes and only re-indexes records
+# whose content changed; upsert()/remove() apply individual changes.
+
+PRODUCT_CATALOG_PATH = os.getenv("PRODUCT_CATALOG_PATH", "")
+# How often the export's modification time is checked for changes
+REFRESH_CHECK_SECONDS = float(os.getenv("PRODUCT_CATALOG_REFRESH_SECONDS", "300"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Name and brand tokens are counted this many times, so a match there outranks one in the description
+NAME_WEIGHT = 3
+BRAND_WEIGHT = 2
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {"a", "an", "and", "for", "in", "of", "on", "or", "the", "to", "with", "my", "is", "it", "that", "this"}
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(str(text).lower()) if token not in STOPWORDS]
+
+
+def _field(record: Dict[str, Any], *names: str) -> Optional[str]:
+    for name in names:
+        value = record.get(name)
+        if value not in (None, ""):
+            return str(value)
+    return None
+
+
+def to_product(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a catalog export record to the Product shape the agents return."""
+    brand = _field(record, "brand")
+    link = _field(record, "heritage_link", "url", "link")
+    additional_info = " | ".join(part for part in (f"Brand: {brand}" if brand else None, link) if part)
+    return {
+        "name": _field(record, "product_name", "name") or "",
+        "part_number": _field(record, "part_number", "item_code"),
+        "manufacturer_number": _field(record, "manufacturer_id", "manufacturer_number"),
+        "price": _field(record, "price"),
+        "image_url": _field(record, "image_url"),
+        "additional_info": additional_info or None,
+        "description": _field(record, "description"),
+    }
+
+
+def _record_key(record: Dict[str, Any]) -> Optional[str]:
+    key = _field(record, "part_number", "item_code", "id", "manufacturer_id")
+    return key.upper() if key else None
+
+
+def _fingerprint(record: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ProductCatalog:
+    def __init__(self):
+        self.products: Dict[str, Dict[str, Any]] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._by_number: Dict[str, List[str]] = {}
+        self._source_mtime: Optional[float] = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def _terms(self, product: Dict[str, Any], brand: Optional[str]) -> Counter:
+        terms = Counter(tokenize(product["name"]) * NAME_WEIGHT)
+        terms.update(tokenize(brand or "") * BRAND_WEIGHT)
+        terms.update(tokenize(product.get("description") or ""))
+        for number in (product.get("part_number"), product.get("manufacturer_number")):
+            if number:
+                terms.update(tokenize(number))
+                terms[normalize_part_number(number).lower()] += 1
+        return terms
+
+    def _numbers(self, product: Dict[str, Any]) -> List[str]:
+        return [normalize_part_number(number) for number in (product.get("part_number"), product.get("manufacturer_number")) if number]
+
+    def _unindex(self, key: str) -> None:
+        product = self.products.pop(key, None)
+        if product is None:
+            return
+        for term in self._doc_terms.pop(key):
+            postings = self._postings[term]
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(key)
+        for number in self._numbers(product):
+            keys = self._by_number.get(number, [])
+            if key in keys:
+                keys.remove(key)
+            if not keys:
+                self._by_number.pop(number, None)
+        self._fingerprints.pop(key, None)
+
+    def _index(self, key: str, record: Dict[str, Any]) -> None:
+        product = to_product(record)
+        terms = self._terms(product, _field(record, "brand"))
+        self.products[key] = product
+        self._fingerprints[key] = _fingerprint(record)
+        self._doc_terms[key] = terms
+        self._doc_lengths[key] = sum(terms.values())
+        self._total_length += self._doc_lengths[key]
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[key] = count
+        for number in self._numbers(product):
+            self._by_number.setdefault(number, []).append(key)
+
+    def upsert(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Add or replace records; unchanged records are skipped. Returns the number re-indexed."""
+        changed = 0
+        with self._lock:
+            for record in records:
+                key = _record_key(record)
+                if key is None or self._fingerprints.get(key) == _fingerprint(record):
+                    continue
+                self._unindex(key)
+                self._index(key, record)
+                changed += 1
+        return changed
+
+    def remove(self, keys: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for key in keys:
+                key = str(key).upper()
+                if key in self.products:
+                    self._unindex(key)
+                    removed += 1
+        return removed
+
+    def replace_all(self, records: Iterable[Dict[str, Any]]) -> Tuple[int, int]:
+        """Make the catalog match `records`, re-indexing only what changed. Returns (changed, removed)."""
+        records = list(records)
+        with self._lock:
+            keep = {_record_key(record) for record in records}
+            removed = self.remove([key for key in list(self.products) if key not in keep])
+            changed = self.upsert(records)
+        return changed, removed
+
+    def refresh(self, path: str = PRODUCT_CATALOG_PATH) -> bool:
+        """Re-read the catalog export if it changed since the last refresh. Returns True if it was read."""
+        if not path:
+            return False
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError as e:
+            logger.error(f"Product catalog {path} is not readable: {e}")
+            return False
+        if mtime == self._source_mtime:
+            return False
+        changed, removed = self.replace_all(load_records(path))
+        self._source_mtime = mtime
+        logger.info(f"Product catalog refreshed from {path}: {len(self)} products, {changed} changed, {removed} removed")
+        return True
+
+    def maybe_refresh(self, path: str = PRODUCT_CATALOG_PATH) -> None:
+        """refresh() at most once every REFRESH_CHECK_SECONDS."""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < REFRESH_CHECK_SECONDS:
+            return
+        self._checked_at = now
+        self.refresh(path)
+
+    def lookup(self, number: str) -> List[Dict[str, Any]]:
+        """Products whose part or manufacturer number matches `number` exactly, ignoring prefixes and separators."""
+        with self._lock:
+            return [self.products[key] for key in self._by_number.get(normalize_part_number(number), [])]
+
+    def _bm25(self, terms: List[str], limit: int) -> List[Tuple[str, float]]:
+        document_count = len(self.products)
+        average_length = self._total_length / document_count
+        scores: Dict[str, float] = {}
+        for term in set(terms):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, frequency in postings.items():
+                length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[key] / average_length)
+                scores[key] = scores.get(key, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + length_norm)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Exact number matches first, then BM25 matches, as Product records with a relevance score."""
+        with self._lock:
+            if not self.products:
+                return []
+            results: Dict[str, Dict[str, Any]] = {}
+            # Any token of the query may be a part or manufacturer number
+            for candidate in [query] + query.split():
+                for key in self._by_number.get(normalize_part_number(candidate), []):
+                    results.setdefault(key, {**self.products[key], "relevance_score": None, "exact_match": True})
+            for key, score in self._bm25(tokenize(query), limit):
+                results.setdefault(key, {**self.products[key], "relevance_score": round(score, 3), "exact_match": False})
+            return list(results.values())[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"products": len(self.products), "terms": len(self._postings), "numbers": len(self._by_number)}
+
+
+def load_records(path: str) -> List[Dict[str, Any]]:
+    """Read a JSON array, a {"products": [...]} object or a JSON Lines file."""
+    with open(path) as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return data.get("products", []) if isinstance(data, dict) else data
+
+
+_catalog: Optional[ProductCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_product_catalog() -> Optional[ProductCatalog]:
+    """Return the process-wide catalog loaded from PRODUCT_CATALOG_PATH, or None if no export is configured."""
+    global _catalog
+    if not PRODUCT_CATALOG_PATH:
+        return None
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = ProductCatalog()
+    _catalog.maybe_refresh()
+    return _catalog
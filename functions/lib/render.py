@@ -0,0 +1,102 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# Compact text rendering of the structured results workers leave in State.
+# Records become a pipe-separated table with one header row and only the
+# columns that have a value somewhere, so a list of products costs one line
+# per product instead of a Python repr of every field, None included.
+
+PRODUCT_COLUMNS = ["part_number", "manufacturer_number", "name", "price", "in_stock", "available_quantity", "additional_info", "image_url", "description"]
+STORE_COLUMNS = ["name", "phone_number", "hours", "website_url", "latitude", "longitude"]
+# Longest value shown in a table cell
+MAX_CELL_CHARS = 200
+# Structured response fields that hold records rather than a single value
+RECORD_FIELDS = ("products", "found_products", "found_stores")
+
+
+def _cell(value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":"))
+    text = " ".join(str(value).split()).replace("|", "/")
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 1] + "…"
+
+
+def _present(value: Any) -> bool:
+    return value not in (None, "", [], {})
+
+
+def render_table(rows: Sequence[Dict[str, Any]], columns: Optional[List[str]] = None) -> str:
+    """Rows as a pipe-separated table, keeping only columns with a value and dropping duplicate rows."""
+    if not rows:
+        return ""
+    columns = columns or list(dict.fromkeys(key for row in rows for key in row))
+    columns = [column for column in columns if any(_present(row.get(column)) for row in rows)]
+    lines = list(dict.fromkeys(
+        " | ".join(_cell(row.get(column)) if _present(row.get(column)) else "" for column in columns)
+        for row in rows
+    ))
+    return "\n".join([" | ".join(columns)] + lines)
+
+
+def product_key(product: Dict[str, Any]) -> str:
+    return str(product.get("part_number") or product.get("manufacturer_number") or product.get("name") or "").upper()
+
+
+def store_key(store: Dict[str, Any]) -> str:
+    return str(store.get("name") or "").upper()
+
+
+def merge_records(existing: Optional[Iterable[Dict[str, Any]]], new: Iterable[Dict[str, Any]], key) -> List[Dict[str, Any]]:
+    """`existing` updated with `new`, one record per key; fields `new` leaves empty keep their old values."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for record in list(existing or []) + list(new):
+        if not isinstance(record, dict):
+            continue
+        current = merged.get(key(record), {})
+        merged[key(record)] = {**current, **{field: value for field, value in record.items() if _present(value)}}
+    return list(merged.values())
+
+
+def structured_records(structured_response: Optional[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """The products and stores in a worker's structured response."""
+    if not isinstance(structured_response, dict):
+        return {"products": [], "stores": []}
+    products = (structured_response.get("products") or []) + (structured_response.get("found_products") or [])
+    stores = structured_response.get("found_stores") or []
+    return {"products": products, "stores": stores}
+
+
+def render_pricing(pricing: Dict[str, Any]) -> str:
+    return render_table([{"part_number": code, "price": price} for code, price in pricing.items()])
+
+
+def render_state_records(state: Dict[str, Any]) -> str:
+    """The products, stores and prices collected in `state` so far."""
+    products = state.get("products") or []
+    # Prices already shown in the products table are not repeated
+    shown = {product.get("part_number") for product in products if product.get("price")}
+    sections = [
+        ("Products", render_table(products, PRODUCT_COLUMNS)),
+        ("Stores", render_table(state.get("stores") or [], STORE_COLUMNS)),
+        ("Prices", render_pricing({code: price for code, price in (state.get("pricing") or {}).items() if code not in shown})),
+    ]
+    return "\n".join(f"{title}:\n{table}" for title, table in sections if table)
+
+
+def render_result(agent_name: str, structured_response: Any, include_records: bool = True) -> str:
+    """A worker's structured response as compact text: tables for records, one line per other field."""
+    if not isinstance(structured_response, dict):
+        return f"{agent_name}: {structured_response}"
+    lines = [f"{agent_name}:"]
+    for field, value in structured_response.items():
+        if not _present(value) or (field in RECORD_FIELDS and not include_records):
+            continue
+        if field in ("products", "found_products"):
+            lines.append(render_table(value, PRODUCT_COLUMNS))
+        elif field == "found_stores":
+            lines.append(render_table(value, STORE_COLUMNS))
+        elif isinstance(value, dict):
+            lines.append(f"{field}: " + ", ".join(f"{key}={_cell(val)}" for key, val in value.items() if _present(val)))
+        else:
+            lines.append(f"{field}: {_cell(value)}")
+    return "\n".join(lines) if len(lines) > 1 else ""
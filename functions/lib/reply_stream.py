@@ -0,0 +1,122 @@
+import asyncio
+import contextlib
+import contextvars
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional
+
+# Streaming delivery of the final reply. get_llm_response installs a sink for
+# the turn; the human_interaction node streams its tokens through a
+# ReplyChunker, which hands completed paragraphs, bullet groups and sentences
+# to the sink as separate WhatsApp messages. On the async path the sink is
+# wrapped in a BackgroundSink so sending never blocks the event loop.
+
+# Marker the streaming prompt asks the model to use for the image URL, on its own line
+IMAGE_PREFIX = "IMAGE:"
+# Combine short paragraphs until a message is at least this long
+MIN_CHUNK_CHARS = 160
+# Twilio's WhatsApp body limit is 1600 characters; split well before it
+MAX_CHUNK_CHARS = 1200
+
+ReplySink = Callable[..., None]
+
+_reply_sink: contextvars.ContextVar[Optional[ReplySink]] = contextvars.ContextVar("reply_sink", default=None)
+
+SENTENCE_END = re.compile(r"[.!?](?:\s+|$)")
+BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+
+
+@contextlib.contextmanager
+def streaming_to(sink: Optional[ReplySink]) -> Iterator[None]:
+    """Stream the reply of any graph run inside this block to `sink(body, media_url=None)`."""
+    token = _reply_sink.set(sink)
+    try:
+        yield
+    finally:
+        _reply_sink.reset(token)
+
+
+def get_reply_sink() -> Optional[ReplySink]:
+    return _reply_sink.get()
+
+
+class BackgroundSink:
+    """Calls a blocking sink on its own thread, in order, without waiting for each send."""
+
+    def __init__(self, sink: ReplySink):
+        self.sink = sink
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reply-sink")
+        self._futures: List[Future] = []
+
+    def __call__(self, body: str, **kwargs) -> None:
+        self._futures.append(self._executor.submit(self.sink, body, **kwargs))
+
+    async def aclose(self) -> None:
+        """Wait for every queued send; re-raises the first send error."""
+        self._executor.shutdown(wait=False)
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in self._futures))
+
+
+class ReplyChunker:
+    def __init__(self, send: ReplySink, min_chars: int = MIN_CHUNK_CHARS, max_chars: int = MAX_CHUNK_CHARS):
+        self.send = send
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.image_url: Optional[str] = None
+        self.messages_sent = 0
+        self._buffer = ""
+        self._pending: List[str] = []
+        self._parts: List[str] = []
+
+    def feed(self, token: str) -> None:
+        self._buffer += token
+        # Paragraph breaks end a paragraph or a bullet group
+        while "\n\n" in self._buffer:
+            paragraph, self._buffer = self._buffer.split("\n\n", 1)
+            self._add(paragraph)
+        self._flush_long_paragraph()
+
+    def _flush_long_paragraph(self) -> None:
+        """Split a plain paragraph at its last sentence end once it is long enough on its own."""
+        if len(self._buffer) < self.min_chars or (BULLET.match(self._buffer) and len(self._buffer) < self.max_chars):
+            return
+        ends = [match.end() for match in SENTENCE_END.finditer(self._buffer) if match.end() < len(self._buffer)]
+        if not ends:
+            ends = [self._buffer.rfind("\n") + 1] if len(self._buffer) >= self.max_chars and "\n" in self._buffer else []
+        if not ends or ends[-1] == 0:
+            return
+        sentences, self._buffer = self._buffer[:ends[-1]], self._buffer[ends[-1]:]
+        self._add(sentences)
+
+    def _add(self, text: str, send: bool = True) -> None:
+        lines = []
+        for line in text.strip().splitlines():
+            if line.strip().upper().startswith(IMAGE_PREFIX):
+                self.image_url = line.strip()[len(IMAGE_PREFIX):].strip() or None
+            else:
+                lines.append(line)
+        text = "\n".join(lines).strip()
+        if not text:
+            return
+        self._parts.append(text)
+        self._pending.append(text)
+        if send and len("\n\n".join(self._pending)) >= self.min_chars:
+            self._send_pending()
+
+    def _send_pending(self, media_url: Optional[str] = None) -> None:
+        body = "\n\n".join(self._pending)
+        self._pending = []
+        if not body and not media_url:
+            return
+        if media_url:
+            self.send(body, media_url=media_url)
+        else:
+            self.send(body)
+        self.messages_sent += 1
+
+    def close(self) -> str:
+        """Send whatever is left, with the image attached to the last message. Returns the full reply text."""
+        self._add(self._buffer, send=False)
+        self._buffer = ""
+        self._send_pending(self.image_url)
+        return "\n\n".join(self._parts)
@@ -0,0 +1,100 @@
+import os
+import queue
+import threading
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+from firebase_functions import logger
+
+# Background workers for out-of-band replies. Jobs are sharded by sender onto
+# a fixed set of worker threads, each with its own bounded FIFO queue, so
+# messages from one sender are always handled in order while different senders
+# run in parallel. A full queue rejects new jobs instead of blocking the webhook.
+
+
+class ReplyDispatcher:
+    def __init__(self, handler: Callable[[str, Any], None], workers: int = 4, queue_size: int = 16):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.handler = handler
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._stats_lock = threading.Lock()
+        self._threads = []
+        for index, jobs in enumerate(self._queues):
+            thread = threading.Thread(target=self._run, args=(jobs,), name=f"reply-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _shard(self, sender: str) -> queue.Queue:
+        return self._queues[zlib.crc32(sender.encode("utf-8")) % len(self._queues)]
+
+    def submit(self, sender: str, job: Any) -> bool:
+        """Queue `job` for `sender`. Returns False if the sender's worker queue is full."""
+        try:
+            self._shard(sender).put_nowait((sender, job))
+            return True
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            logger.warn(f"Reply queue full, rejecting message from {sender}")
+            return False
+
+    def _run(self, jobs: queue.Queue) -> None:
+        while True:
+            item = jobs.get()
+            if item is None:
+                jobs.task_done()
+                return
+            sender, job = item
+            try:
+                self.handler(sender, job)
+                with self._stats_lock:
+                    self._processed += 1
+            except Exception as e:
+                with self._stats_lock:
+                    self._failed += 1
+                logger.error(f"Reply worker failed for {sender}: {str(e)}")
+            finally:
+                jobs.task_done()
+
+    def join(self) -> None:
+        """Block until every queued job has been handled."""
+        for jobs in self._queues:
+            jobs.join()
+
+    def shutdown(self) -> None:
+        """Finish queued jobs and stop the worker threads."""
+        for jobs in self._queues:
+            jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "workers": len(self._queues),
+                "queued": [jobs.qsize() for jobs in self._queues],
+                "processed": self._processed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+            }
+
+
+_dispatcher: Optional[ReplyDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_reply_dispatcher(handler: Callable[[str, Any], None]) -> ReplyDispatcher:
+    """Return the process-wide dispatcher, sized by REPLY_WORKERS and REPLY_QUEUE_SIZE."""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = ReplyDispatcher(
+                    handler,
+                    workers=int(os.getenv("REPLY_WORKERS", "4")),
+                    queue_size=int(os.getenv("REPLY_QUEUE_SIZE", "16")),
+                )
+    return _dispatcher
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+from lib import tracing
+from lib.cache import get_cache
+from lib.fast_router import HOURS_WORDS, MIN_CONFIDENCE, PRICE_WORDS, STOCK_WORDS, STORE_WORDS, classify
+from lib.pricing_service import DEFAULT_UNIT
+from lib.store_index import get_store_index
+
+# Whole-turn response cache. Self-contained lookups ("price of SP2610X15",
+# "hours for store 12") are keyed on what the rule-based router extracts from
+# the message (request type plus part numbers or store id), and phrasings
+# within a bucket are matched by token-set similarity over the words left once
+# the intent words and ids the bucket already captures are removed. Each reply is stored
+# with fingerprints of the facts it was built from (pricing results, the store
+# record); a hit is only served while those facts are unchanged and the TTL of
+# its most volatile dependency has not run out. A message that follows a
+# reply asking the user something ("Which store?" -> "store 12") may only make
+# sense as an answer to it, so such turns are neither served nor cached.
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "true").lower() == "true"
+# Minimum token-set (Jaccard) similarity between two phrasings of the same lookup
+SIMILARITY_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.6"))
+
+# Seconds a cached reply stays valid, by the kind of data it depends on
+VOLATILITY_TTL_SECONDS: Dict[str, float] = {
+    "pricing": 300,
+    "availability": 120,
+    "product": 3600,
+    "store": 86400,
+}
+# The data each cacheable request type depends on
+REQUEST_DEPENDENCIES: Dict[str, str] = {
+    "price_check": "pricing",
+    "availability": "availability",
+    "product_details": "product",
+    "store_hours": "store",
+    "store_details": "store",
+}
+# request_info fields that pick the store or location a reply is about; they are part of the bucket with the part numbers
+LOCATION_FIELDS = ("store_id", "zip_code", "latitude", "longitude")
+MAX_ENTRIES_PER_BUCKET = 8
+MAX_BUCKETS = 2048
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {"a", "an", "the", "of", "for", "is", "are", "what", "whats", "s", "please", "me", "can", "you", "i", "my", "tell", "do", "does", "to"}
+# Words that only restate the request type
+INTENT_WORDS = {token for phrase in PRICE_WORDS | STOCK_WORDS | HOURS_WORDS | STORE_WORDS for token in TOKEN_PATTERN.findall(phrase)} | {"how", "much", "id", "number", "no"}
+
+Bucket = Tuple[str, Tuple[str, ...]]
+
+
+def query_tokens(text: str, ids: Tuple[str, ...] = ()) -> FrozenSet[str]:
+    ignored = STOPWORDS | INTENT_WORDS | {token for value in ids for token in TOKEN_PATTERN.findall(value.lower())}
+    return frozenset(token for token in TOKEN_PATTERN.findall(text.lower()) if token not in ignored)
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def follows_question(history: Sequence[Dict[str, Any]]) -> bool:
+    """Whether the last reply in `history` (the messages before the user's latest one) asked the user something."""
+    reply = next((message for message in reversed(history) if isinstance(message, dict) and message.get("role") == "assistant"), None)
+    return reply is not None and "?" in str(reply.get("content") or "")
+
+
+def _fingerprint(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _current_facts(request_info: Dict[str, Any], pricing_codes: List[str]) -> Dict[str, Optional[str]]:
+    """Fingerprints of the backend data behind a lookup, as currently cached; None where it is not in memory."""
+    facts: Dict[str, Optional[str]] = {}
+    pricing_cache = get_cache("pricing")
+    for code in dict.fromkeys(list(request_info.get("part_numbers") or []) + pricing_codes):
+        hit, item = pricing_cache.get((str(code).upper(), DEFAULT_UNIT))
+        facts[f"pricing:{str(code).upper()}"] = _fingerprint(item) if hit else None
+    store_id = request_info.get("store_id")
+    store_index = get_store_index()
+    if store_id and store_index is not None:
+        store = store_index.stores.get(str(store_id).strip().upper())
+        facts[f"store:{store_id}"] = _fingerprint(store) if store is not None else None
+    return facts
+
+
+class ResponseCache:
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self._buckets: Dict[Bucket, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.uncacheable = 0
+        self.stores = 0
+
+    def key(self, text: str, history: Sequence[Dict[str, Any]] = ()) -> Optional[Tuple[Bucket, FrozenSet[str], Dict[str, Any]]]:
+        """(bucket, tokens, request_info) for a self-contained lookup, or None if the message cannot be cached."""
+        if follows_question(history):
+            return None
+        decision, confidence = classify(text)
+        if decision is None or confidence < MIN_CONFIDENCE or decision["request_type"] not in REQUEST_DEPENDENCIES:
+            return None
+        request_info = decision.get("request_info") or {}
+        ids = tuple(sorted(str(value).upper() for value in request_info.get("part_numbers") or []))
+        # Stock at store 12 is not stock at store 13, so the location is part of the bucket too
+        ids += tuple(f"{field}:{str(request_info[field]).upper()}" for field in LOCATION_FIELDS if request_info.get(field) not in (None, ""))
+        return (decision["request_type"], ids), query_tokens(text, ids), request_info
+
+    def get(self, text: str, history: Sequence[Dict[str, Any]] = ()) -> Optional[Tuple[str, Optional[str]]]:
+        """The cached (message, output_image) for a lookup, or None."""
+        key = self.key(text, history)
+        if key is None:
+            with self._lock:
+                self.uncacheable += 1
+            return None
+        bucket, tokens, request_info = key
+        now = time.monotonic()
+        with self._lock:
+            entries = self._buckets.get(bucket, [])
+            entries[:] = [entry for entry in entries if entry["expires_at"] > now]
+            entry = max(entries, key=lambda entry: similarity(tokens, entry["tokens"]), default=None)
+            if entry is None or similarity(tokens, entry["tokens"]) < self.threshold:
+                self.misses += 1
+                tracing.record_cache("response_cache", "miss")
+                return None
+        current = _current_facts(request_info, entry["pricing_codes"])
+        if any(value is not None and entry["facts"].get(name) not in (None, value) for name, value in current.items()):
+            with self._lock:
+                if entry in entries:
+                    entries.remove(entry)
+                self.stale += 1
+                self.misses += 1
+            tracing.record_cache("response_cache", "stale")
+            return None
+        with self._lock:
+            self.hits += 1
+        tracing.record_cache("response_cache", "hit")
+        return entry["response"]
+
+    def put(self, text: str, response: Tuple[str, Optional[str]], state: Dict[str, Any], history: Sequence[Dict[str, Any]] = ()) -> bool:
+        """Cache the reply to `text`, given the final graph state it was built from. Returns True if it was stored."""
+        key = self.key(text, history)
+        if key is None:
+            return False
+        bucket, tokens, request_info = key
+        # Replies that ask the user for more information or found nothing are not worth repeating
+        if not (state.get("products") or state.get("stores") or state.get("pricing")):
+            return False
+        if any(isinstance(result, dict) and result.get("info_needed") for result in (state.get("agent_results") or {}).values()):
+            return False
+        pricing_codes = [str(code).upper() for code in state.get("pricing") or {}]
+        dependencies = {REQUEST_DEPENDENCIES[bucket[0]]}
+        if pricing_codes:
+            dependencies.add("pricing")
+        if any(product.get("in_stock") is not None for product in state.get("products") or []):
+            dependencies.add("availability")
+        entry = {
+            "tokens": tokens,
+            "response": response,
+            "pricing_codes": pricing_codes,
+            "facts": _current_facts(request_info, pricing_codes),
+            "expires_at": time.monotonic() + min(VOLATILITY_TTL_SECONDS[dependency] for dependency in dependencies),
+        }
+        with self._lock:
+            entries = self._buckets.setdefault(bucket, [])
+            entries[:] = [existing for existing in entries if existing["tokens"] != tokens][-(MAX_ENTRIES_PER_BUCKET - 1):] + [entry]
+            while len(self._buckets) > MAX_BUCKETS:
+                self._buckets.pop(next(iter(self._buckets)))
+            self.stores += 1
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": sum(len(entries) for entries in self._buckets.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "uncacheable": self.uncacheable,
+                "stores": self.stores,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None if RESPONSE_CACHE is off."""
+    global _response_cache
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache()
+    return _response_cache
@@ -0,0 +1,208 @@
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from firebase_functions import logger
+from lib import http_client
+from lib.geo_index import GeoIndex, get_zip_centroids
+
+# In-memory snapshot of every store (id, location, address, contact, hours).
+# The snapshot is built from wide, paged searches against /api/stores/search
+# and refreshed in the background once it is older than the refresh interval,
+# so store details, hours and radius searches are answered without a network
+# round trip. Radius and nearest-store queries run on a vectorized GeoIndex
+# built with each snapshot. Lookups return None while no snapshot is loaded, or when the
+# store is not in it, and the caller falls back to the API.
+
+STORE_SEARCH_URL = "https://candidate-onsite-study-srs-712206638513.us-central1.run.app/api/stores/search"
+
+STORE_INDEX_ENABLED = os.getenv("STORE_INDEX", "true").lower() == "true"
+REFRESH_SECONDS = float(os.getenv("STORE_INDEX_REFRESH_SECONDS", "3600"))
+# The snapshot is one search around the middle of the continental US with a radius that covers the whole country
+SNAPSHOT_LATITUDE = 39.8283
+SNAPSHOT_LONGITUDE = -98.5795
+SNAPSHOT_RADIUS_MILES = 5000
+SNAPSHOT_PAGE_SIZE = 100
+SNAPSHOT_MAX_PAGES = 50
+# Wait this long after a failed refresh before trying again
+RETRY_SECONDS = 60
+
+ZIP_PATTERN = re.compile(r"\b(\d{5})(?:-\d{4})?\b")
+
+
+def _coordinates(store: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    location = store.get("location") or {}
+    try:
+        return float(location["latitude"]), float(location["longitude"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class StoreIndex:
+    def __init__(self, refresh_seconds: float = REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        # (stores by id, GeoIndex over them, whether the last refresh read every page), replaced
+        # as one tuple so a lookup never pairs one refresh's stores with another's GeoIndex
+        self._snapshot: Tuple[Dict[str, Dict[str, Any]], GeoIndex, bool] = ({}, GeoIndex([], []), False)
+        # ZIP code -> coordinates of a store in that ZIP, used when there is no centroid table
+        self.store_zips: Dict[str, Tuple[float, float]] = {}
+        self.loaded_at: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._refreshing = False
+        self._last_attempt: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def stores(self) -> Dict[str, Dict[str, Any]]:
+        return self._snapshot[0]
+
+    @property
+    def geo(self) -> GeoIndex:
+        return self._snapshot[1]
+
+    @property
+    def complete(self) -> bool:
+        """True when the last refresh read every page, so an empty radius search really means no stores."""
+        return self._snapshot[2]
+
+    def _fetch_all(self) -> Tuple[List[Dict[str, Any]], bool]:
+        """Every store from the paged search, and whether the last page was reached."""
+        stores: List[Dict[str, Any]] = []
+        for page in range(1, SNAPSHOT_MAX_PAGES + 1):
+            response = http_client.get("store_search", STORE_SEARCH_URL, params={
+                "latitude": SNAPSHOT_LATITUDE,
+                "longitude": SNAPSHOT_LONGITUDE,
+                "radius": SNAPSHOT_RADIUS_MILES,
+                "page_size": SNAPSHOT_PAGE_SIZE,
+                "page": page,
+            })
+            response.raise_for_status()
+            batch = response.json().get("stores") or []
+            stores.extend(batch)
+            if len(batch) < SNAPSHOT_PAGE_SIZE:
+                return stores, True
+        logger.warn(f"Store index stopped after {SNAPSHOT_MAX_PAGES} pages, radius searches will use the API")
+        return stores, False
+
+    def refresh(self) -> None:
+        """Replace the snapshot with a fresh copy of every store."""
+        try:
+            start = time.perf_counter()
+            fetched, complete = self._fetch_all()
+            stores = {str(store["id"]).upper(): store for store in fetched if store.get("id") is not None}
+            located = [(store_id, _coordinates(store)) for store_id, store in stores.items()]
+            located = [(store_id, coordinates) for store_id, coordinates in located if coordinates is not None]
+            geo = GeoIndex([store_id for store_id, _ in located], [coordinates for _, coordinates in located])
+            store_zips = {}
+            for store_id, coordinates in located:
+                zip_codes = ZIP_PATTERN.findall(str(stores[store_id].get("address") or ""))
+                if zip_codes:
+                    store_zips.setdefault(zip_codes[-1], coordinates)
+            with self._lock:
+                self._snapshot = (stores, geo, complete)
+                self.store_zips = store_zips
+                self.loaded_at = time.monotonic()
+                self.refreshes += 1
+            logger.info(f"Store index loaded {len(stores)} stores in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            with self._lock:
+                self.refresh_errors += 1
+            logger.error(f"Error refreshing store index: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def maybe_refresh(self) -> None:
+        """Start a background refresh if the snapshot is missing or stale."""
+        with self._lock:
+            now = time.monotonic()
+            stale = self.loaded_at is None or now - self.loaded_at >= self.refresh_seconds
+            retried_recently = self._last_attempt is not None and now - self._last_attempt < RETRY_SECONDS
+            if not stale or self._refreshing or retried_recently:
+                return
+            self._refreshing = True
+            self._last_attempt = now
+        threading.Thread(target=self.refresh, name="store-index-refresh", daemon=True).start()
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, store_id: str) -> Optional[Dict[str, Any]]:
+        """The store with `store_id`, or None if it is not in the snapshot."""
+        self.maybe_refresh()
+        store = self.stores.get(str(store_id).strip().upper())
+        self._count(store is not None)
+        return store
+
+    def search(self, latitude: float, longitude: float, radius: float = 50, page_size: int = 10, page: int = 1) -> Optional[Dict[str, Any]]:
+        """Stores within `radius` miles, nearest first, paged like /api/stores/search. None if the snapshot cannot answer."""
+        self.maybe_refresh()
+        stores, geo, complete = self._snapshot
+        if self.loaded_at is None or not complete:
+            self._count(False)
+            return None
+        matches, total = geo.within(float(latitude), float(longitude), float(radius), int(page_size), int(page))
+        self._count(True)
+        return {
+            "stores": [{**stores[store_id], "distance": round(distance, 2)} for store_id, distance in matches],
+            "total": total,
+            "page": int(page),
+            "page_size": int(page_size),
+        }
+
+    def nearest(self, latitude: float, longitude: float, page_size: int = 10, page: int = 1) -> Optional[Dict[str, Any]]:
+        """The stores nearest to a point, nearest first, paged like `search`. None if no snapshot is loaded."""
+        self.maybe_refresh()
+        if self.loaded_at is None:
+            self._count(False)
+            return None
+        stores, geo, _ = self._snapshot
+        matches = geo.nearest(float(latitude), float(longitude), int(page_size), int(page))
+        self._count(True)
+        return {
+            "stores": [{**stores[store_id], "distance": round(distance, 2)} for store_id, distance in matches],
+            "total": len(geo),
+            "page": int(page),
+            "page_size": int(page_size),
+        }
+
+    def locate_zip(self, zip_code: str) -> Optional[Tuple[float, float]]:
+        """Coordinates for a ZIP code from the centroid table, or from a store in that ZIP."""
+        zip_code = str(zip_code).strip()[:5]
+        return get_zip_centroids().get(zip_code) or self.store_zips.get(zip_code)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stores": len(self.stores),
+                "complete": self.complete,
+                "age_seconds": time.monotonic() - self.loaded_at if self.loaded_at is not None else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+            }
+
+
+_store_index: Optional[StoreIndex] = None
+_store_index_lock = threading.Lock()
+
+
+def get_store_index() -> Optional[StoreIndex]:
+    """Return the process-wide store index, or None when STORE_INDEX is disabled."""
+    global _store_index
+    if not STORE_INDEX_ENABLED:
+        return None
+    if _store_index is None:
+        with _store_index_lock:
+            if _store_index is None:
+                _store_index = StoreIndex()
+    return _store_index
@@ -0,0 +1,100 @@
+import os
+from typing import Any, Callable, Dict, List, Optional
+from firebase_functions import logger
+from lib.part_numbers import normalize_part_number
+from lib.types import FinalOutput
+
+# Deterministic replies for simple lookups. When the router classified the
+# turn as a price check, stock check or store hours question and the workers
+# left a complete answer in State, the reply is filled in from a template
+# instead of asking the human_interaction LLM to format data it was handed.
+# Anything incomplete or open-ended returns None and goes to the LLM.
+
+TEMPLATE_RESPONSES_ENABLED = os.getenv("TEMPLATE_RESPONSES", "true").lower() == "true"
+
+_stats = {"templated": 0, "declined": 0}
+
+
+def _product_label(product: Dict[str, Any]) -> str:
+    number = product.get("part_number") or product.get("manufacturer_number")
+    return f"{product.get('name')} ({number})" if number and product.get("name") else str(product.get("name") or number)
+
+
+def _requested_products(state: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The products the user asked about: those matching the routed part numbers, or every product found."""
+    products = [product for product in state.get("products") or [] if isinstance(product, dict)]
+    numbers = {normalize_part_number(number) for number in (state.get("request_info") or {}).get("part_numbers") or []}
+    if not numbers:
+        return products
+    matches = [
+        product for product in products
+        if {normalize_part_number(str(product.get(field))) for field in ("part_number", "manufacturer_number") if product.get(field)} & numbers
+    ]
+    # Every number asked about must have been found
+    return matches if len(matches) >= len(numbers) else []
+
+
+def _first_image(products: List[Dict[str, Any]]) -> Optional[str]:
+    return next((product["image_url"] for product in products if product.get("image_url")), None)
+
+
+def price_check(state: Dict[str, Any]) -> Optional[FinalOutput]:
+    products = _requested_products(state)
+    if not products or any(not product.get("price") for product in products):
+        return None
+    lines = [f"{_product_label(product)}: {product['price']}" for product in products]
+    return {"message": "\n".join(lines), "output_image": _first_image(products)}
+
+
+def _stock_line(product: Dict[str, Any]) -> str:
+    quantity = product.get("available_quantity")
+    if not product.get("in_stock"):
+        return f"{_product_label(product)} is currently out of stock."
+    if quantity:
+        return f"{_product_label(product)} is in stock ({quantity} available)."
+    return f"{_product_label(product)} is in stock."
+
+
+def availability(state: Dict[str, Any]) -> Optional[FinalOutput]:
+    products = _requested_products(state)
+    if not products or any(product.get("in_stock") is None for product in products):
+        return None
+    return {"message": "\n".join(_stock_line(product) for product in products), "output_image": _first_image(products)}
+
+
+def store_hours(state: Dict[str, Any]) -> Optional[FinalOutput]:
+    stores = [store for store in state.get("stores") or [] if isinstance(store, dict)]
+    # Only a single store is answered from the template; several stores need the LLM to pick the relevant one
+    if len(stores) != 1 or not stores[0].get("hours"):
+        return None
+    store = stores[0]
+    lines = [f"{store.get('name')} hours:", str(store["hours"])]
+    if store.get("phone_number"):
+        lines.append(f"Phone: {store['phone_number']}")
+    return {"message": "\n".join(lines), "output_image": None}
+
+
+TEMPLATES: Dict[str, Callable[[Dict[str, Any]], Optional[FinalOutput]]] = {
+    "price_check": price_check,
+    "availability": availability,
+    "store_hours": store_hours,
+}
+
+
+def templated_response(state: Dict[str, Any]) -> Optional[FinalOutput]:
+    """The reply for a simple lookup whose answer is complete in `state`, or None if the LLM should write it."""
+    template = TEMPLATES.get(state.get("request_type") or "")
+    if not TEMPLATE_RESPONSES_ENABLED or template is None or state.get("pending_request"):
+        return None
+    # A worker that still needs information from the user has to be answered by the LLM
+    if any(isinstance(result, dict) and result.get("info_needed") for result in (state.get("agent_results") or {}).values()):
+        return None
+    output = template(state)
+    _stats["templated" if output else "declined"] += 1
+    if output:
+        logger.debug(f"Templated {state.get('request_type')} reply")
+    return output
+
+
+def get_template_stats() -> Dict[str, int]:
+    return dict(_stats)
@@ -0,0 +1,239 @@
+import argparse
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional
+from firebase_functions import logger
+
+# Per-turn traces of the agent graph. get_llm_response opens a Trace for each
+# turn; TraceHandler (lib/turn_stats.py) adds a span for every graph node,
+# nested agent node, tool call and LLM call, with wall time and token counts,
+# and the HTTP client and caches add events (endpoint, status, hit or miss)
+# to the trace of the turn they run in. Finished turns are appended to
+# TRACE_PATH as one JSON object per line; `python -m lib.tracing` summarizes
+# the file as latency percentiles per span.
+
+TRACING_ENABLED = os.getenv("TRACING", "false").lower() == "true"
+TRACE_PATH = os.getenv("TRACE_PATH", "/tmp/agent_traces.jsonl")
+# The trace file is moved to TRACE_PATH.1 once it grows past this size
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(20 * 1024 * 1024)))
+PERCENTILES = (50, 90, 99)
+
+
+class Trace:
+    def __init__(self, mode: str):
+        self.trace_id = uuid.uuid4().hex
+        self.mode = mode
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.seconds: Optional[float] = None
+        self.attributes: Dict[str, Any] = {}
+        self.spans: List[Dict[str, Any]] = []
+        self._open: Dict[Any, Dict[str, Any]] = {}
+        # Parent of every callback run, so spans can skip runs that are not traced
+        self._parents: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+
+    def _offset(self) -> float:
+        return time.perf_counter() - self._start
+
+    def link(self, run_id: Any, parent_run_id: Any) -> None:
+        """Remember a run that has no span of its own, so its children find their traced ancestor."""
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+
+    def _traced_parent(self, parent_run_id: Any) -> Optional[int]:
+        while parent_run_id is not None:
+            span = self._open.get(parent_run_id)
+            if span is not None:
+                return span["id"]
+            parent_run_id = self._parents.get(parent_run_id)
+        return None
+
+    def parent_name(self, parent_run_id: Any) -> Optional[str]:
+        """Name of the nearest traced ancestor of a run."""
+        with self._lock:
+            parent = self._traced_parent(parent_run_id)
+            return self.spans[parent]["name"] if parent is not None else None
+
+    def start_span(self, run_id: Any, parent_run_id: Any, kind: str, name: str, **attributes: Any) -> None:
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+            span = {"id": len(self.spans), "parent": self._traced_parent(parent_run_id), "kind": kind, "name": name, "start": self._offset(), "seconds": None}
+            span.update({key: value for key, value in attributes.items() if value is not None})
+            self.spans.append(span)
+            self._open[run_id] = span
+
+    def end_span(self, run_id: Any, error: Optional[BaseException] = None, **attributes: Any) -> None:
+        with self._lock:
+            span = self._open.pop(run_id, None)
+            if span is None:
+                return
+            span["seconds"] = self._offset() - span["start"]
+            span.update({key: value for key, value in attributes.items() if value is not None})
+            if error is not None:
+                span["error"] = type(error).__name__
+
+    def event(self, kind: str, name: str, seconds: float = 0.0, **attributes: Any) -> None:
+        """A finished span reported from outside the callback tree (an HTTP request, a cache lookup)."""
+        with self._lock:
+            span = {"id": len(self.spans), "parent": None, "kind": kind, "name": name, "start": self._offset() - seconds, "seconds": seconds}
+            span.update({key: value for key, value in attributes.items() if value is not None and value is not False})
+            self.spans.append(span)
+
+    def finish(self, **attributes: Any) -> "Trace":
+        with self._lock:
+            self.seconds = self._offset()
+            self.attributes.update(attributes)
+        return self
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [dict(span) for span in self.spans]
+        llm_spans = [span for span in spans if span["kind"] == "llm"]
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "mode": self.mode,
+            "seconds": self.seconds,
+            **self.attributes,
+            "llm_calls": len(llm_spans),
+            "tool_calls": sum(1 for span in spans if span["kind"] == "tool"),
+            "prompt_tokens": sum(span.get("prompt_tokens", 0) for span in llm_spans),
+            "completion_tokens": sum(span.get("completion_tokens", 0) for span in llm_spans),
+            "spans": spans,
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+_export_lock = threading.Lock()
+
+
+def start_trace(mode: str) -> Optional[Trace]:
+    """A new Trace for a turn, or None when TRACING is off."""
+    return Trace(mode) if TRACING_ENABLED else None
+
+
+@contextlib.contextmanager
+def tracing_to(trace: Optional[Trace]) -> Iterator[None]:
+    """Make `trace` the current trace for code run in this context."""
+    token = _current_trace.set(trace)
+    try:
+        yield
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def record_http(endpoint: str, seconds: float, status: Optional[int] = None, error: bool = False, retry: bool = False, rejected: bool = False) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.event("http", endpoint, seconds, status=status, error=error, retry=retry, rejected=rejected)
+
+
+def record_cache(name: str, result: str) -> None:
+    """A cache lookup in the current turn; `result` is hit, miss, or a cache-specific outcome (coalesced, revalidated, stale)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.event("cache", name, result=result)
+
+
+def export_trace(trace: Trace, path: str = TRACE_PATH) -> None:
+    """Append a finished trace to the trace file."""
+    line = json.dumps(trace.as_dict(), default=str) + "\n"
+    try:
+        with _export_lock:
+            if os.path.exists(path) and os.path.getsize(path) > TRACE_MAX_BYTES:
+                os.replace(path, path + ".1")
+            with open(path, "a") as f:
+                f.write(line)
+    except OSError as e:
+        logger.error(f"Failed to write trace to {path}: {e}")
+
+
+def load_traces(path: str = TRACE_PATH) -> List[Dict[str, Any]]:
+    traces = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                traces.append(json.loads(line))
+    return traces
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of `values`."""
+    ordered = sorted(values)
+    index = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(traces: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Latency percentiles per turn and per (kind, name) span, token totals for LLM spans, outcomes for HTTP and cache spans."""
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    for trace in traces:
+        groups.setdefault(("turn", trace.get("mode", "")), {"seconds": [], "outcomes": {}})["seconds"].append(trace.get("seconds") or 0.0)
+        for span in trace.get("spans", []):
+            group = groups.setdefault((span["kind"], span["name"]), {"seconds": [], "outcomes": {}, "prompt_tokens": 0, "completion_tokens": 0})
+            if span.get("seconds") is not None:
+                group["seconds"].append(span["seconds"])
+            outcome = span.get("result") or span.get("status") or span.get("error")
+            if outcome is not None:
+                group["outcomes"][str(outcome)] = group["outcomes"].get(str(outcome), 0) + 1
+            group["prompt_tokens"] = group.get("prompt_tokens", 0) + span.get("prompt_tokens", 0)
+            group["completion_tokens"] = group.get("completion_tokens", 0) + span.get("completion_tokens", 0)
+    summary = {}
+    for (kind, name), group in sorted(groups.items()):
+        seconds = group["seconds"]
+        entry: Dict[str, Any] = {"count": len(seconds)}
+        if seconds:
+            entry.update({f"p{pct}": percentile(seconds, pct) for pct in PERCENTILES})
+            entry["max"] = max(seconds)
+        for key in ("prompt_tokens", "completion_tokens"):
+            if group.get(key):
+                entry[key] = group[key]
+        if group["outcomes"]:
+            entry["outcomes"] = group["outcomes"]
+        summary[f"{kind}:{name}"] = entry
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize agent traces as latency percentiles per span")
+    parser.add_argument("--path", default=TRACE_PATH, help="trace file written with TRACING=true")
+    parser.add_argument("--last", type=int, default=None, help="only the most recent N turns")
+    parser.add_argument("--kind", default=None, help="only spans of this kind: turn, node, llm, tool, http or cache")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    traces = load_traces(args.path)
+    if args.last:
+        traces = traces[-args.last:]
+    summary = summarize(traces)
+    if args.kind:
+        summary = {key: value for key, value in summary.items() if key.split(":", 1)[0] == args.kind}
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"{len(traces)} turns from {args.path}")
+    print(f"{'span':<56} {'count':>6} " + " ".join(f"{'p' + str(pct):>9}" for pct in PERCENTILES) + f" {'max':>9}  tokens / outcomes")
+    for key, entry in summary.items():
+        timings = " ".join(f"{entry[f'p{pct}'] * 1000:7.1f}ms" if f"p{pct}" in entry else f"{'-':>9}" for pct in PERCENTILES)
+        peak = f"{entry['max'] * 1000:7.1f}ms" if "max" in entry else f"{'-':>9}"
+        extra = []
+        if "prompt_tokens" in entry or "completion_tokens" in entry:
+            extra.append(f"{entry.get('prompt_tokens', 0)} in / {entry.get('completion_tokens', 0)} out")
+        if "outcomes" in entry:
+            extra.append(", ".join(f"{outcome}: {count}" for outcome, count in sorted(entry["outcomes"].items())))
+        print(f"{key[:56]:<56} {entry['count']:>6} {timings} {peak}  {'; '.join(extra)}")
+
+
+if __name__ == "__main__":
+    main()
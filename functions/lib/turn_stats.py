@@ -0,0 +1,160 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from lib.tracing import Trace
+
+# Per-turn counters for one run of the supervisor graph. get_llm_response
+# creates a TurnStats and passes its callback handler to the graph; the handler
+# is inherited by every nested agent, so each chat model call is counted
+# against the graph node that made it.
+
+
+class TurnStats:
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+        self.llm_calls = 0
+        self.llm_calls_by_node: Dict[str, int] = {}
+        self.route: List[str] = []
+        self._lock = threading.Lock()
+
+    def record_llm_call(self, node: str) -> None:
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_calls_by_node[node] = self.llm_calls_by_node.get(node, 0) + 1
+
+    def record_node(self, node: str) -> None:
+        with self._lock:
+            self.route.append(node)
+
+    def finish(self) -> "TurnStats":
+        self.finished_at = time.perf_counter()
+        return self
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "seconds": self.seconds,
+                "llm_calls": self.llm_calls,
+                "llm_calls_by_node": dict(self.llm_calls_by_node),
+                "route": list(self.route),
+            }
+
+
+def _graph_node(metadata: Optional[Dict[str, Any]]) -> str:
+    """Name of the top-level graph node a callback came from."""
+    metadata = metadata or {}
+    # Nested agents overwrite langgraph_node with their own node names, but the
+    # checkpoint namespace keeps the outer node first: "product_info_agent:<id>|agent:<id>"
+    namespace = metadata.get("langgraph_checkpoint_ns") or ""
+    if namespace:
+        return namespace.split("|")[0].split(":")[0]
+    return metadata.get("langgraph_node", "unknown")
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Counts chat model calls into a TurnStats."""
+
+    # Count in the calling thread on the async path too, instead of in an executor
+    run_inline = True
+
+    def __init__(self, stats: TurnStats):
+        self.stats = stats
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs) -> None:
+        self.stats.record_llm_call(_graph_node(metadata))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs) -> None:
+        self.stats.record_llm_call(_graph_node(metadata))
+
+
+def _span_node(metadata: Optional[Dict[str, Any]]) -> str:
+    """The graph node a callback ran in, qualified by its outer node inside nested agents: `product_info_agent.tools`."""
+    metadata = metadata or {}
+    outer = _graph_node(metadata)
+    node = metadata.get("langgraph_node", outer)
+    return outer if node == outer else f"{outer}.{node}"
+
+
+def _token_usage(response) -> Dict[str, int]:
+    """Prompt and completion tokens of an LLMResult, from the provider's usage or the message usage metadata."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return {"prompt_tokens": usage.get("prompt_tokens", 0), "completion_tokens": usage.get("completion_tokens", 0)}
+    totals = {"prompt_tokens": 0, "completion_tokens": 0}
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            totals["prompt_tokens"] += metadata.get("input_tokens", 0)
+            totals["completion_tokens"] += metadata.get("output_tokens", 0)
+    return totals
+
+
+class TraceHandler(BaseCallbackHandler):
+    """Records graph nodes, nested agent nodes, tool calls and LLM calls as spans of a Trace."""
+
+    run_inline = True
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs) -> None:
+        # Only the runnable a node is registered as carries the node's own name; the
+        # graph's __start__ step and a node's inner runnable of the same name are not spans
+        name = kwargs.get("name")
+        if metadata and name and name == metadata.get("langgraph_node") and not name.startswith("__"):
+            node = _span_node(metadata)
+            if self.trace.parent_name(parent_run_id) != node:
+                self.trace.start_span(run_id, parent_run_id, "node", node)
+                return
+        self.trace.link(run_id, parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs) -> None:
+        self.trace.end_span(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs) -> None:
+        # GraphInterrupt and Command routing are raised through chains too; only real errors are marked
+        self.trace.end_span(run_id, error=error if not type(error).__name__.startswith(("Graph", "Parent")) else None)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs) -> None:
+        model = (kwargs.get("invocation_params") or {}).get("model") or (kwargs.get("invocation_params") or {}).get("model_name")
+        self.trace.start_span(run_id, parent_run_id, "llm", _span_node(metadata), model=model)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs) -> None:
+        self.trace.start_span(run_id, parent_run_id, "llm", _span_node(metadata))
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        self.trace.end_span(run_id, **_token_usage(response))
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self.trace.end_span(run_id, error=error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        self.trace.start_span(run_id, parent_run_id, "tool", name, node=_graph_node(metadata))
+
+    def on_tool_end(self, output, *, run_id, **kwargs) -> None:
+        self.trace.end_span(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs) -> None:
+        self.trace.end_span(run_id, error=error)
+
+
+_last_turn: Optional[TurnStats] = None
+
+
+def set_last_turn(stats: TurnStats) -> None:
+    global _last_turn
+    _last_turn = stats
+
+
+def last_turn() -> Optional[Dict[str, Any]]:
+    """Stats of the most recently finished turn in this process."""
+    return _last_turn.as_dict() if _last_turn else None
@@ -1,15 +1,34 @@
-from typing import Literal, Optional, List, Dict, Any
-from langchain_openai import ChatOpenAI
+from typing import TYPE_CHECKING, Literal, Optional, List, Dict, Any, Union
 from langgraph.graph import MessagesState
 from pydantic import Field
 from typing_extensions import TypedDict
 import os
+import threading
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+# The chat model is built on first use: importing langchain_openai (and openai
+# with it) is the largest part of a cold import, and modules that only need the
+# State and schema types should not pay for it.
+_llm: Optional["ChatOpenAI"] = None
+_llm_lock = threading.Lock()
+
+
+def get_llm() -> "ChatOpenAI":
+    """Return the shared chat model, creating it on first use."""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_openai import ChatOpenAI
+                _llm = ChatOpenAI(
+                    model="gpt-4o",
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    temperature=0
+                )
+    return _llm
 
-prebuilt_llm = ChatOpenAI(
-    model="gpt-4o",
-    api_key=os.getenv("OPENAI_API_KEY"),
-    temperature=0
-)
 agents = Literal["human_interaction", "product_agent", "store_agent", "store_search_agent", "store_info_agent"]
 # Define valid agent interactions
 VALID_AGENT_REQUESTS = {
@@ -21,6 +40,16 @@ VALID_AGENT_REQUESTS = {
 }
 
 
+# Define our possible routes
+supervisor_options = Literal["human_interaction", "product_search_agent", "product_info_agent", "store_search_agent", "store_info_agent", "end"]
+
+class Router(TypedDict):
+    next_agent: supervisor_options
+    parallel_agents: Optional[List[supervisor_options]] = Field(default=None, description="Independent agents to run at the same time instead of next_agent")
+    request_type: Optional[str] = Field(default="analyze", description="The type of request being made")
+    request_info: Optional[Dict[str, Any]] = Field(default_factory=dict, description="Information for the target agent to process the request")
+
+
 class Message(TypedDict):
     role: Literal["system", "user", "assistant"] = Field(..., description="The role of the message sender")
     content: str = Field(..., description="The content of the message")
@@ -47,6 +76,20 @@ class State(TypedDict):
     pending_request: Optional[AgentRequest] = Field(default=None, description="Pending agent request")
     agent_scratchpad: Optional[str] = Field(default="", description="The scratchpad of the agent that made the request")
     output_image: Optional[str] = Field(default=None, description="The image to be displayed to the user, as a URL")
+    plan: Optional[List[str]] = Field(default=None, description="Remaining agents to run this turn, in plan mode")
+    replan: Optional[bool] = Field(default=False, description="Set by a worker that needs information its plan did not cover")
+    parallel_agents: Optional[List[str]] = Field(default=None, description="Worker agents the fan_out node should run at the same time")
+    agent_results: Optional[Dict[str, Any]] = Field(default_factory=dict, description="The latest structured response from each worker agent")
+    products: Optional[List["Product"]] = Field(default_factory=list, description="Products found by worker agents this turn, one per part number")
+    stores: Optional[List["Store"]] = Field(default_factory=list, description="Stores found by worker agents this turn, one per name")
+    pricing: Optional[Dict[str, str]] = Field(default_factory=dict, description="Prices found by worker agents this turn, by part number")
+    request_type: Optional[str] = Field(default=None, description="The type of request the turn was routed as, e.g. price_check or store_hours")
+    request_info: Optional[Dict[str, Any]] = Field(default_factory=dict, description="Information the router extracted for the request")
+
+class Plan(TypedDict):
+    steps: List[Union[supervisor_options, List[supervisor_options]]] = Field(..., description="The agents to run in order, ending with human_interaction. A list of agents in place of a single agent runs them at the same time")
+    request_type: Optional[str] = Field(default="analyze", description="The type of request being made")
+    request_info: Optional[Dict[str, Any]] = Field(default_factory=dict, description="Information for the agents to process the request")
 
 class Product(TypedDict):
     name: str = Field(..., description="The name of the product")
@@ -56,6 +99,8 @@ class Product(TypedDict):
     image_url: Optional[str] = Field(default=None, description="The URL of the product image")
     additional_info: Optional[str] = Field(default=None, description="Additional information about the product")
     description: Optional[str] = Field(default=None, description="The description of the product")
+    in_stock: Optional[bool] = Field(default=None, description="Whether the product is in stock, only if availability was looked up")
+    available_quantity: Optional[int] = Field(default=None, description="The available quantity, only if availability was looked up")
 
 class ProductList(AgentStructuredResponse):
     products: List[Product] = Field(default_factory=list, description="List of relevant products found")
@@ -72,6 +117,7 @@ class Store(TypedDict):
     latitude: Optional[float] = Field(default=None, description="The latitude of the store")
     phone_number: Optional[str] = Field(default=None, description="The phone number of the store")
     website_url: Optional[str] = Field(default=None, description="The website URL of the store")
+    hours: Optional[str] = Field(default=None, description="The opening hours of the store, only if they were looked up")
 
 class StoreList(AgentStructuredResponse):
     found_stores: List[Store] = Field(default_factory=list, description="List of relevant stores found")
@@ -1,5 +1,22 @@
-from typing import List, Dict
-from lib.types import prebuilt_llm
+from typing import List, Dict, Optional
+
+summary_prompt = """Summarize the key points from this conversation, focusing on:
+    1. User's main problem or question
+    2. Important part numbers or model numbers mentioned
+    3. Key findings or solutions discussed
+    Keep only the most relevant information."""
+
+
+def fold_into_summary(summary: Optional[str], messages: List[Dict[str, str]]) -> str:
+    """Return `summary` updated with `messages`. Only the new messages are sent, not the whole conversation."""
+    # lib.types pulls in langgraph; main imports this module at cold start, so it is loaded on first summary
+    from lib.types import get_llm
+    prompt = summary_prompt
+    if summary:
+        prompt += f"\n\nThe summary so far:\n{summary}\n\nUpdate it with these newer messages, keeping it short:"
+    prompt += "\n\nConversation:\n" + "\n".join([f"{m['role']}: {m['content']}" for m in messages])
+    return get_llm().invoke(prompt).content
+
 
 def summarize_conversation(messages: List[Dict[str, str]], keep_last: int = 3) -> List[Dict[str, str]]:
     """Summarize older messages while keeping recent ones intact."""
@@ -11,16 +28,7 @@ def summarize_conversation(messages: List[Dict[str, str]], keep_last: int = 3) -
     older_messages = messages[:-keep_last]
     
     # Summarize older messages
-    summary_prompt = """Summarize the key points from this conversation, focusing on:
-    1. User's main problem or question
-    2. Important part numbers or model numbers mentioned
-    3. Key findings or solutions discussed
-    Keep only the most relevant information."""
-    
-    summary = prebuilt_llm.invoke(
-        f"{summary_prompt}\n\nConversation:\n" + 
-        "\n".join([f"{m['role']}: {m['content']}" for m in older_messages])
-    )
+    summary = fold_into_summary(None, older_messages)
     
     # Create a summary message
     summary_message = {
@@ -28,4 +36,4 @@ def summarize_conversation(messages: List[Dict[str, str]], keep_last: int = 3) -
         "content": f"Previous conversation summary: {summary}"
     }
     
-    return [summary_message] + recent_messages 
\ No newline at end of file
+    return [summary_message] + recent_messages
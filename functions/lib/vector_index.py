@@ -0,0 +1,173 @@
+import argparse
+import importlib.util
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
+from firebase_functions import logger
+
+# Semantic product search. Product names and descriptions are embedded with a
+# small local CPU model (fastembed, ONNX) and stored as a flat, L2-normalized
+# float32 matrix in VECTOR_INDEX_PATH/vectors.npy, which is memory-mapped at
+# load so instances share the pages and only touch what they read. A query is
+# one matrix-vector product over the map and an argpartition for the top k.
+#
+# fastembed pulls in onnxruntime, so it is not in requirements.txt. Install
+# requirements-index.txt to build the index from a catalog export with:
+#     python -m lib.vector_index --catalog catalog.json --out vector_index
+# A deployment that sets VECTOR_INDEX_PATH needs fastembed too, to embed
+# queries; without it the semantic search tool is not offered.
+
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5")
+
+VECTORS_FILE = "vectors.npy"
+PRODUCTS_FILE = "products.json"
+META_FILE = "meta.json"
+
+# Rows scored per matrix product, so a large map is not paged in all at once
+SEARCH_CHUNK_ROWS = 65536
+EMBED_BATCH_SIZE = 64
+QUERY_CACHE_SIZE = 256
+
+Embedder = Callable[[Sequence[str]], np.ndarray]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def product_text(product: Dict[str, Any]) -> str:
+    """The text embedded for a product."""
+    return ". ".join(str(part) for part in (product.get("name"), product.get("additional_info"), product.get("description")) if part)
+
+
+_embedder: Optional[Embedder] = None
+_embedder_lock = threading.Lock()
+
+
+def embeddings_available() -> bool:
+    """Whether fastembed is installed, without importing it."""
+    return importlib.util.find_spec("fastembed") is not None
+
+
+def get_embedder() -> Embedder:
+    """Return the process-wide embedding function, loading the model on first use."""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                # Imported here so instances without a vector index never load the model runtime
+                from fastembed import TextEmbedding
+                model = TextEmbedding(model_name=EMBEDDING_MODEL)
+                _embedder = lambda texts: np.array(list(model.embed(list(texts), batch_size=EMBED_BATCH_SIZE)), dtype=np.float32)
+                logger.info(f"Loaded embedding model {EMBEDDING_MODEL}")
+    return _embedder
+
+
+class VectorIndex:
+    def __init__(self, vectors: np.ndarray, products: List[Dict[str, Any]], model: str, embedder: Optional[Embedder] = None):
+        if len(vectors) != len(products):
+            raise ValueError(f"Vector index has {len(vectors)} vectors but {len(products)} products")
+        self.vectors = vectors
+        self.products = products
+        self.model = model
+        self._embedder = embedder
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, directory: str, embedder: Optional[Embedder] = None) -> "VectorIndex":
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, PRODUCTS_FILE)) as f:
+            products = json.load(f)
+        vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+        if meta.get("model") != EMBEDDING_MODEL and embedder is None:
+            logger.warn(f"Vector index was built with {meta.get('model')}, queries use {EMBEDDING_MODEL}")
+        return cls(vectors, products, meta.get("model", EMBEDDING_MODEL), embedder)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        key = query.strip().lower()
+        with self._lock:
+            vector = self._query_cache.get(key)
+            if vector is not None:
+                self._query_cache.move_to_end(key)
+                return vector
+        vector = _normalize((self._embedder or get_embedder())([query]))[0]
+        with self._lock:
+            self._query_cache[key] = vector
+            if len(self._query_cache) > QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return vector
+
+    def search_vector(self, vector: np.ndarray, k: int = 5) -> List[tuple]:
+        """(row, cosine similarity) of the k nearest rows, best first."""
+        if not len(self):
+            return []
+        scores = np.concatenate([
+            self.vectors[start:start + SEARCH_CHUNK_ROWS] @ vector
+            for start in range(0, len(self.vectors), SEARCH_CHUNK_ROWS)
+        ])
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """The k products closest in meaning to `query`, as Product records with a relevance score."""
+        return [
+            {**self.products[row], "relevance_score": round(score, 4)}
+            for row, score in self.search_vector(self.embed_query(query), k)
+            if score >= min_score
+        ]
+
+
+def build_vector_index(products: List[Dict[str, Any]], directory: str, embedder: Optional[Embedder] = None) -> VectorIndex:
+    """Embed `products` and write the index files to `directory`."""
+    embedder = embedder or get_embedder()
+    os.makedirs(directory, exist_ok=True)
+    texts = [product_text(product) for product in products]
+    vectors = _normalize(np.concatenate([
+        embedder(texts[start:start + EMBED_BATCH_SIZE]) for start in range(0, len(texts), EMBED_BATCH_SIZE)
+    ]) if texts else np.zeros((0, 0), dtype=np.float32))
+    np.save(os.path.join(directory, VECTORS_FILE), vectors)
+    with open(os.path.join(directory, PRODUCTS_FILE), "w") as f:
+        json.dump(products, f)
+    with open(os.path.join(directory, META_FILE), "w") as f:
+        json.dump({"model": EMBEDDING_MODEL, "count": len(products), "dimensions": int(vectors.shape[1]) if vectors.ndim == 2 else 0}, f)
+    logger.info(f"Wrote vector index for {len(products)} products to {directory}")
+    return VectorIndex.load(directory, embedder)
+
+
+_vector_index: Optional[VectorIndex] = None
+_vector_index_lock = threading.Lock()
+
+
+def get_vector_index() -> Optional[VectorIndex]:
+    """Return the process-wide vector index from VECTOR_INDEX_PATH, or None if it is not configured."""
+    global _vector_index
+    if not VECTOR_INDEX_PATH:
+        return None
+    if _vector_index is None:
+        with _vector_index_lock:
+            if _vector_index is None:
+                _vector_index = VectorIndex.load(VECTOR_INDEX_PATH)
+    return _vector_index
+
+
+if __name__ == "__main__":
+    from lib.product_catalog import load_records, to_product
+
+    parser = argparse.ArgumentParser(description="Build the semantic product search index from a catalog export")
+    parser.add_argument("--catalog", required=True, help="catalog export (JSON array or JSON Lines)")
+    parser.add_argument("--out", required=True, help="directory to write the index to")
+    args = parser.parse_args()
+    build_vector_index([to_product(record) for record in load_records(args.catalog)], args.out)
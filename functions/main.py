@@ -1,86 +1,179 @@
 import os
+import threading
 import time
 from firebase_functions import https_fn
 from firebase_admin import initialize_app
 from firebase_functions import logger
 from firebase_functions.options import CorsOptions
 from twilio.twiml.messaging_response import MessagingResponse
-from twilio.rest import Client
-from langchain_client import get_llm_response
+from lib.history_store import get_history_store
+from lib.conversation_summary import SUMMARY_ENABLED, conversation_context, update_summary
+from lib.reply_worker import get_reply_dispatcher
 
 initialize_app()
 __all__ = ["whatsapp_webhook"]
-twilio_client = Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
 
 rishi_phone_number = os.getenv("RISHI_PHONE_NUMBER")
 twilio_phone_number = os.getenv("TWILIO_PHONE_NUMBER")
-def get_message_history():
+# Number of most recent messages passed to the agents on each turn when conversation summaries are off
+HISTORY_LIMIT = int(os.getenv("HISTORY_LIMIT", "20"))
+# Acknowledge the webhook immediately and deliver replies from background workers
+ASYNC_REPLIES = os.getenv("ASYNC_REPLIES", "false").lower() == "true"
+# Send the final reply in parts (paragraphs, bullet groups) as soon as each is generated
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "false").lower() == "true"
+BUSY_MESSAGE = "We're handling a lot of messages right now. Please try again in a minute."
+ERROR_MESSAGE = "I'm sorry, something went wrong while processing your message. Please try again."
+# Import the agents and build the graph in a background thread at cold start
+PRELOAD_AGENTS = os.getenv("PRELOAD_AGENTS", "true").lower() == "true"
+
+# The runtime (and the deploy step, to discover the functions) imports this
+# module on every cold start, so nothing heavy is imported here: the Twilio
+# REST client is created on first send, and langchain_client, which pulls in
+# langgraph, langchain, the OpenAI client and every agent and tool module, is
+# imported on the first message or by the preload thread.
+_twilio_client = None
+_twilio_client_lock = threading.Lock()
+
+def get_twilio_client():
+    """Return the Twilio REST client, creating it on first use."""
+    global _twilio_client
+    if _twilio_client is None:
+        with _twilio_client_lock:
+            if _twilio_client is None:
+                from twilio.rest import Client
+                _twilio_client = Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
+    return _twilio_client
+
+def get_llm_response(messages, on_reply_chunk=None):
+    from langchain_client import get_llm_response as run_agents
+    return run_agents(messages, on_reply_chunk)
+
+def preload_agents():
+    """Import the agent stack and build the graph while the first request is being received."""
+    try:
+        import langchain_client
+        langchain_client.warm_up()
+    except Exception as e:
+        logger.error(f"Failed to preload agents: {str(e)}")
+
+if PRELOAD_AGENTS:
+    threading.Thread(target=preload_agents, name="preload-agents", daemon=True).start()
+
+def get_message_history(phone_number):
     logger.info("Getting message history")
-    
-    messages = []
-    for message in twilio_client.messages.list():
-        if message.from_ == rishi_phone_number:
-            role = "user"
-        else:
-            role = "assistant"
-        messages.append({"role": role, "content": message.body})
-    return messages
-def clear_message_history():
-    for message in twilio_client.messages.list():
-        logger.info(message.status, message.body)
-        if message.status != "receiving":
-            message.delete()
+    if SUMMARY_ENABLED:
+        return conversation_context(get_history_store(), phone_number)
+    return get_history_store().recent(phone_number, HISTORY_LIMIT)
 
+def update_conversation_summary(phone_number):
+    """Fold messages that left the context window into the running summary, after the reply is out."""
+    if not SUMMARY_ENABLED:
+        return
+    try:
+        update_summary(get_history_store(), phone_number)
+    except Exception as e:
+        logger.error(f"Failed to update conversation summary for {phone_number}: {str(e)}")
 
-@https_fn.on_request(
-    timeout_sec=600
-)
-def whatsapp_webhook(request):
-    logger.info("Whatsapp webhook called")
-    logger.info(request.values)
-    user_input = request.values.get('Body', "")
-    
-    
-    logger.info(user_input)
-    
+def clear_message_history(phone_number):
+    deleted = get_history_store().clear(phone_number)
+    logger.info(f"Cleared {deleted} messages for {phone_number}")
+
+def send_message(phone_number, body, media_url=None):
+    """Send a message through Twilio."""
+    if media_url:
+        get_twilio_client().messages.create(
+            to=phone_number,
+            from_=twilio_phone_number,
+            body=body,
+            media_url=media_url
+        )
+    else:
+        get_twilio_client().messages.create(
+            to=phone_number,
+            from_=twilio_phone_number,
+            body=body
+        )
+
+def send_reply(phone_number, body, media_url=None):
+    """Send a reply through Twilio and record it in the conversation history."""
+    send_message(phone_number, body, media_url)
+    get_history_store().append(phone_number, "assistant", body)
+
+
+def process_message(phone_number, user_input):
+    """Handle one inbound message end to end and send the reply through Twilio."""
     # start of new conversation
     if user_input == "/clear":
-        clear_message_history()
-        twilio_client.messages.create(
-            to=rishi_phone_number,
+        clear_message_history(phone_number)
+        get_twilio_client().messages.create(
+            to=phone_number,
             from_=twilio_phone_number,
             body="Cleared messages"
         )
         
     else:
-        messages = get_message_history()
+        messages = get_message_history(phone_number)
         logger.info(messages)
+        get_history_store().append(phone_number, "user", user_input)
     
-        llm_response, output_image = get_llm_response(messages + [{"role": "user", "content": user_input}])
-        logger.info(llm_response, output_image)
-        if output_image:
-            twilio_client.messages.create(
-                to=rishi_phone_number,
-                from_=twilio_phone_number,
-                body=llm_response,
-                media_url=output_image
+        if STREAM_REPLIES:
+            # Parts of the reply are sent as they are generated; history keeps the whole reply
+            llm_response, output_image = get_llm_response(
+                messages + [{"role": "user", "content": user_input}],
+                on_reply_chunk=lambda body, media_url=None: send_message(phone_number, body, media_url)
             )
+            logger.info(llm_response, output_image)
+            get_history_store().append(phone_number, "assistant", llm_response)
         else:
-            twilio_client.messages.create(
-                to=rishi_phone_number,
-                from_=twilio_phone_number,
-                body=llm_response
-            )
+            llm_response, output_image = get_llm_response(messages + [{"role": "user", "content": user_input}])
+            logger.info(llm_response, output_image)
+            send_reply(phone_number, llm_response, output_image)
             
             
         logger.info(f"PRINTING FINAL OUTPUT")
         logger.info(llm_response)
+        update_conversation_summary(phone_number)
 
-    time.sleep(15)
-    return ""
-   
-    
+def process_message_in_background(phone_number, user_input):
+    """process_message for a reply worker. On failure the sender gets ERROR_MESSAGE and the
+    error is re-raised for the worker to log and count, so it is logged once."""
+    try:
+        process_message(phone_number, user_input)
+    except Exception:
+        # A failed error reply must not replace the original exception
+        try:
+            send_reply(phone_number, ERROR_MESSAGE)
+        except Exception as send_error:
+            logger.error(f"Failed to send the error reply to {phone_number}: {str(send_error)}")
+        raise
 
+def twiml_response(body=None):
+    response = MessagingResponse()
+    if body:
+        response.message(body)
+    return https_fn.Response(str(response), mimetype="application/xml")
 
 
+@https_fn.on_request(
+    timeout_sec=600
+)
+def whatsapp_webhook(request):
+    logger.info("Whatsapp webhook called")
+    logger.info(request.values)
+    user_input = request.values.get('Body', "")
+    phone_number = request.values.get('From') or rishi_phone_number
+    
+    
+    logger.info(user_input)
+
+    if ASYNC_REPLIES:
+        # Acknowledge Twilio right away; a worker runs the agents and sends the reply
+        dispatcher = get_reply_dispatcher(process_message_in_background)
+        if not dispatcher.submit(phone_number, user_input):
+            return twiml_response(BUSY_MESSAGE)
+        return twiml_response()
+
+    process_message(phone_number, user_input)
 
+    time.sleep(15)
+    return ""
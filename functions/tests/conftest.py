@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Tests import the function's modules the way the runtime does, from the functions directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Nothing under test calls OpenAI, but building a client requires a key
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,74 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from lib import context_builder, patterns
+from lib.context_builder import TRUNCATION_MARKER, build_context, count_tokens, fit_messages, mentioned_ids, truncate
+
+
+class WordEncoding:
+    """A tokenizer with one token per space-separated word, standing in for tiktoken."""
+
+    def encode(self, text, disallowed_special=()):
+        return text.split(" ")
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture(params=["estimate", "encoding"])
+def encoding(request, monkeypatch):
+    monkeypatch.setattr(context_builder, "_encoding", WordEncoding() if request.param == "encoding" else None)
+    monkeypatch.setattr(context_builder, "_encoding_loaded", True)
+
+
+@pytest.fixture(autouse=True)
+def no_store_index(monkeypatch):
+    monkeypatch.setattr(patterns, "get_store_index", lambda: None)
+
+
+def test_short_text_is_kept(encoding):
+    assert truncate("a short text", 100) == ("a short text", 0)
+
+
+@pytest.mark.parametrize("budget", [5, 10, 50])
+def test_truncated_text_fits_the_budget_with_the_marker(encoding, budget):
+    text = " ".join(f"word{i}" for i in range(200))
+    kept, trimmed = truncate(text, budget)
+    assert kept.endswith(TRUNCATION_MARKER)
+    assert count_tokens(kept) <= budget
+    assert trimmed > 0
+
+
+def test_budget_too_small_for_the_marker_keeps_nothing(encoding):
+    text = " ".join(f"word{i}" for i in range(200))
+    assert truncate(text, 1) == ("", count_tokens(text))
+
+
+def test_mentioned_ids_most_recent_first():
+    messages = [
+        HumanMessage(content="is PS11752778 in stock at store 12?"),
+        AIMessage(content="product_info_agent: W10321304"),
+        HumanMessage(content="what about W10712395 at my nearest store 75001"),
+    ]
+    assert mentioned_ids(messages) == {
+        "part_numbers": ["W10712395", "PS11752778"],
+        "store_ids": ["12"],
+        "zip_codes": ["75001"],
+    }
+
+
+def test_build_context_stays_within_the_budget(encoding):
+    state = {
+        "messages": [HumanMessage(content="how much is PS11752778")],
+        "agent_results": {"product_search_agent": {"products": [{"name": "pump " * 100}]}},
+    }
+    context = build_context(state, "store_info_agent", budget=30)
+    assert context.startswith("Latest user message: how much is PS11752778")
+    assert count_tokens(context) <= 30
+
+
+def test_fit_messages_keeps_the_newest_and_the_last_user_message(encoding):
+    messages = [HumanMessage(content="old " * 50), AIMessage(content="older answer " * 50), HumanMessage(content="latest question")]
+    assert fit_messages(messages, "human_interaction", budget=10) == messages[-1:]
+    assert fit_messages(messages, "human_interaction", budget=1) == messages[-1:]
+    assert fit_messages(messages, "human_interaction", budget=1000) == messages
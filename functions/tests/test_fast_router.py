@@ -0,0 +1,120 @@
+import pytest
+
+from lib import patterns
+from lib.fast_router import MIN_CONFIDENCE, classify
+
+
+class FakeStoreIndex:
+    def __init__(self, store_ids):
+        self.loaded_at = 0.0
+        self.stores = {store_id: {"id": store_id} for store_id in store_ids}
+
+
+class FakeCatalog:
+    def __init__(self, numbers):
+        self.numbers = set(numbers)
+
+    def lookup(self, number):
+        return [{"manufacturer_number": number}] if number.upper() in self.numbers else []
+
+
+@pytest.fixture
+def no_store_index(monkeypatch):
+    monkeypatch.setattr(patterns, "get_store_index", lambda: None)
+    monkeypatch.setattr(patterns, "get_product_catalog", lambda: FakeCatalog({"SP2610X15"}))
+
+
+@pytest.fixture
+def store_index(monkeypatch):
+    index = FakeStoreIndex({"12", "75001"})
+    monkeypatch.setattr(patterns, "get_store_index", lambda: index)
+    return index
+
+
+def test_greeting_and_command(no_store_index):
+    decision, confidence = classify("Hello!")
+    assert decision["next_agent"] == "human_interaction"
+    assert decision["request_type"] == "greeting"
+    assert classify("/clear")[0]["request_type"] == "command"
+
+
+def test_bare_part_number(no_store_index):
+    decision, confidence = classify("PS11752778")
+    assert decision == {"next_agent": "product_info_agent", "request_type": "product_details", "request_info": {"part_numbers": ["PS11752778"]}}
+    assert confidence >= 0.95
+
+
+@pytest.mark.parametrize("text, request_type", [
+    ("how much is PS11752778?", "price_check"),
+    ("what's the price of W10321304", "price_check"),
+    ("is SP2610X15 in stock", "availability"),
+    ("tell me about PS11752778", "product_details"),
+])
+def test_part_number_request_types(no_store_index, text, request_type):
+    decision, confidence = classify(text)
+    assert decision["request_type"] == request_type
+    assert confidence >= MIN_CONFIDENCE
+
+
+def test_manufacturer_number_not_in_the_catalog_is_left_to_the_llm(no_store_index):
+    decision, confidence = classify("is WDT780SAEM1 in stock")
+    assert decision["request_info"] == {"part_numbers": ["WDT780SAEM1"]}
+    assert confidence < MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize("text", [
+    "My pool is 20x40 ft, what pump?",
+    "What does the 1500W heater cost?",
+])
+def test_dimensions_and_units_are_not_part_numbers(no_store_index, text):
+    decision, confidence = classify(text)
+    assert decision is None or confidence < MIN_CONFIDENCE
+    assert decision is None or "part_numbers" not in decision["request_info"]
+
+
+def test_store_hours_by_id(no_store_index):
+    decision, confidence = classify("what are the hours for store 12")
+    assert decision["next_agent"] == "store_info_agent"
+    assert decision["request_type"] == "store_hours"
+    assert decision["request_info"] == {"store_id": "12"}
+    assert confidence >= MIN_CONFIDENCE
+
+
+def test_zip_code_store_search(no_store_index):
+    decision, confidence = classify("find a store near 75001")
+    assert decision["next_agent"] == "store_search_agent"
+    assert decision["request_info"] == {"zip_code": "75001"}
+
+
+def test_zip_code_after_nearest_store_is_not_a_store_id(no_store_index):
+    decision, confidence = classify("is PS11752778 in stock at my nearest store 75001?")
+    assert decision["parallel_agents"] == ["product_info_agent", "store_search_agent"]
+    assert decision["request_info"] == {"part_numbers": ["PS11752778"], "zip_code": "75001"}
+
+
+def test_explicit_store_number_is_a_store_id(no_store_index):
+    decision, confidence = classify("is PS11752778 in stock at store #75001?")
+    assert decision["request_info"]["store_id"] == "75001"
+    assert confidence >= MIN_CONFIDENCE
+
+
+def test_zip_shaped_store_id_is_ambiguous_without_the_index(no_store_index):
+    decision, confidence = classify("is PS11752778 in stock at store 75001?")
+    assert decision["request_info"]["store_id"] == "75001"
+    # Left to the supervisor LLM
+    assert confidence < MIN_CONFIDENCE
+
+
+def test_store_index_settles_zip_shaped_ids(store_index):
+    decision, confidence = classify("is PS11752778 in stock at store 75001?")
+    assert decision["request_info"]["store_id"] == "75001"
+    assert confidence >= MIN_CONFIDENCE
+
+    store_index.stores.pop("75001")
+    decision, confidence = classify("is PS11752778 in stock at store 75001?")
+    assert "store_id" not in decision["request_info"]
+    assert decision["request_info"]["zip_code"] == "75001"
+
+
+def test_unrelated_message_is_left_to_the_llm(no_store_index):
+    assert classify("my dishwasher makes a grinding noise") == (None, 0.0)
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from lib.html_extract import PageExtractor, aextract_page, extract_page
+
+
+PAGE = """<html><head><title>Dishwasher Parts</title><script>var x = "PS99999999";</script></head>
+<body>
+<header><a href="/cart">Cart</a> Site menu</header>
+<nav><a href="/Refrigerator-Parts.htm">Refrigerator</a></nav>
+<article>
+  <header><h1>Dishwasher Upper Rack Adjuster</h1></header>
+  <p>Fits models from 2010 on.</p>
+  <div data-inventory-id="11752778">PS11752778 in stock</div>
+</article>
+<footer>Copyright</footer>
+</body></html>"""
+
+
+def chunked(text, size=32):
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+def test_extracts_text_ids_and_links_without_page_chrome():
+    page = extract_page(chunked(PAGE), "https://www.partselect.com/")
+    assert page.title == "Dishwasher Parts"
+    assert page.text == "Dishwasher Upper Rack Adjuster\nFits models from 2010 on.\nPS11752778 in stock"
+    assert page.ids == {"part_id": ["11752778"], "part_number": ["PS11752778"]}
+    assert page.links == {}
+    assert not page.truncated
+
+
+def test_header_inside_an_article_is_kept():
+    page = extract_page([PAGE])
+    assert "Dishwasher Upper Rack Adjuster" in page.text
+    assert "Site menu" not in page.text
+
+
+def test_ids_and_links_after_the_text_cap_are_still_collected():
+    links = "".join(f'<a href="/PS{11752700 + i}.htm?ModelMasterID=M{i}">Part {i}</a>' for i in range(3))
+    html = f"<body><p>{'long description ' * 50}</p>{links}</body>"
+    page = PageExtractor("https://www.partselect.com/", max_chars=40)
+    for chunk in chunked(html):
+        page.feed_chunk(chunk)
+    page.close()
+    assert page.truncated
+    assert len(page.text) <= 40
+    assert page.ids["model_master_id"] == ["M0", "M1", "M2"]
+    assert list(page.links) == [f"https://www.partselect.com/PS{11752700 + i}.htm?ModelMasterID=M{i}" for i in range(3)]
+
+
+@pytest.mark.parametrize("chunks, truncated", [
+    (["<p>", "a" * 16, "</p>"], False),
+    (["<p>", "a" * 16, "</p>", "<p>more</p>"], True),
+])
+def test_truncated_only_when_data_remains_past_max_bytes(chunks, truncated):
+    # The first three chunks are exactly max_bytes
+    page = extract_page(chunks, max_bytes=23)
+    assert page.truncated is truncated
+    assert page.text == "a" * 16
+
+
+def test_async_extraction_matches_sync():
+    async def chunks():
+        for chunk in chunked(PAGE):
+            yield chunk
+
+    page = asyncio.run(aextract_page(chunks(), "https://www.partselect.com/"))
+    assert page.render() == extract_page(chunked(PAGE), "https://www.partselect.com/").render()
@@ -0,0 +1,152 @@
+import asyncio
+
+import httpx
+import pytest
+import requests
+
+from lib import http_client
+from lib.http_client import CircuitBreaker, CircuitOpenError
+
+
+class FakeResponse:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.headers = {}
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class FakeSession:
+    """Stands in for the pooled session: each request raises or returns the next scripted outcome."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    def request(self, method, url, **kwargs):
+        return self._next()
+
+    def build_request(self, method, url, **kwargs):
+        return (method, url)
+
+    async def send(self, request, **kwargs):
+        return self._next()
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    """An endpoint whose breaker opens after one failure and half-opens immediately."""
+    name = "test_endpoint"
+    monkeypatch.setitem(http_client._breakers, name, CircuitBreaker(failure_threshold=1, reset_timeout=0.0))
+    monkeypatch.setattr(http_client, "MAX_RETRIES", 0)
+    return name
+
+
+def test_breaker_opens_after_threshold_and_recovers_after_success():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    breaker.reset_timeout = 0.0
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    # Only one trial request at a time while half-open
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    # The next trial is allowed again once the reset timeout passes
+    assert breaker.allow()
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.InvalidURL("bad url"),
+    requests.exceptions.TooManyRedirects("loop"),
+    requests.exceptions.ChunkedEncodingError("broken body"),
+])
+def test_unexpected_error_in_trial_does_not_wedge_the_breaker(monkeypatch, endpoint, error):
+    http_client._breakers[endpoint].record_failure()
+    session = FakeSession([error, FakeResponse(200)])
+    monkeypatch.setattr(http_client, "get_session", lambda: session)
+
+    with pytest.raises(type(error)):
+        http_client.get(endpoint, "https://example.com")
+    # The failed trial freed the slot, so the next trial goes through and closes the breaker
+    assert http_client.get(endpoint, "https://example.com").status_code == 200
+    assert http_client._breakers[endpoint].state == "closed"
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.MissingSchema("no scheme"),
+    requests.exceptions.InvalidURL("bad url"),
+])
+def test_caller_errors_do_not_open_the_breaker(monkeypatch, endpoint, error):
+    session = FakeSession([error, error, FakeResponse(200)])
+    monkeypatch.setattr(http_client, "get_session", lambda: session)
+
+    for _ in range(2):
+        with pytest.raises(type(error)):
+            http_client.get(endpoint, "partselect.com/PS11752778")
+    assert http_client._breakers[endpoint].state == "closed"
+    assert http_client.get(endpoint, "https://www.partselect.com/PS11752778.htm").status_code == 200
+
+
+def test_async_unexpected_error_in_trial_does_not_wedge_the_breaker(monkeypatch, endpoint):
+    http_client._breakers[endpoint].record_failure()
+    client = FakeSession([httpx.DecodingError("bad gzip"), FakeResponse(200)])
+    monkeypatch.setattr(http_client, "get_async_client", lambda: client)
+
+    async def run():
+        with pytest.raises(httpx.DecodingError):
+            await http_client.aget(endpoint, "https://example.com")
+        return await http_client.aget(endpoint, "https://example.com")
+
+    assert asyncio.run(run()).status_code == 200
+    assert http_client._breakers[endpoint].state == "closed"
+
+
+def test_cancelled_trial_frees_the_slot_without_counting_a_failure(monkeypatch, endpoint):
+    breaker = http_client._breakers[endpoint]
+    breaker.record_failure()
+    breaker.reset_timeout = 60
+    breaker.opened_at -= 60
+    client = FakeSession([asyncio.CancelledError()])
+    monkeypatch.setattr(http_client, "get_async_client", lambda: client)
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(http_client.aget(endpoint, "https://example.com"))
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_open_breaker_rejects_without_calling(monkeypatch, endpoint):
+    breaker = http_client._breakers[endpoint]
+    breaker.reset_timeout = 60
+    breaker.record_failure()
+    session = FakeSession([])
+    monkeypatch.setattr(http_client, "get_session", lambda: session)
+
+    with pytest.raises(CircuitOpenError):
+        http_client.get(endpoint, "https://example.com")
+    assert session.calls == 0
@@ -0,0 +1,105 @@
+import pytest
+
+from lib import page_cache
+from lib.page_cache import PageCache
+from tools import request_tools
+
+
+class Clock:
+    """Stands in for the time module, so freshness and recency do not depend on the wall clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(page_cache, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return PageCache(str(tmp_path / "pages.db"))
+
+
+def test_round_trip_with_validators(cache):
+    cache.put("page", "https://www.partselect.com/a", "Pump PS11752778", etag='"v1"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+    page = cache.get("page", "https://www.partselect.com/a")
+    assert page.text == "Pump PS11752778"
+    assert cache.conditional_headers(page) == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"}
+    assert cache.get("parts", "https://www.partselect.com/a") is None
+    assert cache.conditional_headers(None) == {}
+
+
+def test_freshness_window_by_kind(cache, clock):
+    cache.put("models", "u", "models")
+    cache.put("parts", "u", "parts")
+    clock.now += 3600
+    assert cache.is_fresh("models", cache.get("models", "u"))
+    # Parts lists carry prices, so they are never served without revalidation
+    assert not cache.is_fresh("parts", cache.get("parts", "u"))
+    clock.now += 86400
+    assert not cache.is_fresh("models", cache.get("models", "u"))
+
+
+def test_revalidation_starts_a_new_freshness_window(cache, clock):
+    cache.put("search", "u", "results")
+    clock.now += 7200
+    cache.record_hit("search", "u", revalidated=True)
+    assert cache.is_fresh("search", cache.get("search", "u"))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = PageCache(str(tmp_path / "pages.db"))
+    cache.put("page", "a", "a" * 1000)
+    entry_bytes = cache.stats()["bytes"]
+    cache.max_bytes = 2 * entry_bytes
+    clock.now += 1
+    cache.put("page", "b", "b" * 1000)
+    clock.now += 1
+    cache.record_hit("page", "a")
+    clock.now += 1
+    cache.put("page", "c", "c" * 1000)
+    assert cache.get("page", "a") is not None
+    assert cache.get("page", "b") is None
+    assert cache.get("page", "c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cached_fetch_serves_fresh_pages_and_revalidates_stale_ones(cache, clock, monkeypatch):
+    requests_made = []
+
+    def get(name, url, headers=None, **kwargs):
+        requests_made.append(headers)
+        if "If-None-Match" in headers:
+            return FakeResponse(304)
+        return FakeResponse(200, "Dishwasher repair", {"ETag": '"v1"'})
+
+    monkeypatch.setattr(request_tools, "get_page_cache", lambda: cache)
+    monkeypatch.setattr(request_tools.http_client, "get", get)
+    read = lambda response: response.text
+
+    assert request_tools.cached_fetch("search", "u", read) == "Dishwasher repair"
+    assert request_tools.cached_fetch("search", "u", read) == "Dishwasher repair"
+    assert len(requests_made) == 1
+
+    clock.now += 7200
+    assert request_tools.cached_fetch("search", "u", read) == "Dishwasher repair"
+    assert requests_made[-1]["If-None-Match"] == '"v1"'
+    stats = cache.stats()
+    assert (stats["hits"], stats["revalidated"], stats["misses"]) == (1, 1, 1)
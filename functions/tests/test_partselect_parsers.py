@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from lib.partselect_parsers import parse_compatibility, parse_models, parse_parts, parse_problems
+
+
+BASE_URL = "https://www.partselect.com/"
+SHELF_BIN = {
+    "part_number": "PS11752778",
+    "manufacturer_number": "WPW10321304",
+    "name": "Refrigerator Door Shelf Bin",
+    "price": "$44.95",
+    "url": "https://www.partselect.com/PS11752778-Whirlpool-WPW10321304-Refrigerator-Door-Shelf-Bin.htm",
+}
+
+
+def fixture(name):
+    with open(os.path.join(os.path.dirname(__file__), "fixtures", name)) as f:
+        return f.read()
+
+
+def test_parts_from_model_page_rows():
+    parts = parse_parts(fixture("model_parts.html"), BASE_URL)
+    assert parts == [
+        SHELF_BIN,
+        {
+            "part_number": "PS12364199",
+            "manufacturer_number": "242126602",
+            "name": "Door Shelf Bin",
+            "price": "$36.08",
+            "url": "https://www.partselect.com/PS12364199-Frigidaire-242126602-Refrigerator-Door-Shelf-Bin.htm",
+        },
+        {
+            "part_number": "PS3406971",
+            "manufacturer_number": "W10195416",
+            "name": "Lower Dishrack Wheel",
+            "price": "$7.21",
+            "url": "https://www.partselect.com/PS3406971.htm",
+        },
+    ]
+
+
+def test_part_link_inside_a_row_takes_the_rows_fields():
+    # The link is the tightest block around the number, but the row holds the price and manufacturer number
+    html = '<div class="row"><a href="/PS11752778.htm">PS11752778</a> … $45.99 … Manufacturer Part Number W10321304</div>'
+    assert parse_parts(html, BASE_URL) == [{
+        "part_number": "PS11752778",
+        "manufacturer_number": "W10321304",
+        "price": "$45.99",
+        "url": "https://www.partselect.com/PS11752778.htm",
+    }]
+
+
+def test_parts_from_search_result_table():
+    parts = parse_parts(fixture("search_results.html"), BASE_URL)
+    assert parts == [
+        SHELF_BIN,
+        {"part_number": "PS3406971", "name": "Lower Dishrack Wheel", "price": "$7.21", "url": "https://www.partselect.com/PS3406971.htm"},
+    ]
+
+
+def test_parts_from_json_handler_response():
+    parts = parse_parts(fixture("instant_repairman_parts.json"), BASE_URL)
+    assert parts == [
+        {key: value for key, value in SHELF_BIN.items() if key != "url"},
+        {"part_number": "PS3406971", "manufacturer_number": "W10195416", "name": "Lower Dishrack Wheel", "price": "$7.21"},
+    ]
+
+
+def test_models_with_master_ids():
+    models = parse_models(fixture("instant_repairman_models.html"), BASE_URL)
+    assert [(model["model_master_id"], model["model_number"]) for model in models] == [("1234", "WDT780SAEM1"), ("1240", "WDT780SAEM2")]
+    assert models[0]["description"] == "WDT780SAEM1 Whirlpool Dishwasher"
+
+
+def test_problems_with_ids_from_links_handlers_and_data_attributes():
+    problems = parse_problems(fixture("instant_repairman_models.html"), BASE_URL)
+    assert [(problem["problem_id"], problem["name"], problem["model_master_id"]) for problem in problems] == [
+        ("55", "Leaking", "1234"),
+        ("56", "Not draining", "1234"),
+        ("57", "Noisy", "1234"),
+    ]
+
+
+@pytest.mark.parametrize("payload, compatible", [
+    ({"compatabilityCheckResult": "NotCompatible"}, False),
+    ({"compatibilityCheckResult": "Compatible"}, True),
+    ({"compatabilityCheckResult": True}, True),
+    ({"compatabilityCheckResult": {"isCompatible": False}}, False),
+    ({"compatabilityCheckResult": "Unknown"}, None),
+])
+def test_compatibility_result(payload, compatible):
+    result = parse_compatibility(payload, "WDT780SAEM1", "11752778")
+    assert result["compatible"] is compatible
+    assert result["model_number"] == "WDT780SAEM1"
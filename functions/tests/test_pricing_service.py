@@ -0,0 +1,83 @@
+import asyncio
+import threading
+
+import pytest
+
+from lib import pricing_service
+from lib.pricing_service import PricingService
+
+
+class FakeResponse:
+    def __init__(self, items):
+        self.items = items
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.items
+
+
+class FakePricingApi:
+    """Answers pricing POSTs once `release` is set, recording the item codes of each batch."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.batches = []
+
+    def post(self, endpoint, url, json=None, **kwargs):
+        self.batches.append([item["item_code"] for item in json["items"]])
+        self.release.wait(5)
+        return FakeResponse([{"item_code": item["item_code"], "unit": item["unit"], "price": 10.0} for item in json["items"]])
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = FakePricingApi()
+    monkeypatch.setattr(pricing_service.http_client, "post", api.post)
+    return api
+
+
+@pytest.fixture
+def service():
+    service = PricingService(window=0.01, max_batch_size=2)
+    service.cache.clear()
+    yield service
+    service.cache.clear()
+
+
+def test_cancelled_async_caller_does_not_cancel_other_waiters(api, service):
+    results = {}
+
+    def sync_caller():
+        results["sync"] = service.get_prices(["PS11752778"])
+
+    async def cancelled_caller():
+        task = asyncio.ensure_future(service.aget_prices(["PS11752778"]))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    thread = threading.Thread(target=sync_caller)
+    thread.start()
+    asyncio.run(cancelled_caller())
+    api.release.set()
+    thread.join(5)
+
+    assert results["sync"] == [{"item_code": "PS11752778", "unit": "EA", "price": 10.0}]
+    assert service.cache.get(("PS11752778", "EA"))[0]
+    assert api.batches == [["PS11752778"]]
+
+
+def test_full_batch_is_sent_off_the_event_loop(api, service):
+    async def lookup():
+        task = asyncio.ensure_future(service.aget_prices(["PS11752778", "W10321304"]))
+        # The batch is full, so it is sent at once, but the loop keeps running while the POST waits
+        await asyncio.sleep(0.05)
+        assert api.batches == [["PS11752778", "W10321304"]]
+        assert not task.done()
+        api.release.set()
+        return await task
+
+    assert [item["item_code"] for item in asyncio.run(lookup())] == ["PS11752778", "W10321304"]
@@ -0,0 +1,41 @@
+from lib.agent_utils import merge_worker_updates, record_updates, state_summary
+from lib.render import PRODUCT_COLUMNS, merge_records, product_key, render_result, render_state_records, render_table
+
+
+PUMP = {"name": "Pump", "part_number": "PS11752778", "price": "$499.99", "image_url": None, "description": ""}
+
+
+def test_table_keeps_only_columns_with_values_and_drops_duplicate_rows():
+    rows = [PUMP, dict(PUMP), {"name": "Filter | 3 pack", "part_number": "W10321304", "price": None}]
+    assert render_table(rows, PRODUCT_COLUMNS) == "part_number | name | price\nPS11752778 | Pump | $499.99\nW10321304 | Filter / 3 pack | "
+
+
+def test_records_merge_by_key_keeping_fields_the_new_record_leaves_empty():
+    merged = merge_records([PUMP], [{"part_number": "ps11752778", "price": None, "in_stock": True}], product_key)
+    assert merged == [{"name": "Pump", "part_number": "ps11752778", "price": "$499.99", "in_stock": True}]
+
+
+def test_result_is_a_table_plus_one_line_per_field():
+    response = {"products": [PUMP], "info_needed": None, "summary": "Pump found", "filters": {"brand": "Whirlpool", "model": None}}
+    assert render_result("product_search_agent", response) == (
+        "product_search_agent:\npart_number | name | price\nPS11752778 | Pump | $499.99\nsummary: Pump found\nfilters: brand=Whirlpool"
+    )
+    assert render_result("product_search_agent", {"products": [PUMP]}, include_records=False) == ""
+
+
+def test_parallel_workers_merge_into_one_set_of_records():
+    state = {"messages": ["user"], "products": [], "stores": [], "pricing": {}}
+    updates = [
+        {"messages": ["user", "product_info_agent"], **record_updates(state, {"products": [PUMP]})},
+        {"messages": ["user", "store_info_agent"], **record_updates(state, {"found_stores": [{"name": "Dallas", "hours": "8-6"}]})},
+    ]
+    merged = merge_worker_updates(state, updates)
+    assert merged["messages"] == ["user", "product_info_agent", "store_info_agent"]
+    assert merged["pricing"] == {"PS11752778": "$499.99"}
+    # The price is already in the products table, so it is not listed again
+    assert render_state_records(merged) == "Products:\npart_number | name | price\nPS11752778 | Pump | $499.99\nStores:\nname | hours\nDallas | 8-6"
+
+
+def test_state_summary_shows_sizes_not_values():
+    state = {"messages": ["user", "product_info_agent"], "products": [PUMP], "pricing": {}, "current_agent": "supervisor", "pending_request": None}
+    assert state_summary(state) == "messages=2, products=1, current_agent"
@@ -0,0 +1,74 @@
+import pytest
+
+from lib import patterns, response_cache
+from lib.cache import get_cache
+from lib.pricing_service import DEFAULT_UNIT
+from lib.response_cache import ResponseCache, follows_question
+
+
+PRICE_STATE = {"products": [{"name": "Pump", "part_number": "PS11752778", "price": "$499.99"}], "pricing": {"PS11752778": "$499.99"}}
+STOCK_STATE = {"products": [{"name": "Pump", "part_number": "PS11752778", "in_stock": True}]}
+
+
+@pytest.fixture(autouse=True)
+def no_store_index(monkeypatch):
+    monkeypatch.setattr(patterns, "get_store_index", lambda: None)
+    monkeypatch.setattr(response_cache, "get_store_index", lambda: None)
+
+
+@pytest.fixture
+def cache():
+    get_cache("pricing").clear()
+    yield ResponseCache()
+    get_cache("pricing").clear()
+
+
+def test_rephrased_lookup_hits_the_same_entry(cache):
+    assert cache.put("how much is PS11752778?", ("$499.99", None), PRICE_STATE)
+    assert cache.get("what's the price of PS11752778") == ("$499.99", None)
+    assert cache.get("how much is W10321304?") is None
+
+
+def test_store_is_part_of_the_key_with_part_numbers(cache):
+    assert cache.put("is PS11752778 in stock at store 12?", ("In stock at store 12", None), STOCK_STATE)
+    bucket_12 = cache.key("is PS11752778 in stock at store 12?")[0]
+    bucket_13 = cache.key("is PS11752778 in stock at store 13?")[0]
+    assert bucket_12 != bucket_13
+    assert cache.get("is PS11752778 in stock at store 13?") is None
+    assert cache.get("is PS11752778 in stock at store 12?") == ("In stock at store 12", None)
+
+
+def test_store_lookups_are_keyed_on_the_store(cache):
+    assert cache.key("hours for store 12")[0] == ("store_hours", ("store_id:12",))
+
+
+@pytest.mark.parametrize("text", ["hello", "my pump is making a noise", "/clear"])
+def test_open_ended_messages_are_not_cached(cache, text):
+    assert cache.key(text) is None
+    assert not cache.put(text, ("reply", None), PRICE_STATE)
+
+
+def test_answer_to_a_question_is_not_served_or_cached(cache):
+    history = [{"role": "user", "content": "what are your hours?"}, {"role": "assistant", "content": "Which store are you asking about?"}]
+    assert follows_question(history)
+    assert not cache.put("store 12", ("Open 8-6", None), {"stores": [{"name": "Dallas"}]}, history)
+    cache.put("hours for store 12", ("Open 8-6", None), {"stores": [{"name": "Dallas"}]})
+    assert cache.get("hours for store 12", history) is None
+    assert cache.get("hours for store 12", [{"role": "assistant", "content": "Pump (PS11752778): $499.99"}]) == ("Open 8-6", None)
+
+
+def test_changed_price_invalidates_the_reply(cache):
+    pricing = get_cache("pricing")
+    pricing.set(("PS11752778", DEFAULT_UNIT), {"price": 499.99})
+    cache.put("how much is PS11752778?", ("$499.99", None), PRICE_STATE)
+    assert cache.get("how much is PS11752778?") == ("$499.99", None)
+
+    pricing.set(("PS11752778", DEFAULT_UNIT), {"price": 459.99})
+    assert cache.get("how much is PS11752778?") is None
+    assert cache.stats()["stale"] == 1
+
+
+def test_replies_without_results_are_not_cached(cache):
+    assert not cache.put("how much is PS11752778?", ("I could not find that part", None), {})
+    needs_info = {**PRICE_STATE, "agent_results": {"product_info_agent": {"info_needed": "Which model?"}}}
+    assert not cache.put("how much is PS11752778?", ("Which model?", None), needs_info)
@@ -0,0 +1,29 @@
+import os
+import statistics
+
+from benchmarks.startup import profile_import
+
+
+# Seconds a cold `import main` may take, the median of fresh interpreters with warm .pyc files
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "1.5"))
+
+# Imported by the agents and the graph, which load in the background or on the first message
+DEFERRED_PACKAGES = ("langgraph", "langchain_core", "langchain_openai", "openai", "langchain_client", "agents")
+
+
+def import_main():
+    rows = profile_import("main")
+    return rows, next(cumulative for name, _, _, cumulative in rows if name == "main")
+
+
+def test_import_main_stays_under_the_budget():
+    # The first run may compile bytecode
+    import_main()
+    seconds = statistics.median(import_main()[1] for _ in range(3))
+    assert seconds <= STARTUP_BUDGET_SECONDS, f"import main took {seconds:.3f}s, over the {STARTUP_BUDGET_SECONDS}s budget"
+
+
+def test_import_main_defers_the_agents():
+    rows, _ = import_main()
+    imported = {name.split(".")[0] for name, _, _, _ in rows}
+    assert not imported & set(DEFERRED_PACKAGES)
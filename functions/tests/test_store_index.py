@@ -0,0 +1,71 @@
+import pytest
+
+from lib import store_index
+from lib.store_index import StoreIndex
+
+
+DALLAS = {"id": "12", "name": "Dallas", "address": "100 Main St, Dallas, TX 75201", "location": {"latitude": 32.78, "longitude": -96.80}}
+AUSTIN = {"id": "13", "name": "Austin", "address": "200 Congress Ave, Austin, TX 78701", "location": {"latitude": 30.27, "longitude": -97.74}}
+
+
+class FakeResponse:
+    def __init__(self, stores):
+        self.stores = stores
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"stores": self.stores}
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = {"stores": [DALLAS, AUSTIN]}
+    monkeypatch.setattr(store_index.http_client, "get", lambda endpoint, url, params=None: FakeResponse(api["stores"] if params["page"] == 1 else []))
+    return api
+
+
+@pytest.fixture
+def index(api):
+    index = StoreIndex()
+    # Loaded synchronously, without the background refresh
+    index._refreshing = True
+    index.refresh()
+    return index
+
+
+def test_lookups_before_the_first_snapshot_fall_back_to_the_api():
+    index = StoreIndex()
+    index._refreshing = True
+    assert index.get("12") is None
+    assert index.search(32.78, -96.80) is None
+    assert index.nearest(32.78, -96.80) is None
+
+
+def test_search_and_nearest_from_the_snapshot(index):
+    result = index.search(32.78, -96.80, radius=50)
+    assert [store["name"] for store in result["stores"]] == ["Dallas"]
+    assert result["total"] == 1
+    assert [store["name"] for store in index.nearest(30.30, -97.70)["stores"]] == ["Austin", "Dallas"]
+    assert index.get("12")["name"] == "Dallas"
+    assert index.locate_zip("78701-1234") == (30.27, -97.74)
+
+
+def test_refresh_replaces_stores_and_geo_together(index, api):
+    before = index._snapshot
+    api["stores"] = [AUSTIN]
+    index.refresh()
+    stores, geo, complete = index._snapshot
+    assert index._snapshot is not before
+    assert list(stores) == ["13"] and len(geo) == 1 and complete
+    assert [store["name"] for store in index.nearest(32.78, -96.80)["stores"]] == ["Austin"]
+
+
+def test_incomplete_snapshot_does_not_answer_radius_searches(index, monkeypatch):
+    monkeypatch.setattr(store_index, "SNAPSHOT_MAX_PAGES", 1)
+    monkeypatch.setattr(store_index, "SNAPSHOT_PAGE_SIZE", 2)
+    index.refresh()
+    assert not index.complete
+    assert index.search(32.78, -96.80) is None
+    assert index.nearest(32.78, -96.80)["stores"][0]["name"] == "Dallas"
@@ -0,0 +1,75 @@
+import pytest
+
+from agents import product_info_agent
+from lib import agent_registry, templates
+from lib.templates import templated_response
+from lib.types import ProductInfo
+
+
+PUMP = {"name": "Pump", "part_number": "PS11752778", "manufacturer_number": "SP2610X15", "price": "$499.99", "image_url": "https://img/pump.png"}
+FILTER = {"name": "Filter", "part_number": "W10321304", "price": "$45.99"}
+
+
+@pytest.fixture(autouse=True)
+def templates_on(monkeypatch):
+    monkeypatch.setattr(templates, "TEMPLATE_RESPONSES_ENABLED", True)
+
+
+def state(request_type, part_numbers=(), **fields):
+    return {"request_type": request_type, "request_info": {"part_numbers": list(part_numbers)}, **fields}
+
+
+def test_price_check_lists_each_requested_product():
+    output = templated_response(state("price_check", ["ps-11752778", "W10321304"], products=[PUMP, FILTER]))
+    assert output == {"message": "Pump (PS11752778): $499.99\nFilter (W10321304): $45.99", "output_image": "https://img/pump.png"}
+
+
+def test_price_check_matches_manufacturer_numbers():
+    output = templated_response(state("price_check", ["sp2610x15"], products=[PUMP, FILTER]))
+    assert output["message"] == "Pump (PS11752778): $499.99"
+
+
+@pytest.mark.parametrize("products", [
+    [FILTER],
+    [{**PUMP, "price": None}],
+])
+def test_price_check_without_every_price_goes_to_the_llm(products):
+    assert templated_response(state("price_check", ["PS11752778"], products=products)) is None
+
+
+def test_availability_lines():
+    products = [{**PUMP, "in_stock": True, "available_quantity": 3}, {**FILTER, "in_stock": False}]
+    output = templated_response(state("availability", products=products))
+    assert output["message"] == "Pump (PS11752778) is in stock (3 available).\nFilter (W10321304) is currently out of stock."
+
+
+def test_availability_not_looked_up_goes_to_the_llm():
+    assert templated_response(state("availability", ["PS11752778"], products=[PUMP])) is None
+
+
+def test_store_hours_for_a_single_store():
+    store = {"name": "Dallas", "hours": "Mon-Sat 8am-6pm", "phone_number": "555-0100"}
+    output = templated_response(state("store_hours", stores=[store]))
+    assert output == {"message": "Dallas hours:\nMon-Sat 8am-6pm\nPhone: 555-0100", "output_image": None}
+    assert templated_response(state("store_hours", stores=[store, {**store, "name": "Austin"}])) is None
+
+
+@pytest.mark.parametrize("fields", [
+    {"pending_request": {"target_agent": "human_interaction"}},
+    {"agent_results": {"product_info_agent": {"info_needed": "Which model is it for?"}}},
+])
+def test_turns_that_need_the_user_go_to_the_llm(fields):
+    assert templated_response(state("price_check", ["PS11752778"], products=[PUMP], **fields)) is None
+
+
+def test_open_ended_requests_go_to_the_llm():
+    assert templated_response(state("product_details", ["PS11752778"], products=[PUMP])) is None
+
+
+def test_routed_price_and_stock_checks_can_look_up_prices_and_stock(monkeypatch):
+    # The fast router sends these to the ProductInfo variant, so it needs the tools that fill price and in_stock
+    built = {}
+    monkeypatch.setattr(product_info_agent, "build_product_info_agent", lambda response_format, tools: built.setdefault("tools", tools))
+    agent_registry._builders[agent_registry.registry_key(product_info_agent.AGENT_NAME, ProductInfo)]()
+    names = {tool.name for tool in built["tools"]}
+    assert {"get_pricing", "get_availability"} <= names
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from lib import tracing
+from lib.tracing import Trace, export_trace, load_traces, percentile, record_cache, record_http, summarize, tracing_to
+from lib.turn_stats import TraceHandler
+
+
+def node_metadata(node, outer=None):
+    namespace = f"{outer or node}:1" + (f"|{node}:2" if outer else "")
+    return {"langgraph_node": node, "langgraph_checkpoint_ns": namespace}
+
+
+def test_spans_nest_under_their_nearest_traced_ancestor():
+    trace = Trace("loop")
+    handler = TraceHandler(trace)
+    handler.on_chain_start({}, {}, run_id="node", name="product_info_agent", metadata=node_metadata("product_info_agent"))
+    # The agent's inner runnables are linked, not traced, so its tool and model calls nest under the node
+    handler.on_chain_start({}, {}, run_id="inner", parent_run_id="node", name="RunnableSequence", metadata=node_metadata("agent", "product_info_agent"))
+    handler.on_tool_start({"name": "get_pricing"}, "PS11752778", run_id="tool", parent_run_id="inner", metadata=node_metadata("tools", "product_info_agent"))
+    handler.on_tool_end("$499.99", run_id="tool")
+    handler.on_chat_model_start({}, [], run_id="llm", parent_run_id="inner", metadata=node_metadata("agent", "product_info_agent"), invocation_params={"model": "gpt-4o-mini"})
+    usage = LLMResult(generations=[[ChatGeneration(message=AIMessage(content="ok", usage_metadata={"input_tokens": 120, "output_tokens": 8, "total_tokens": 128}))]])
+    handler.on_llm_end(usage, run_id="llm")
+    handler.on_chain_end({}, run_id="inner")
+    handler.on_chain_end({}, run_id="node")
+
+    turn = trace.finish(request_type="price_check").as_dict()
+    spans = {span["name"]: span for span in turn["spans"]}
+    assert [span["name"] for span in turn["spans"]] == ["product_info_agent", "get_pricing", "product_info_agent.agent"]
+    assert spans["get_pricing"]["parent"] == spans["product_info_agent.agent"]["parent"] == spans["product_info_agent"]["id"]
+    assert spans["get_pricing"]["node"] == "product_info_agent"
+    assert spans["product_info_agent.agent"]["model"] == "gpt-4o-mini"
+    assert (turn["llm_calls"], turn["tool_calls"], turn["prompt_tokens"], turn["completion_tokens"]) == (1, 1, 120, 8)
+    assert turn["request_type"] == "price_check"
+    assert all(span["seconds"] is not None for span in turn["spans"])
+
+
+def test_routing_errors_are_not_marked_as_errors():
+    class GraphInterrupt(Exception):
+        pass
+
+    trace = Trace("loop")
+    handler = TraceHandler(trace)
+    for run_id, error in (("interrupted", GraphInterrupt()), ("failed", ValueError())):
+        handler.on_chain_start({}, {}, run_id=run_id, name="supervisor", metadata=node_metadata("supervisor"))
+        handler.on_chain_error(error, run_id=run_id)
+    assert [span.get("error") for span in trace.as_dict()["spans"]] == [None, "ValueError"]
+
+
+def test_events_go_to_the_current_trace_only():
+    trace = Trace("plan")
+    record_cache("page_cache", "hit")
+    with tracing_to(trace):
+        record_http("partselect_page", 0.25, status=200)
+        record_cache("page_cache", "miss")
+    record_http("partselect_page", 0.5, status=500)
+    spans = trace.as_dict()["spans"]
+    assert [(span["kind"], span["name"]) for span in spans] == [("http", "partselect_page"), ("cache", "page_cache")]
+    assert spans[0]["status"] == 200 and "retry" not in spans[0]
+    assert spans[1]["result"] == "miss"
+
+
+def test_export_appends_and_rotates(tmp_path, monkeypatch):
+    path = str(tmp_path / "traces.jsonl")
+    monkeypatch.setattr(tracing, "TRACE_MAX_BYTES", 10)
+    export_trace(Trace("loop").finish(), path)
+    assert len(load_traces(path)) == 1
+    export_trace(Trace("plan").finish(), path)
+    assert [turn["mode"] for turn in load_traces(path)] == ["plan"]
+    assert [turn["mode"] for turn in load_traces(path + ".1")] == ["loop"]
+
+
+@pytest.mark.parametrize("pct, expected", [(50, 5), (90, 9), (99, 10), (0, 1)])
+def test_nearest_rank_percentile(pct, expected):
+    assert percentile(list(range(10, 0, -1)), pct) == expected
+
+
+def test_summary_per_turn_and_span():
+    traces = [
+        {"mode": "loop", "seconds": seconds, "spans": [
+            {"kind": "llm", "name": "supervisor", "seconds": seconds / 2, "prompt_tokens": 100, "completion_tokens": 10},
+            {"kind": "cache", "name": "page_cache", "seconds": 0.0, "result": result},
+        ]}
+        for seconds, result in ((1.0, "hit"), (2.0, "miss"), (3.0, "hit"))
+    ]
+    summary = json.loads(json.dumps(summarize(traces)))
+    assert summary["turn:loop"] == {"count": 3, "p50": 2.0, "p90": 3.0, "p99": 3.0, "max": 3.0}
+    assert summary["llm:supervisor"]["p50"] == 1.0
+    assert (summary["llm:supervisor"]["prompt_tokens"], summary["llm:supervisor"]["completion_tokens"]) == (300, 30)
+    assert summary["cache:page_cache"]["outcomes"] == {"hit": 2, "miss": 1}
@@ -1,17 +1,36 @@
+import asyncio
 import re
 from typing import List
 import requests
 from firebase_functions import logger
+from lib import http_client
+from lib.cache import cached
+from lib.pricing_service import get_pricing_service
+from lib.product_catalog import PRODUCT_CATALOG_PATH, get_product_catalog
+from lib.vector_index import VECTOR_INDEX_PATH, embeddings_available, get_vector_index
 
-from langchain.agents import Tool
+from langchain_core.tools import Tool
 
+def _klevu_key(term, page_size=5, page=1):
+    return (term.strip().lower(), int(page_size), int(page))
+
+
+def _azure_key(term, limit=3):
+    return (term.strip().lower(), int(limit))
+
+
+def _part_number_key(part_number):
+    return part_number.strip().upper()
+
+
+@cached("klevu_search", key=_klevu_key)
 def search_klevu_products(term: str, page_size: int = 5, page: int = 1) -> str:
     """Search Klevu for products that match the search term"""
     logger.info(f"Searching Klevu for {term}")
     term = term.replace(" ", "%20")
     url = f"https://candidate-onsite-study-srs-712206638513.us-central1.run.app/api/search?term={term}&page_size={page_size}&page={page}"
     try:
-        response = requests.get(url)
+        response = http_client.get("klevu_search", url)
         response.raise_for_status()
         logger.info(f"Klevu search response: {response.json()}")
         return response.json()
@@ -19,19 +38,36 @@ def search_klevu_products(term: str, page_size: int = 5, page: int = 1) -> str:
         logger.error(f"Error searching Klevu: {e}")
         return str(e)
 
+@cached("klevu_search", key=_klevu_key)
+async def asearch_klevu_products(term: str, page_size: int = 5, page: int = 1) -> str:
+    """Async variant of search_klevu_products"""
+    logger.info(f"Searching Klevu for {term}")
+    term = term.replace(" ", "%20")
+    url = f"https://candidate-onsite-study-srs-712206638513.us-central1.run.app/api/search?term={term}&page_size={page_size}&page={page}"
+    try:
+        response = await http_client.aget("klevu_search", url)
+        response.raise_for_status()
+        logger.info(f"Klevu search response: {response.json()}")
+        return response.json()
+    except http_client.HTTP_ERRORS as e:
+        logger.error(f"Error searching Klevu: {e}")
+        return str(e)
+
 search_klevu_products_tool = Tool(
     name="search_klevu_products",
     func=search_klevu_products,
+    coroutine=asearch_klevu_products,
     description="Search for products using the Klevu search engine. Returns part id and part_number for each product."
 )
 
+@cached("azure_search", key=_azure_key)
 def search_azure_products(term: str, limit: int = 3) -> str:
     """Search Azure for products that match the search term"""
     logger.info(f"Searching Azure for {term}")
     term = term.replace(" ", "%20")
     url = f"https://candidate-onsite-study-srs-712206638513.us-central1.run.app/api/products/search?query={term}&limit={limit}"
     try:
-        response = requests.get(url)
+        response = http_client.get("azure_search", url)
         response.raise_for_status()
         logger.info(f"Azure search response: {response.json()}")
         return response.json()
@@ -39,21 +75,96 @@ def search_azure_products(term: str, limit: int = 3) -> str:
         logger.error(f"Error searching Azure: {e}")
         return str(e)
 
+@cached("azure_search", key=_azure_key)
+async def asearch_azure_products(term: str, limit: int = 3) -> str:
+    """Async variant of search_azure_products"""
+    logger.info(f"Searching Azure for {term}")
+    term = term.replace(" ", "%20")
+    url = f"https://candidate-onsite-study-srs-712206638513.us-central1.run.app/api/products/search?query={term}&limit={limit}"
+    try:
+        response = await http_client.aget("azure_search", url)
+        response.raise_for_status()
+        logger.info(f"Azure search response: {response.json()}")
+        return response.json()
+    except http_client.HTTP_ERRORS as e:
+        logger.error(f"Error searching Azure: {e}")
+        return str(e)
+
 search_azure_products_tool = Tool(
     name="search_azure_products",
     func=search_azure_products,
+    coroutine=asearch_azure_products,
     description="Search for products using the Azure search engine. \
         Returns:\
         product_name, description, brand, part_number, manufacturer_id, heritage_link, image_url, relevance_score"
 )
 
 
+def search_product_catalog(query: str, limit: int = 5):
+    """Search the local product catalog by part number, manufacturer number or keywords"""
+    logger.info(f"Searching the product catalog for {query}")
+    catalog = get_product_catalog()
+    if catalog is None or not len(catalog):
+        return "The product catalog is not available, use search_azure_products instead"
+    return catalog.search(query, int(limit))
+
+async def asearch_product_catalog(query: str, limit: int = 5):
+    """Async variant of search_product_catalog; the search, and the re-index when the export has changed, run off the event loop"""
+    return await asyncio.to_thread(search_product_catalog, query, limit)
+
+search_product_catalog_tool = Tool(
+    name="search_product_catalog",
+    func=search_product_catalog,
+    coroutine=asearch_product_catalog,
+    description="Search the product catalog by part number, manufacturer number or keywords. Use this before the Klevu and Azure searches. \
+        Returns:\
+        name, part_number, manufacturer_number, price, image_url, additional_info, description, relevance_score, exact_match"
+)
+
+def catalog_tools() -> List[Tool]:
+    """The catalog search tool, if a catalog export is configured."""
+    return [search_product_catalog_tool] if PRODUCT_CATALOG_PATH else []
+
+
+def semantic_product_search(description: str, limit: int = 5):
+    """Find products that match a description of what the part does"""
+    logger.info(f"Semantic product search for {description}")
+    index = get_vector_index()
+    if index is None or not len(index):
+        return "Semantic search is not available, use search_azure_products instead"
+    return index.search(description, int(limit))
+
+async def asemantic_product_search(description: str, limit: int = 5):
+    """Async variant of semantic_product_search; embedding the query runs off the event loop"""
+    return await asyncio.to_thread(semantic_product_search, description, limit)
+
+semantic_product_search_tool = Tool(
+    name="semantic_product_search",
+    func=semantic_product_search,
+    coroutine=asemantic_product_search,
+    description="Find products from a plain-language description of the part or what it does, e.g. 'the thing that makes my pump prime' \
+        or 'filter cartridge for a 50 sq ft filter'. Use this when the user does not give a part or model number. \
+        Returns:\
+        name, part_number, manufacturer_number, price, image_url, additional_info, description, relevance_score"
+)
+
+def semantic_search_tools() -> List[Tool]:
+    """The semantic search tool, if a vector index is configured and fastembed is installed to embed queries."""
+    if not VECTOR_INDEX_PATH:
+        return []
+    if not embeddings_available():
+        logger.warn("VECTOR_INDEX_PATH is set but fastembed is not installed, semantic search is off")
+        return []
+    return [semantic_product_search_tool]
+
+
+@cached("product_details", key=_part_number_key)
 def get_product_details(part_number: str) -> str:
     """Get the details of a product using the PartSelect API"""
     logger.info(f"Getting details for {part_number}")
     url = f"https://candidate-onsite-study-srs-712206638513.us-central1.run.app/api/products/{part_number.upper()}"
     try:
-        response = requests.get(url)
+        response = http_client.get("product_details", url)
         response.raise_for_status()
         logger.info(f"Product details response: {response.json()}")
         return response.json()
@@ -61,9 +172,24 @@ def get_product_details(part_number: str) -> str:
         logger.error(f"Error getting product details: {e}")
         return str(e)
 
+@cached("product_details", key=_part_number_key)
+async def aget_product_details(part_number: str) -> str:
+    """Async variant of get_product_details"""
+    logger.info(f"Getting details for {part_number}")
+    url = f"https://candidate-onsite-study-srs-712206638513.us-central1.run.app/api/products/{part_number.upper()}"
+    try:
+        response = await http_client.aget("product_details", url)
+        response.raise_for_status()
+        logger.info(f"Product details response: {response.json()}")
+        return response.json()
+    except http_client.HTTP_ERRORS as e:
+        logger.error(f"Error getting product details: {e}")
+        return str(e)
+
 get_product_details_tool = Tool(
     name="get_product_details",
     func=get_product_details,
+    coroutine=aget_product_details,
     description="Get specific information about a specific product IT DOES NOT INCLUDE PRICING OR AVAILABILITY. \
         Returns:\
         product_name, description, brand, part_number, manufacturer_id, heritage_link, image_url")
@@ -72,42 +198,52 @@ get_product_details_tool = Tool(
 def get_pricing(item_codes: List[str]):
     """Get pricing for a list of item codes"""
     logger.info(f"Getting pricing for {item_codes}")
-    url = f"https://candidate-onsite-study-srs-712206638513.us-central1.run.app/api/pricing"
-    if type(item_codes) == str:
-        item_codes = [item_codes]
-    request_body = {
-        "items": [{"item_code": item_code.upper(), "unit": "EA"} for item_code in item_codes]
-    }
     try:
-        logger.info(f"Request body: {request_body}")
-        response = requests.post(url, json=request_body)
-        response.raise_for_status()
-        logger.info(f"Pricing response: {response.json()}")
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return get_pricing_service().get_prices(item_codes)
+    except http_client.HTTP_ERRORS as e:
+        logger.error(f"Error getting pricing: {e}")
+        return str(e)
+
+async def aget_pricing(item_codes: List[str]):
+    """Async variant of get_pricing"""
+    logger.info(f"Getting pricing for {item_codes}")
+    try:
+        return await get_pricing_service().aget_prices(item_codes)
+    except http_client.HTTP_ERRORS as e:
         logger.error(f"Error getting pricing: {e}")
         return str(e)
 
 get_pricing_tool = Tool(
     name="get_pricing",
     func=get_pricing,
-    description="Get pricing for a list of item codes. \
+    coroutine=aget_pricing,
+    description="Get pricing for a list of item codes. Pass every item code you need in one call, separated by commas. \
         Returns:\
         item_code, description, price, available_quantity, in_stock, unit"
 )
 
+def _availability_from_pricing(items):
+    ret = {
+        "items": [{"item_code": item["item_code"], "available_quantity": item["available_quantity"], "in_stock": item["in_stock"]} for item in items]
+    }
+    logger.info(f"Availability: {ret}")
+    return ret
+
 def get_availability(item_codes: List[str]):
     """Get availability for a list of item codes"""
     logger.info(f"Getting availability for {item_codes}")
     try:
-        response = get_pricing(item_codes)
-        availability = [item["in_stock"] for item in response]
-        quantity = [item["available_quantity"] for item in response]
-        logger.info(f"Availability: {availability}, Quantity: {quantity}")
-        ret = {
-            "items": [{"item_code": item_code, "available_quantity": quantity, "in_stock": availability} for item_code, availability, quantity in zip(item_codes, availability, quantity)]
-        }
-        return ret
+        # Served from the same pricing results as get_pricing, so asking for both costs one request
+        return _availability_from_pricing(get_pricing_service().get_prices(item_codes))
+    except Exception as e:
+        logger.error(f"Error getting availability: {e}")
+        return str(e)
+
+async def aget_availability(item_codes: List[str]):
+    """Async variant of get_availability"""
+    logger.info(f"Getting availability for {item_codes}")
+    try:
+        return _availability_from_pricing(await get_pricing_service().aget_prices(item_codes))
     except Exception as e:
         logger.error(f"Error getting availability: {e}")
         return str(e)
@@ -115,9 +251,8 @@ def get_availability(item_codes: List[str]):
 get_availability_tool = Tool(
     name="get_availability",
     func=get_availability,
-    description="Get availability for a list of item codes. \
+    coroutine=aget_availability,
+    description="Get availability for a list of item codes. Pass every item code you need in one call, separated by commas. \
         Returns:\
         a list of item codes and their availability and quantity"
 )
-
-
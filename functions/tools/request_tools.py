@@ -1,8 +1,15 @@
-import re
-import requests
 from firebase_functions import logger
+from lib import http_client
+from lib.html_extract import CHUNK_BYTES, PAGE_MAX_BYTES, aextract_page, extract_page
+from lib.partselect_parsers import parse_compatibility, parse_models, parse_parts, parse_problems
+from lib.render import render_table
+from lib.part_numbers import normalize_part_number
 
-from langchain.agents import Tool
+from langchain_core.tools import Tool
+from lib.async_runtime import run_sync
+from lib.page_cache import get_page_cache
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+import asyncio
 
 
 
@@ -23,23 +30,149 @@ headers = {
             "sec-ch-ua-platform": "\"macOS\""
         }
 
-def trim_html(html: str) -> str:
-    """Trim the HTML by cutting out unneeded symbols. We dont need tags, scripts, or other unneeded symbols."""
-    # .replace(/<[^>]*>/g, ' ')
-    remove_tags = re.sub(r'<[^>]*>', '', html)
-    remove_whitespace = re.sub(r'\s+', ' ', remove_tags)
-    return remove_whitespace
+# General repair guides; they rarely change, so they are kept in the page cache for a week
+REPAIR_GUIDE_URLS = {
+    "dishwasher": "https://www.partselect.com/Repair/Dishwasher/",
+    "refrigerator": "https://www.partselect.com/Repair/Refrigerator/",
+}
 
-def request_page(url: str) -> str:
-    """Request a page from the PartSelect website"""
+def _read_page(response) -> str:
+    response.encoding = response.encoding or "utf-8"
+    page = extract_page(response.iter_content(CHUNK_BYTES, decode_unicode=True), response.url)
+    logger.debug(f"Read {page.bytes_read} characters of {response.url}, kept {len(page.text)}")
+    return page.render()
+
+async def _aread_page(response) -> str:
+    page = await aextract_page(response.aiter_text(CHUNK_BYTES), str(response.url))
+    logger.debug(f"Read {page.bytes_read} characters of {response.url}, kept {len(page.text)}")
+    return page.render()
+
+def _read_body(response) -> str:
+    response.encoding = response.encoding or "utf-8"
+    chunks, size = [], 0
+    for chunk in response.iter_content(CHUNK_BYTES, decode_unicode=True):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= PAGE_MAX_BYTES:
+            break
+    return "".join(chunks)
+
+async def _aread_body(response) -> str:
+    chunks, size = [], 0
+    async for chunk in response.aiter_text(CHUNK_BYTES):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= PAGE_MAX_BYTES:
+            break
+    return "".join(chunks)
+
+def _cache_lookup(kind: str, url: str):
+    """The page cache, the cached entry for url and whether it can be served without a request"""
+    cache = get_page_cache()
+    cached = cache.get(kind, url) if cache is not None else None
+    fresh = cached is not None and cache.is_fresh(kind, cached)
+    if fresh:
+        cache.record_hit(kind, url)
+    return cache, cached, fresh
+
+def _cache_store(cache, kind: str, url: str, response, text: str) -> None:
+    if cache is not None and response.status_code == 200:
+        cache.put(kind, url, text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+def cached_fetch(kind: str, url: str, read: Callable[[Any], str], parse: Optional[Callable[[str, str], str]] = None) -> str:
+    """What `read` (then `parse`) makes of a PartSelect response, served from the page cache while fresh and revalidated with a conditional GET once stale"""
+    cache, cached, fresh = _cache_lookup(kind, url)
+    if fresh:
+        return cached.text
+    conditional = cache.conditional_headers(cached) if cache is not None else {}
+    # Streamed, so reading stops as soon as the reader has enough of the page
+    response = http_client.get("partselect_page", url, headers={**headers, **conditional}, allow_redirects=True, stream=True)
+    try:
+        if cached is not None and response.status_code == 304:
+            cache.record_hit(kind, url, revalidated=True)
+            return cached.text
+        text = read(response)
+    finally:
+        response.close()
+    text = parse(text, url) if parse else text
+    _cache_store(cache, kind, url, response, text)
+    return text
+
+async def acached_fetch(kind: str, url: str, aread: Callable[[Any], Awaitable[str]], parse: Optional[Callable[[str, str], str]] = None) -> str:
+    """Async variant of cached_fetch; the page cache's sqlite and zlib work runs off the event loop"""
+    cache, cached, fresh = await asyncio.to_thread(_cache_lookup, kind, url)
+    if fresh:
+        return cached.text
+    conditional = cache.conditional_headers(cached) if cache is not None else {}
+    response = await http_client.aget("partselect_page", url, headers={**headers, **conditional}, allow_redirects=True, stream=True)
+    try:
+        if cached is not None and response.status_code == 304:
+            await asyncio.to_thread(cache.record_hit, kind, url, revalidated=True)
+            return cached.text
+        text = await aread(response)
+    finally:
+        await response.aclose()
+    text = parse(text, url) if parse else text
+    await asyncio.to_thread(_cache_store, cache, kind, url, response, text)
+    return text
+
+def request_page(url: str, kind: str = "page") -> str:
+    """Request a page from the PartSelect website, as its text, ids and links"""
+    logger.info(f"Requesting page from {url}")
+    return cached_fetch(kind, url, _read_page)
+
+async def arequest_page(url: str, kind: str = "page") -> str:
+    """Async variant of request_page"""
     logger.info(f"Requesting page from {url}")
-    response = requests.get(url, headers=headers, allow_redirects=True)
-    logger.info(response.text)
-    return trim_html(response.text)
+    return await acached_fetch(kind, url, _aread_page)
+
+def fetch_text(url: str) -> str:
+    """The body of a PartSelect response, read up to PAGE_MAX_BYTES characters"""
+    response = http_client.get("partselect_page", url, headers=headers, allow_redirects=True, stream=True)
+    try:
+        return _read_body(response)
+    finally:
+        response.close()
+
+async def afetch_text(url: str) -> str:
+    """Async variant of fetch_text"""
+    response = await http_client.aget("partselect_page", url, headers=headers, allow_redirects=True, stream=True)
+    try:
+        return await _aread_body(response)
+    finally:
+        await response.aclose()
+
+def warm_page_cache(urls: Optional[Iterable[str]] = None, kind: str = "page") -> Dict[str, bool]:
+    """Load pages into the page cache concurrently (the repair guides by default); returns whether each one loaded"""
+    if urls is None:
+        urls, kind = list(REPAIR_GUIDE_URLS.values()), "repair_guide"
+    urls = list(urls)
+
+    async def warm():
+        return await asyncio.gather(*(arequest_page(url, kind) for url in urls), return_exceptions=True)
+
+    results = dict(zip(urls, (not isinstance(result, BaseException) for result in run_sync(warm()))))
+    logger.info(f"Warmed page cache with {sum(results.values())} of {len(results)} pages")
+    return results
+
+def render_records(body: str, url: str, sections) -> str:
+    """Parsed records as tables, or the page text when the page layout was not recognized"""
+    tables = [f"{title}:\n{render_table(records)}" for title, records in sections if records]
+    logger.debug(f"Parsed {url}: {len(body)} characters to {sum(len(table) for table in tables)}")
+    if tables:
+        return "\n\n".join(tables)
+    return extract_page([body], url).render()
+
+def render_models(body: str, url: str) -> str:
+    return render_records(body, url, [("Models", parse_models(body, url)), ("Problems", parse_problems(body, url))])
+
+def render_parts(body: str, url: str) -> str:
+    return render_records(body, url, [("Parts", parse_parts(body, url))])
 
 request_page_tool = Tool(
         name="request_page",
         func=request_page,
+        coroutine=arequest_page,
         description="INFO: \
                     Request a page from the PartSelect website. \
                     --- \
@@ -57,13 +190,18 @@ def use_search_feature(search_term: str) -> str:
     """Use the search feature on the PartSelect website to get detailed information about a specific part or model"""
     logger.info(f"Getting HTML page for {search_term}")
     url = f"https://www.partselect.com/api/search/?searchterm={search_term}"
-    response = request_page(url)
-    logger.info(response)
-    return trim_html(response)
+    return request_page(url, "search")
+
+async def ause_search_feature(search_term: str) -> str:
+    """Async variant of use_search_feature"""
+    logger.info(f"Getting HTML page for {search_term}")
+    url = f"https://www.partselect.com/api/search/?searchterm={search_term}"
+    return await arequest_page(url, "search")
 
 use_search_feature_tool = Tool(
         name="use_search_feature",
         func=use_search_feature,
+        coroutine=ause_search_feature,
         description="INFO: \
                     Use the search feature on the PartSelect website to get detailed information about a specific part or model. \
                     --- \
@@ -79,50 +217,71 @@ def check_part_compatibility(model_and_part: str) -> str:
     """Check if a part exists in the PartSelect catalog by ID"""
     logger.info(f"Checking part compatibility for {model_and_part}")
     model_id, part_id = model_and_part.split("|")
-    # remove any letters from the part number
-    if len(part_id) > 2 and part_id[0:2] == "PS":
-        part_id = part_id[2:]
-    elif len(part_id) > 1 and part_id[0:1] == "W":
-        part_id = part_id[1:]
+    # the compatibility API takes the numeric inventory id, without the PS / W prefix
+    part_id = normalize_part_number(part_id)
     try:
         api_url = f"https://www.partselect.com/api/Part/PartCompatibilityCheck?modelnumber={model_id}&inventoryid={part_id}&partdescription=undefined"
 
-        response = request_page(api_url)
-        logger.info(response.json())
-        
-        return response.json()["compatabilityCheckResult"]
-    except requests.RequestException as e:
+        response = http_client.get("partselect_page", api_url, headers=headers, allow_redirects=True)
+        result = parse_compatibility(response.json(), model_id, part_id)
+        logger.info(f"Compatibility: {result}")
+        return result
+    except (*http_client.HTTP_ERRORS, ValueError) as e:
         logger.error(f"Error checking part existence: {e}")
-        return f"Error checking if part {id} exists"
+        return f"Error checking if part {part_id} fits model {model_id}"
     
+async def acheck_part_compatibility(model_and_part: str) -> str:
+    """Async variant of check_part_compatibility"""
+    logger.info(f"Checking part compatibility for {model_and_part}")
+    model_id, part_id = model_and_part.split("|")
+    # the compatibility API takes the numeric inventory id, without the PS / W prefix
+    part_id = normalize_part_number(part_id)
+    try:
+        api_url = f"https://www.partselect.com/api/Part/PartCompatibilityCheck?modelnumber={model_id}&inventoryid={part_id}&partdescription=undefined"
+
+        response = await http_client.aget("partselect_page", api_url, headers=headers, allow_redirects=True)
+        result = parse_compatibility(response.json(), model_id, part_id)
+        logger.info(f"Compatibility: {result}")
+        return result
+    except (*http_client.HTTP_ERRORS, ValueError) as e:
+        logger.error(f"Error checking part existence: {e}")
+        return f"Error checking if part {part_id} fits model {model_id}"
+
 check_part_compatibility_tool = Tool(
         name="check_part_compatibility",
         func=check_part_compatibility,
+        coroutine=acheck_part_compatibility,
         description="INFO: \
                     Checks if a model number and part number are compatible. \
                     --- \
                     Rules: \
                     input: model_id|part_id. Do not run this tool if the user does not give you the specific model and/or part number. \
-                    if you get an error, run this again with swapped model and part number."
+                    if you get an error, run this again with swapped model and part number.\
+                    output: model_number, part_id, compatible (true, false, or null if the response was unclear) and the raw result."
 )
 
 def search_instant_repairman_models(model_number: str) -> str:
     """Search for models based on a model number"""
     logger.info(f"Searching for models with model number {model_number}")
     url = f"https://www.partselect.com/instant-repairman/?handler=SearchModels&ModelNum={model_number}"
-    response = request_page(url)
-    logger.info(response)
-    return trim_html(response)
+    return cached_fetch("models", url, _read_body, render_models)
+
+async def asearch_instant_repairman_models(model_number: str) -> str:
+    """Async variant of search_instant_repairman_models"""
+    logger.info(f"Searching for models with model number {model_number}")
+    url = f"https://www.partselect.com/instant-repairman/?handler=SearchModels&ModelNum={model_number}"
+    return await acached_fetch("models", url, _aread_body, render_models)
 
 search_instant_repairman_models_tool = Tool(
         name="search_instant_repairman_models",
         func=search_instant_repairman_models,
+        coroutine=asearch_instant_repairman_models,
         description="INFO: \
                     Search for models based on a model number. \
                     --- \
                     Rules: \
                     input: model_number. Do not run this tool if the user does not give you the specific model number.\
-                    output: an HTML page in string format with a list of common problems for that model. \
+                    output: tables of the matching models (model_master_id, model_number) and their common problems (problem_id, model_master_id, name). \
                     The problem id and model master id are found in the output"
 )
 
@@ -132,13 +291,18 @@ def get_instant_repairman_parts(model_problem_id: str) -> str:
     """Get parts for a specific model and problem"""
     model_id, problem_id = model_problem_id.split("|")
     url = f"https://www.partselect.com/instant-repairman/?handler=GetpartsList&ModelMasterID={model_id}&ProblemID={problem_id}"
-    response = request_page(url)
-    logger.info(response)
-    return trim_html(response)
+    return cached_fetch("parts", url, _read_body, render_parts)
+
+async def aget_instant_repairman_parts(model_problem_id: str) -> str:
+    """Async variant of get_instant_repairman_parts"""
+    model_id, problem_id = model_problem_id.split("|")
+    url = f"https://www.partselect.com/instant-repairman/?handler=GetpartsList&ModelMasterID={model_id}&ProblemID={problem_id}"
+    return await acached_fetch("parts", url, _aread_body, render_parts)
 
 get_instant_repairman_parts_tool = Tool(
         name="get_instant_repairman_parts",
         func=get_instant_repairman_parts,
+        coroutine=aget_instant_repairman_parts,
         description="INFO: \
                     Get parts for a specific model and problem. \
                     --- \
@@ -148,7 +312,7 @@ get_instant_repairman_parts_tool = Tool(
                     both of these ids are found in the output of the search_instant_repairman_models tool. \
                     The model_master_id is likely different from the model_id provided by the user. ONLY use the model_master_id found in the \
                     output of the search_instant_repairman_models tool.\
-                    output: an HTML page in string format with a list of parts for that model and problem."
+                    output: a table of the parts for that model and problem (part_number, manufacturer_number, name, price, url)."
 )
 
 
@@ -157,13 +321,19 @@ def search_blog_posts(search_term: str) -> str:
     logger.info(f"Searching for blog posts with search term {search_term}")
     search_term = search_term.replace(" ", "%20")
     url = f"https://www.partselect.com/content/blog/search/{search_term}/"
-    response = request_page(url)
-    logger.info(response)
-    return trim_html(response)
+    return request_page(url, "blog")
+
+async def asearch_blog_posts(search_term: str) -> str:
+    """Async variant of search_blog_posts"""
+    logger.info(f"Searching for blog posts with search term {search_term}")
+    search_term = search_term.replace(" ", "%20")
+    url = f"https://www.partselect.com/content/blog/search/{search_term}/"
+    return await arequest_page(url, "blog")
 
 search_blog_posts_tool = Tool(
         name="search_blog_posts",
         func=search_blog_posts,
+        coroutine=asearch_blog_posts,
         description="INFO: \
                     Search for blog posts on the PartSelect website. \
                     --- \
@@ -171,21 +341,24 @@ search_blog_posts_tool = Tool(
                     input: search_term. Keep your search term simple, and do not include any non-search terms.\
                     example: 'dishwasher repair' or 'refrigerator repair' or 'dishwasher door repair' or 'refrigerator door repair'.\
                     limit your search to dishwasher or refrigerator repair. \
-                    output: an HTML page in string format with a list of blog posts for that search term."
+                    output: the page text, with the ids and links found on it, containing a list of blog posts for that search term."
                     )
 
 
 def general_dishwasher_repair_tips() -> str:
     """Get general dishwasher repair tips"""
     logger.info(f"Getting general dishwasher repair tips")
-    url = f"https://https://www.partselect.com/Repair/Dishwasher/"
-    response = request_page(url)
-    logger.info(response)
-    return trim_html(response)
+    return request_page(REPAIR_GUIDE_URLS["dishwasher"], "repair_guide")
+
+async def ageneral_dishwasher_repair_tips() -> str:
+    """Async variant of general_dishwasher_repair_tips"""
+    logger.info(f"Getting general dishwasher repair tips")
+    return await arequest_page(REPAIR_GUIDE_URLS["dishwasher"], "repair_guide")
 
 general_dishwasher_repair_tips_tool = Tool(
         name="general_dishwasher_repair_tips",
         func=general_dishwasher_repair_tips,
+        coroutine=ageneral_dishwasher_repair_tips,
         description="INFO: \
                     Get general dishwasher repair tips. This is a general guide, and may not be specific to the user's problem."
 )
@@ -193,14 +366,17 @@ general_dishwasher_repair_tips_tool = Tool(
 def general_refrigerator_repair_tips() -> str:
     """Get general refrigerator repair tips"""
     logger.info(f"Getting general refrigerator repair tips")
-    url = f"https://https://www.partselect.com/Repair/Refrigerator/"
-    response = request_page(url)
-    logger.info(response)
-    return trim_html(response)
+    return request_page(REPAIR_GUIDE_URLS["refrigerator"], "repair_guide")
+
+async def ageneral_refrigerator_repair_tips() -> str:
+    """Async variant of general_refrigerator_repair_tips"""
+    logger.info(f"Getting general refrigerator repair tips")
+    return await arequest_page(REPAIR_GUIDE_URLS["refrigerator"], "repair_guide")
 
 general_refrigerator_repair_tips_tool = Tool(
         name="general_refrigerator_repair_tips",
         func=general_refrigerator_repair_tips,
+        coroutine=ageneral_refrigerator_repair_tips,
         description="INFO: \
                     Get general refrigerator repair tips. This is a general guide, and may not be specific to the user's problem."
 )
\ No newline at end of file
@@ -1,19 +1,40 @@
 import re
-from typing import List
+from typing import List, Optional
 import requests
 from firebase_functions import logger
+from lib import http_client
+from lib.cache import cached
+from lib.store_index import get_store_index
 
-from langchain.agents import Tool
+from langchain_core.tools import Tool
+from langchain_core.tools import StructuredTool
 
 
+# Store lookups are answered from the in-memory store index when it has the
+# store; the API calls below are the fallback.
 
 
-def search_store_locations(latitude: float, longitude: float, radius: int = 50, page_size: int = 10, page: int = 1) -> str:
-    """Search for store locations that match the search term"""
+def _store_id_key(store_id):
+    return store_id.strip().upper()
+
+
+def _indexed_search(latitude: float, longitude: float, radius: int, page_size: int, page: int) -> Optional[dict]:
+    index = get_store_index()
+    return index.search(latitude, longitude, radius, page_size, page) if index else None
+
+
+def _indexed_store(store_id: str) -> Optional[dict]:
+    index = get_store_index()
+    return index.get(store_id) if index else None
+
+
+@cached("store_search")
+def fetch_store_locations(latitude: float, longitude: float, radius: int = 50, page_size: int = 10, page: int = 1) -> str:
+    """Search the store API for store locations around a point"""
     logger.info(f"Searching for store locations that match {latitude}, {longitude}, {radius}, {page_size}, {page}")
     url = f"https://candidate-onsite-study-srs-712206638513.us-central1.run.app/api/stores/search?latitude={latitude}&longitude={longitude}&radius={radius}&page_size={page_size}&page={page}"
     try:
-        response = requests.get(url)
+        response = http_client.get("store_search", url)
         response.raise_for_status()
         logger.info(f"Store locations search response: {response.json()}")
         return response.json()
@@ -21,21 +42,92 @@ def search_store_locations(latitude: float, longitude: float, radius: int = 50,
         logger.error(f"Error searching store locations: {e}")
         return str(e)
 
-search_store_locations_tool = Tool(
+@cached("store_search")
+async def afetch_store_locations(latitude: float, longitude: float, radius: int = 50, page_size: int = 10, page: int = 1) -> str:
+    """Async variant of fetch_store_locations"""
+    logger.info(f"Searching for store locations that match {latitude}, {longitude}, {radius}, {page_size}, {page}")
+    url = f"https://candidate-onsite-study-srs-712206638513.us-central1.run.app/api/stores/search?latitude={latitude}&longitude={longitude}&radius={radius}&page_size={page_size}&page={page}"
+    try:
+        response = await http_client.aget("store_search", url)
+        response.raise_for_status()
+        logger.info(f"Store locations search response: {response.json()}")
+        return response.json()
+    except http_client.HTTP_ERRORS as e:
+        logger.error(f"Error searching store locations: {e}")
+        return str(e)
+
+def search_store_locations(latitude: float, longitude: float, radius: int = 50, page_size: int = 10, page: int = 1) -> str:
+    """Search for store locations that match the search term"""
+    result = _indexed_search(latitude, longitude, radius, page_size, page)
+    if result is not None:
+        return result
+    return fetch_store_locations(latitude, longitude, radius, page_size, page)
+
+async def asearch_store_locations(latitude: float, longitude: float, radius: int = 50, page_size: int = 10, page: int = 1) -> str:
+    """Async variant of search_store_locations"""
+    result = _indexed_search(latitude, longitude, radius, page_size, page)
+    if result is not None:
+        return result
+    return await afetch_store_locations(latitude, longitude, radius, page_size, page)
+
+# Structured so the agent can pass each search parameter separately
+search_store_locations_tool = StructuredTool.from_function(
     name="search_store_locations",
     func=search_store_locations,
+    coroutine=asearch_store_locations,
     description="Search for store locations that match the input latitude, longitude, radius, page_size, and page \
         Returns a list of id, name, location, address, contact, hours"
 )
 
 
-def get_store_details(store_id: str) -> str:
-    """Get the details of a store"""
+def _nearest_from_index(zip_code: Optional[str], latitude: Optional[float], longitude: Optional[float], page_size: int, page: int):
+    """(result, latitude, longitude); result is None when the index cannot answer."""
+    index = get_store_index()
+    if zip_code and (latitude is None or longitude is None) and index is not None:
+        coordinates = index.locate_zip(zip_code)
+        if coordinates is not None:
+            latitude, longitude = coordinates
+    if latitude is None or longitude is None:
+        return None, latitude, longitude
+    return (index.nearest(latitude, longitude, page_size, page) if index else None), latitude, longitude
+
+def find_nearest_stores(zip_code: Optional[str] = None, latitude: Optional[float] = None, longitude: Optional[float] = None, page_size: int = 3, page: int = 1) -> str:
+    """Find the stores nearest to a ZIP code or a latitude/longitude"""
+    logger.info(f"Finding stores nearest to {zip_code or (latitude, longitude)}")
+    result, latitude, longitude = _nearest_from_index(zip_code, latitude, longitude, page_size, page)
+    if result is not None:
+        return result
+    if latitude is None or longitude is None:
+        return f"Could not find the location of ZIP code {zip_code}, ask the user for a city or address"
+    return fetch_store_locations(latitude, longitude, 50, page_size, page)
+
+async def afind_nearest_stores(zip_code: Optional[str] = None, latitude: Optional[float] = None, longitude: Optional[float] = None, page_size: int = 3, page: int = 1) -> str:
+    """Async variant of find_nearest_stores"""
+    logger.info(f"Finding stores nearest to {zip_code or (latitude, longitude)}")
+    result, latitude, longitude = _nearest_from_index(zip_code, latitude, longitude, page_size, page)
+    if result is not None:
+        return result
+    if latitude is None or longitude is None:
+        return f"Could not find the location of ZIP code {zip_code}, ask the user for a city or address"
+    return await afetch_store_locations(latitude, longitude, 50, page_size, page)
+
+find_nearest_stores_tool = StructuredTool.from_function(
+    name="find_nearest_stores",
+    func=find_nearest_stores,
+    coroutine=afind_nearest_stores,
+    description="Find the stores nearest to a ZIP code, or to a latitude and longitude, with no radius limit. \
+        Returns a list of id, name, location, address, contact, hours and distance in miles, nearest first"
+)
+
+
+@cached("store_details", key=_store_id_key)
+def fetch_store_details(store_id: str) -> str:
+    """Get the details of a store from the store API"""
     logger.info(f"Getting details of store {store_id}")
     store_id = store_id.upper()
     url = f"https://candidate-onsite-study-srs-712206638513.us-central1.run.app/api/stores/{store_id}"
     try:
-        response = requests.get(url)
+        response = http_client.get("store_details", url)
         response.raise_for_status()
         logger.info(f"Store details response: {response.json()}")
         return response.json()
@@ -43,9 +135,39 @@ def get_store_details(store_id: str) -> str:
         logger.error(f"Error getting store details: {e}")
         return str(e)
 
+@cached("store_details", key=_store_id_key)
+async def afetch_store_details(store_id: str) -> str:
+    """Async variant of fetch_store_details"""
+    logger.info(f"Getting details of store {store_id}")
+    store_id = store_id.upper()
+    url = f"https://candidate-onsite-study-srs-712206638513.us-central1.run.app/api/stores/{store_id}"
+    try:
+        response = await http_client.aget("store_details", url)
+        response.raise_for_status()
+        logger.info(f"Store details response: {response.json()}")
+        return response.json()
+    except http_client.HTTP_ERRORS as e:
+        logger.error(f"Error getting store details: {e}")
+        return str(e)
+
+def get_store_details(store_id: str) -> str:
+    """Get the details of a store"""
+    store = _indexed_store(store_id)
+    if store is not None:
+        return store
+    return fetch_store_details(store_id)
+
+async def aget_store_details(store_id: str) -> str:
+    """Async variant of get_store_details"""
+    store = _indexed_store(store_id)
+    if store is not None:
+        return store
+    return await afetch_store_details(store_id)
+
 get_store_details_tool = Tool(
     name="get_store_details",
     func=get_store_details,
+    coroutine=aget_store_details,
     description="Get the details of a store \
         returns id, name, location (latitude, longitude), address, contact"
 )
@@ -55,16 +177,35 @@ def get_store_hours(store_id: str) -> str:
     """Get the hours of a store"""
     logger.info(f"Getting hours of store {store_id}")
     try:
+        store = _indexed_store(store_id)
+        if store is not None and store.get("hours"):
+            return {"hours": store["hours"]}
+        # The details endpoint has no hours, so find the store in a search around its own location
         store_details = get_store_details(store_id)
-        store_hours = search_store_locations(store_details["location"]["latitude"], store_details["location"]["longitude"], 1, 1, 1)["stores"][0]["hours"]
+        store_hours = fetch_store_locations(store_details["location"]["latitude"], store_details["location"]["longitude"], 1, 1, 1)["stores"][0]["hours"]
         return {"hours": store_hours}
     except Exception as e:
         logger.error(f"Error getting store hours: {e}")
         return str(e)
 
+async def aget_store_hours(store_id: str) -> str:
+    """Async variant of get_store_hours"""
+    logger.info(f"Getting hours of store {store_id}")
+    try:
+        store = _indexed_store(store_id)
+        if store is not None and store.get("hours"):
+            return {"hours": store["hours"]}
+        store_details = await aget_store_details(store_id)
+        stores = await afetch_store_locations(store_details["location"]["latitude"], store_details["location"]["longitude"], 1, 1, 1)
+        return {"hours": stores["stores"][0]["hours"]}
+    except Exception as e:
+        logger.error(f"Error getting store hours: {e}")
+        return str(e)
+
 get_store_hours_tool = Tool(
     name="get_store_hours",
     func=get_store_hours,
+    coroutine=aget_store_hours,
     description="Get the hours of a store \
         returns hours"
 )